@@ -1,13 +1,35 @@
 from . import limiters
 import numpy as np
 
+def cell_sizes(dx,start=None,stop=None):
+    """
+    Sizes of a range of cells
+
+    dx: Cell size (a scalar, for a uniform grid) or array of cell sizes
+    start, stop: Range of cells
+    """
+    if np.ndim(dx)==0:
+        return dx
+    else:
+        return dx[start:stop]
+
+def as_float(dx,u):
+    """
+    Convert a cell size (or array of sizes) or time step to a type that keeps
+    arithmetic with u in the precision of u
+    """
+    if np.ndim(dx)==0:
+        return float(dx)
+    else:
+        return np.asarray(dx,dtype=u.dtype)
+
 def flux(u,a,dx,dt,limiter):
     """
     Compute fluxes between cells
 
     u: Quantity to be passively advected
     a: Velocity of flow
-    dx: Cell size
+    dx: Cell size, or array of cell sizes for a non-uniform grid
     dt: Time step
     limiter: String containing the name of one the flux limiter functions in limiters.py
     """
@@ -15,19 +37,23 @@ def flux(u,a,dx,dt,limiter):
     # Get the function to call for the flux limiter
     S=getattr(limiters,limiter)
 
+    # Sizes of the cells on the left and right side of each face
+    dx_l=cell_sizes(dx,1,-2)
+    dx_r=cell_sizes(dx,2,-1)
+
     # Gradient across cell at left side of each face
-    sm=(u[1:-2]-u[:-3])/dx
+    sm=(u[1:-2]-u[:-3])/((dx_l+cell_sizes(dx,None,-3))/2)
     
     # Gradient across cell at right side of each face
-    sp=(u[2:-1]-u[1:-2])/dx
+    sp=(u[2:-1]-u[1:-2])/((dx_r+dx_l)/2)
 
     # Separate the velocity into strictly positive and strictly negative vectors, for implementing the upwind scheme
     ap=np.maximum(a,0)
     am=np.minimum(a,0)
 
     # Compute positive and negative fluxes across each face
-    fp=ap[1:-2]*(u[1:-2]+dx/2*(1-a[1:-2]*dt/dx)*S(sm,sp))
-    fm=am[2:-1]*(u[2:-1]-dx/2*(1-abs(a[2:-1])*dt/dx)*S(sm,sp))
+    fp=ap[1:-2]*(u[1:-2]+dx_l/2*(1-a[1:-2]*dt/dx_l)*S(sm,sp))
+    fm=am[2:-1]*(u[2:-1]-dx_r/2*(1-abs(a[2:-1])*dt/dx_r)*S(sm,sp))
 
     # Add positive and negative fluxes together and return
     return fp+fm
@@ -40,7 +66,7 @@ def flux_burgers(u,dx,dt,limiter):
 
     u: Quantity to be passively advected
     a: Velocity of flow
-    dx: Cell size
+    dx: Cell size, or array of cell sizes for a non-uniform grid
     dt: Time step
     limiter: String containing the name of one the flux limiter functions in limiters.py
     """
@@ -48,19 +74,23 @@ def flux_burgers(u,dx,dt,limiter):
     # Get the function to call for the flux limiter
     S=getattr(limiters,limiter)
 
+    # Sizes of the cells on the left and right side of each face
+    dx_l=cell_sizes(dx,1,-2)
+    dx_r=cell_sizes(dx,2,-1)
+
     # Gradient across cell at left side of each face
-    sm=(u[1:-2]-u[:-3])/dx
+    sm=(u[1:-2]-u[:-3])/((dx_l+cell_sizes(dx,None,-3))/2)
     
     # Gradient across cell at right side of each face
-    sp=(u[2:-1]-u[1:-2])/dx
+    sp=(u[2:-1]-u[1:-2])/((dx_r+dx_l)/2)
 
     # Separate the velocity into strictly positive and strictly negative vectors, for implementing the upwind scheme
     ap=np.maximum(u,0)
     am=np.minimum(u,0)
 
     # Compute positive and negative fluxes across each face
-    fp=ap[1:-2]*(u[1:-2]/2+dx/2*(1-u[1:-2]*dt/dx)*S(sm,sp))
-    fm=am[2:-1]*(u[2:-1]/2-dx/2*(1-abs(u[2:-1])*dt/dx)*S(sm,sp))
+    fp=ap[1:-2]*(u[1:-2]/2+dx_l/2*(1-u[1:-2]*dt/dx_l)*S(sm,sp))
+    fm=am[2:-1]*(u[2:-1]/2-dx_r/2*(1-abs(u[2:-1])*dt/dx_r)*S(sm,sp))
 
     # Add positive and negative fluxes together and return
     return fp+fm
@@ -71,13 +101,17 @@ def step(u,a,dx,dt,limiter):
 
     u: Quantity to be passively advected
     a: Velocity of flow
-    dx: Cell size
+    dx: Cell size, or array of cell sizes for a non-uniform grid
     dt: Time step
     limiter: String containing the name of one the flux limiter functions in limiters.py
     """
 
+    # Keep the arithmetic below in the precision of u
+    dx=as_float(dx,u)
+    dt=float(dt)
+
     # Flux at all faces
-    f=flux(u,a,float(dx),float(dt),limiter)
+    f=flux(u,a,dx,dt,limiter)
 
     # Flux at left-side faces
     # (copied so it can be overwritten without affecting f)
@@ -87,16 +121,19 @@ def step(u,a,dx,dt,limiter):
     f_right=f[1:]
 
     # Indices where shocks occur
+    # (excluding any at the upstream edge of the grid, which have no
+    # corresponding face)
     shock_inds=np.where(a[1:]<a[:-1])[0]
+    shock_inds=shock_inds[shock_inds<len(f_left)]
 
     # At shocks, compute fluxes at left-side faces using the velocity from
     # the upstream cell. This prevents magnitude growth at the shock
     # interface
-    f_shift_r=flux(u[:-1],a[1:],float(dx),float(dt),limiter)
+    f_shift_r=flux(u[:-1],a[1:],cell_sizes(dx,None,-1),dt,limiter)
     f_left[shock_inds]=f_shift_r[shock_inds]
 
     # Update u
-    u[2:-2]=u[2:-2]+dt/dx*(f_left-f_right)
+    u[2:-2]=u[2:-2]+dt/cell_sizes(dx,2,-2)*(f_left-f_right)
 
 def step_burgers(u,dx,dt,limiter):
     """
@@ -104,14 +141,427 @@ def step_burgers(u,dx,dt,limiter):
 
     u: Quantity to be passively advected
     a: Velocity of flow
-    dx: Cell size
+    dx: Cell size, or array of cell sizes for a non-uniform grid
     dt: Time step
     limiter: String containing the name of one the flux limiter functions in limiters.py
     """
-    f=flux_burgers(u,float(dx),float(dt),limiter)
-    u[2:-2]=u[2:-2]+dt/dx*(f[:-1]-f[1:])
+    dx=as_float(dx,u)
+    dt=float(dt)
+    f=flux_burgers(u,dx,dt,limiter)
+    u[2:-2]=u[2:-2]+dt/cell_sizes(dx,2,-2)*(f[:-1]-f[1:])
+
+def active_ranges(fields,tol=0.,merge=2):
+    """
+    Find the ranges of cells that can change during a step of step and
+    step_burgers
+
+    The update of cell i depends only on cells i-2 to i+1. Where all the
+    given fields are uniform over that stencil, the fluxes on both sides of
+    the cell are identical and the cell does not change, so it can be
+    skipped. With tol=0 the skipped cells are exactly those whose update is
+    zero, so stepping only the active ranges gives bit-identical results.
+
+    fields: List of arrays of values at each cell (the advected quantities
+            and the velocity)
+    tol: Differences between neighboring cells no larger than this fraction
+         of the largest magnitude of the field are treated as zero
+    merge: Ranges separated by fewer than this many cells are merged (at
+           least 2 are needed for the ranges to be stepped one after another,
+           since each step reads two cells beyond the range it updates)
+
+    Returns: List of (start, stop) tuples, each a range of cells to update
+             (within 2:-2)
+    """
+
+    n=len(fields[0])
+
+    # Faces across which some field changes
+    jump=np.zeros(n-1,dtype=bool)
+    for field in fields:
+        jump|=np.abs(np.diff(field))>tol*np.max(np.abs(field))
+
+    # Grow by the stencil width
+    active=np.zeros(n,dtype=bool)
+    active[2:]|=jump[:-1]
+    active[1:]|=jump
+    active[:-1]|=jump
+    active[:2]=False
+    active[-2:]=False
+
+    edges=np.flatnonzero(np.diff(np.concatenate([[0],active.view(np.int8),[0]])))
+    starts=edges[::2]
+    stops=edges[1::2]
+
+    # Merge ranges that are too close together
+    if len(starts)>1:
+        separate=starts[1:]-stops[:-1]>=merge
+        starts=starts[np.concatenate([[True],separate])]
+        stops=stops[np.concatenate([separate,[True]])]
+
+    return list(zip(starts.tolist(),stops.tolist()))
+
+def grow_ranges(ranges,n,changed=(),merge=2):
+    """
+    Update the ranges of cells that can change during a step, as found by
+    active_ranges, to the following step
+
+    Only cells that were stepped (or otherwise changed) can make their
+    neighbors non-uniform, so the new ranges are found by growing the old
+    ones by the width of the stencil. This is much cheaper than calling
+    active_ranges again. The ranges never shrink, so they still include
+    every cell that can change.
+
+    ranges: List of (start, stop) tuples from active_ranges or grow_ranges
+    n: Number of cells in the grid
+    changed: Additional ranges of cells whose values were changed since the
+             last step (such as by updateboundary)
+    merge: Ranges separated by fewer than this many cells are merged
+
+    Returns: List of (start, stop) tuples
+    """
+
+    grown=[]
+    for start,stop in sorted(list(ranges)+list(changed)):
+
+        # Cell i depends on cells i-2 to i+1
+        start=max(start-1,2)
+        stop=min(stop+2,n-2)
+        if start>=stop:
+            continue
+
+        if grown and start-grown[-1][1]<merge:
+            grown[-1]=(grown[-1][0],max(grown[-1][1],stop))
+        else:
+            grown.append((start,stop))
+
+    return grown
+
+def reverse(dx):
+    """
+    Reverse the order of an array of cell sizes (a scalar is returned as is)
+    """
+    if np.ndim(dx)==0:
+        return dx
+    else:
+        return dx[::-1]
+
+def upwind_flux(u,a,dx,limiter):
+    """
+    Compute fluxes between cells for the semi-discrete scheme used with
+    Runge-Kutta time integration
+
+    flux reconstructs the value at each face from the cell on its left side,
+    which is only upwind for positive velocities. Here flux (with dt=0) is
+    applied separately to the positive part of the velocity and, on the
+    mirrored grid, to the negative part, so the value at each face is always
+    reconstructed from the upwind cell.
+
+    u: Quantity to be passively advected
+    a: Velocity of flow
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    """
+    f=np.zeros(len(u)-3,dtype=u.dtype)
+
+    # (either half is skipped when the flow is all in one direction)
+    if np.any(a>0):
+        f+=flux(u,np.maximum(a,0),dx,0.,limiter)
+    if np.any(a<0):
+        f-=flux(u[::-1],np.maximum(-a[::-1],0),reverse(dx),0.,limiter)[::-1]
+    return f
+
+def upwind_flux_burgers(u,dx,limiter):
+    """
+    Compute fluxes between cells for Burgers' equation for the semi-discrete
+    scheme used with Runge-Kutta time integration
+
+    As in upwind_flux, the flow in each direction is handled separately
+    (which amounts to the Engquist-Osher flux).
+
+    u: Velocity of flow
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    """
+    f=np.zeros(len(u)-3,dtype=u.dtype)
+    if np.any(u>0):
+        f+=flux_burgers(np.maximum(u,0),dx,0.,limiter)
+    if np.any(u<0):
+        f+=flux_burgers(np.maximum(-u[::-1],0),reverse(dx),0.,limiter)[::-1]
+    return f
+
+def rhs(u,a,dx,limiter):
+    """
+    Compute the rate of change of u in cells 2:-2 due to passive advection,
+    for use with a Runge-Kutta time integrator
+
+    u: Quantity to be passively advected
+    a: Velocity of flow
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    """
+
+    f=upwind_flux(u,a,dx,limiter)
+    f_left=f[:-1].copy()
+    f_right=f[1:]
+
+    # Same treatment of shocks as in step
+    shock_inds=np.where(a[1:]<a[:-1])[0]
+    shock_inds=shock_inds[shock_inds<len(f_left)]
+    f_shift_r=upwind_flux(u[:-1],a[1:],cell_sizes(dx,None,-1),limiter)
+    f_left[shock_inds]=f_shift_r[shock_inds]
+
+    return (f_left-f_right)/cell_sizes(dx,2,-2)
+
+def rhs_burgers(u,dx,limiter):
+    """
+    Compute the rate of change of u in cells 2:-2 according to Burgers'
+    equation, for use with a Runge-Kutta time integrator
+
+    u: Velocity of flow
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    """
+
+    f=upwind_flux_burgers(u,dx,limiter)
+    return (f[:-1]-f[1:])/cell_sizes(dx,2,-2)
+
+# Coefficients (a_i, b_i) of the strong stability preserving Runge-Kutta
+# schemes in Shu-Osher form, u_i = a_i*u_0 + b_i*(u_{i-1} + dt*L(u_{i-1}))
+ssprk_stages={
+    2:[(0.,1.),(1/2,1/2)],
+    3:[(0.,1.),(3/4,1/4),(1/3,2/3)],
+}
+
+def ssprk(u,dt,L,order=3):
+    """
+    Step cells 2:-2 of u forward in time using a strong stability preserving
+    Runge-Kutta scheme. Each stage is a convex combination of forward Euler
+    steps, so the scheme is TVD under the same CFL condition as forward Euler.
 
-def updateboundary(a,t,x_grid,x_bound,t_x,a_bound,t_a):
+    u: Quantity to be stepped (updated in place)
+    dt: Time step
+    L: Function returning the rate of change of cells 2:-2 given u
+    order: Order of the scheme (2 or 3)
+    """
+
+    if order not in ssprk_stages:
+        raise ValueError('No SSP Runge-Kutta scheme of order {}'.format(order))
+
+    dt=float(dt)
+    u0=u[2:-2].copy()
+    v=u.copy()
+    for a_i,b_i in ssprk_stages[order]:
+        v[2:-2]=a_i*u0+b_i*(v[2:-2]+dt*L(v))
+    u[2:-2]=v[2:-2]
+
+def step_ssprk(u,a,dx,dt,limiter,order=3):
+    """
+    Step forward in time using an SSP Runge-Kutta scheme
+
+    u: Quantity to be passively advected
+    a: Velocity of flow (held fixed during the step)
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    dt: Time step
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    order: Order of the scheme (2 or 3)
+    """
+    dx=as_float(dx,u)
+    ssprk(u,dt,lambda v:rhs(v,a,dx,limiter),order)
+
+def step_ssprk_burgers(u,dx,dt,limiter,order=3):
+    """
+    Step Burgers' equation forward in time using an SSP Runge-Kutta scheme
+
+    u: Velocity of flow
+    dx: Cell size, or array of cell sizes for a non-uniform grid
+    dt: Time step
+    limiter: String containing the name of one the flux limiter functions in limiters.py
+    order: Order of the scheme (2 or 3)
+    """
+    dx=as_float(dx,u)
+    ssprk(u,dt,lambda v:rhs_burgers(v,dx,limiter),order)
+
+def face_positions(x):
+    """
+    Positions of the faces between cells, including the outer faces of the
+    first and last cells
+
+    x: Positions of cell centers
+    """
+    xf=(x[1:]+x[:-1])/2
+    return np.concatenate([[2*x[0]-xf[0]],xf,[2*x[-1]-xf[-1]]])
+
+def departure_points(x,u,dt):
+    """
+    Trace the characteristics of Burgers' equation back by one time step
+
+    The solution is found from the Hopf-Lax formula for the integral of u,
+    U(x,t+dt) = min_y [ U(y,t) + (x-y)**2/(2*dt) ], which is exact for the
+    piecewise constant initial state, including at shocks, for any time step.
+
+    x: Positions of cell centers
+    u: Velocity of flow
+    dt: Time step
+
+    Returns: Starting positions of the fluid that arrives at each cell face
+             (as given by face_positions), and the integral of u up to each
+             face at the end of the step
+    """
+
+    # Range of cells (relative to each face) that the characteristics can
+    # come from
+    width=np.diff(face_positions(x))
+    kmin=int(np.floor(np.min(-u)*dt/np.max(width)))-1
+    kmax=int(np.ceil(np.max(-u)*dt/np.min(width)))+1
+
+    # Pad the grid with enough cells at each end for every face to find its
+    # characteristic (u is taken to be constant beyond the ends of the grid)
+    npad=max(abs(kmin),abs(kmax))+1
+    x=np.concatenate([x[0]-width[0]*np.arange(npad,0,-1),x,
+                      x[-1]+width[-1]*np.arange(1,npad+1)])
+    u=np.concatenate([np.full(npad,u[0]),u,np.full(npad,u[-1])])
+
+    xf=face_positions(x)
+    width=np.diff(xf)
+    n=len(u)
+
+    # Integral of u up to each face
+    U=np.concatenate([[0],np.cumsum(u*width)])
+
+    Unew=np.full(n+1,np.inf)
+    departure=xf.copy()
+    for k in range(kmin,kmax+1):
+
+        # Cell searched for each face, and whether it exists
+        j=np.arange(n+1)+k
+        valid=(j>=0)&(j<n)
+        j=np.clip(j,0,n-1)
+
+        # Minimize over the cell (within which U is linear)
+        y=np.clip(xf-u[j]*dt,xf[j],xf[j+1])
+        Uy=U[j]+u[j]*(y-xf[j])+(xf-y)**2/(2*dt)
+        Uy[~valid]=np.inf
+
+        better=Uy<Unew
+        Unew[better]=Uy[better]
+        departure[better]=y[better]
+
+    # Remove the padding
+    departure=departure[npad:-npad]
+    Unew=Unew[npad:-npad]
+
+    return departure, Unew
+
+def step_semilagrangian(u,x,departure):
+    """
+    Step forward in time using a conservative semi-Lagrangian scheme, which
+    is stable for any Courant number
+
+    The amount of u between the departure points of each cell's faces is
+    remapped into the cell. Where the flow is compressive, u is instead
+    carried along the characteristics without being compressed, as at the
+    shocks in step.
+
+    u: Quantity to be passively advected
+    x: Positions of cell centers
+    departure: Departure points of the cell faces, from departure_points
+    """
+
+    xf=face_positions(x)
+    width=np.diff(xf)
+
+    # Cumulative amount of u at each face
+    M=np.concatenate([[0],np.cumsum(u*width)])
+
+    # Cumulative amount of u at each departure point (u is taken to be
+    # constant beyond the ends of the grid)
+    Md=(np.interp(departure,xf,M)+np.minimum(departure-xf[0],0)*u[0]
+        +np.maximum(departure-xf[-1],0)*u[-1])
+
+    remapped=np.diff(Md)/width
+
+    # Value at the departure point of each cell center
+    carried=np.interp((departure[:-1]+departure[1:])/2,x,u)
+
+    compressive=np.diff(departure)>width
+    u[2:-2]=np.where(compressive,carried,remapped)[2:-2]
+
+def step_semilagrangian_burgers(u,x,U):
+    """
+    Step Burgers' equation forward in time using the solution found by
+    departure_points, which is stable for any Courant number
+
+    u: Velocity of flow
+    x: Positions of cell centers
+    U: Integral of u up to each face after the step, from departure_points
+    """
+    u[2:-2]=(np.diff(U)/np.diff(face_positions(x)))[2:-2]
+
+def refine_grid(x,fields,alpha=5,smoothing=5):
+    """
+    Redistribute grid cells so that they are concentrated where the given
+    fields have steep gradients (such as at shocks)
+
+    The cells are placed so that each holds an equal share of the monitor
+    function 1+alpha*g, where g is the sum of the gradient magnitudes of the
+    fields, each normalized by its maximum. The end points of the grid do
+    not move.
+
+    x: Positions of cell centers
+    fields: List of arrays of values at each cell
+    alpha: Ratio of the size of the largest cells to that of the most refined
+           cells (approximately)
+    smoothing: Number of cells over which the monitor function is smoothed,
+               limiting how quickly cell sizes change from cell to cell
+
+    Returns: New positions of cell centers
+    """
+
+    g=np.zeros(len(x))
+    for field in fields:
+        grad=np.abs(np.gradient(field,x))
+        if grad.max()>0:
+            g+=grad/grad.max()
+    g=np.minimum(g,1)
+
+    monitor=1+alpha*g
+    if smoothing>1:
+        monitor=np.convolve(monitor,np.ones(smoothing)/smoothing,mode='same')
+        monitor=np.maximum(monitor,1)
+
+    # Cumulative integral of the monitor function
+    W=np.concatenate([[0],np.cumsum((monitor[1:]+monitor[:-1])/2*np.diff(x))])
+
+    return np.interp(np.linspace(0,W[-1],len(x)),W,x)
+
+def interp_at(t,t_series,values):
+    """
+    Linearly interpolate a time series to a single time, exactly as
+    scipy.interpolate.interp1d does for a sorted series, but reading only the
+    two samples either side of t. The cost does not grow with the length of
+    the series, which can be memory-mapped.
+
+    Raises ValueError if t is outside the range of t_series
+    """
+
+    if not t_series[0]<=t<=t_series[-1]:
+        raise ValueError('Time {} is outside the interpolation range'.format(t))
+
+    i=min(max(np.searchsorted(t_series,t),1),len(t_series)-1)
+    slope=(values[i]-values[i-1])/(t_series[i]-t_series[i-1])
+    return slope*(t-t_series[i-1])+values[i-1]
+
+def interp_window(t,t_series,values):
+    """
+    Same as np.interp(t,t_series,values), but passing np.interp only the part
+    of the series that spans t
+    """
+
+    lo=max(np.searchsorted(t_series,np.min(t))-1,0)
+    hi=np.searchsorted(t_series,np.max(t),side='right')+1
+    return np.interp(t,t_series[lo:hi],values[lo:hi])
+
+def updateboundary(a,t,x_grid,x_bound,t_x,a_bound,t_a,nfill=1,speed=None):
 
     """
     Insert time-series solar wind data into the grid at the satellite location
@@ -123,15 +573,29 @@ def updateboundary(a,t,x_grid,x_bound,t_x,a_bound,t_a):
     t_x: Times for satellite positions
     a_bound: Values of a to insert into grid
     t_a: Times for a values
+    nfill: Number of cells to update, starting with the one containing the
+           satellite and moving upstream. Cells upstream of the satellite are
+           filled with the values that will reach the satellite later, which
+           is needed when more than one cell crosses the satellite per step.
+    speed: Solar wind speed at the satellite (needed if nfill>1)
+
+    The time series must be sorted by time. Only the samples around t are
+    read, so they can be memory-mapped (see l1store).
+
+    Returns: Index of the cell containing the satellite
     """
-    
-    from scipy.interpolate import interp1d
 
     # Interpolate satellite position to simulation time
-    x=interp1d(t_x,x_bound)(t)
+    x=interp_at(t,t_x,x_bound)
 
     # Find which grid cell to update
     ind=np.searchsorted(x_grid,x)
 
     # Update a
-    a[ind:ind+1]=interp1d(t_a,a_bound)(t)
+    a[ind:ind+1]=interp_at(t,t_a,a_bound)
+
+    if nfill>1:
+        x_upstream=x_grid[ind+1:ind+nfill]
+        a[ind+1:ind+nfill]=interp_window(t+(x_upstream-x)/abs(speed),t_a,a_bound)
+
+    return ind
@@ -9,92 +9,185 @@ except ImportError:
     from ConfigParser import ConfigParser
 
 # local
-from .cdaweb import get_cdf
-from .missing import fill_gaps
 from .cache_decorator import cache_result
 
 # extras
 import numpy as np
-from spacepy import datamodel as dm
-from spacepy import pybats
 
+# cdaweb, missing and spacepy are imported where they are used, so that
+# starting the command line tools (and runs using cached data) stays fast
 
-@cache_result(clear=False)
-def load_acedata(tstart, tend, noise=True, proxy=None):
+
+def as_datetime64(times):
+    """
+    Convert a sequence of times (datetime objects or datetime64 values) to a
+    datetime64 array with microsecond resolution
+    """
+    return np.asarray(times, dtype='datetime64[us]')
+
+
+def from_seconds(seconds, t0):
+    """
+    Convert times in seconds since t0 to a datetime64 array
+
+    seconds: Array of times in seconds since t0
+    t0: Epoch (datetime or datetime64)
+    """
+    offsets = np.round(np.asarray(seconds, dtype=np.float64)*1e6).astype('timedelta64[us]')
+    return np.datetime64(t0, 'us')+offsets
+
+
+# CDAWeb data sets (dataview, dataset and variables) used for each source
+source_datasets = {
+    'ACE': {
+        'swepam': ('sp_phys', 'AC_H0_SWE', ['Np', 'V_GSM', 'Tpr', 'SC_pos_GSM']),
+        'mag': ('sp_phys', 'AC_H0_MFI', ['BGSM']),
+    },
+    'DSCOVR': {
+        'plasma': ('sp_phys', 'DSCOVR_H1_FC', ['Np', 'V_GSE', 'THERMAL_TEMP']),
+        'mag': ('sp_phys', 'DSCOVR_H0_MAG', ['B1GSE']),
+        'orbit': ('sp_phys', 'DSCOVR_ORBIT_PRE', ['GSE_POS']),
+    },
+}
+
+
+def fetch_dataset(source, name, tstart, tend, proxy=None):
+    """
+    Fetch one of the data sets in source_datasets from CDAWeb, using the
+    day-by-day cache from cdaweb.get_cdf_day
+
+    source: Solar wind data source ("ACE" or "DSCOVR")
+    name: Name of the data set in source_datasets[source]
+    tstart: Desired start time
+    tend: Desired end time
+    proxy: Proxy server, as returned from convert_proxy
+    """
+
+    from .cdaweb import get_cdf_chunked
+
+    dataview, dataset, variables = source_datasets[source][name]
+
+    return get_cdf_chunked(dataview, dataset, tstart, tend, variables, proxy=proxy)
+
+
+def fill_vector_gaps(dataset, name, i, noise=True, rng=None, ndraws=None):
+    """
+    Fill the gaps in one component of a vector variable from CDAWeb
+
+    dataset: Data set, as returned from fetch_dataset
+    name: Name of the vector variable
+    i: Index of the component
+    noise: Adds noise to the filled gaps (see missing.fill_gaps)
+    rng: numpy Generator used to draw the noise
+    ndraws: If given, fill the gaps this many times with independent noise
+            (see missing.fill_gaps_draws)
+
+    Returns: List of filled series (one, unless ndraws is given)
+    """
+
+    from .missing import fill_gaps, fill_gaps_draws
+    from spacepy import datamodel as dm
+
+    values = dataset[name][:, i]
+    fillval = dataset[name].attrs['FILLVAL']
+
+    if ndraws is None:
+        return [fill_gaps(values, fillval=fillval, noise=noise, rng=rng)]
+
+    if not noise:
+        raise ValueError('Ensemble draws need noise to differ from each other')
+
+    draws = fill_gaps_draws(values, ndraws, fillval=fillval, rng=rng)
+    return [dm.dmarray(draw, attrs=dict(values.attrs)) for draw in draws]
+
+
+@cache_result(clear=False, ignore=('proxy',))
+def load_acedata(tstart, tend, noise=True, proxy=None, seed=None, ndraws=None):
     """
     Fetch ACE data from CDAWeb
 
     tstart: Desired start time
     tend: Desired end time
     noise: Adds noise to fill_gaps function
+    seed: Seed for the noise. The same seed gives the same noise.
+    ndraws: If given, return this many copies of the data, with the gaps
+            filled with independent noise in each
 
     Returns: A dictionary of tuples, each containing an array of times
-             and an array of ACE observations for a particular variable
+             (datetime64) and an array of ACE observations for a particular
+             variable (or a list of ndraws such dictionaries)
     """
 
+    rng = np.random.default_rng(seed)
+
     # Download SWEPAM and Mag data from CDAWeb
-    swepam_data = get_cdf('sp_phys', 'AC_H0_SWE', tstart, tend,
-                          ['Np', 'V_GSM', 'Tpr', 'SC_pos_GSM'], proxy=proxy)
-    mag_data = get_cdf('sp_phys', 'AC_H0_MFI', tstart, tend,
-                       ['BGSM'], proxy=proxy)
+    swepam_data = fetch_dataset('ACE', 'swepam', tstart, tend, proxy=proxy)
+    mag_data = fetch_dataset('ACE', 'mag', tstart, tend, proxy=proxy)
 
-    # Dictionary to store all the data from ACE
-    acedata = {'T': (swepam_data['Epoch'], swepam_data['Tpr']),
-               'n': (swepam_data['Epoch'], swepam_data['Np']),
-               }
+    # Dictionaries to store all the data from ACE
+    swepam_time = as_datetime64(swepam_data['Epoch'])
+    draws = [{'T': (swepam_time, swepam_data['Tpr']),
+              'n': (swepam_time, swepam_data['Np']),
+              } for draw in range(ndraws or 1)]
 
     # Store all the vector data in the array
     for i, coord in enumerate('xyz'):
         for dataset, local_name, cdaweb_name in [(mag_data, 'b', 'BGSM'),
                                                  (swepam_data, 'u', 'V_GSM'),
                                                  (swepam_data, '', 'SC_pos_GSM')]:
-            t = dataset['Epoch']
-            values = fill_gaps(dataset[cdaweb_name][:, i],
-                               fillval=dataset[cdaweb_name].attrs['FILLVAL'],
-                               noise=noise)
+            t = as_datetime64(dataset['Epoch'])
+            for acedata, values in zip(draws, fill_vector_gaps(dataset, cdaweb_name, i, noise,
+                                                               rng, ndraws)):
 
-            # Grab the appropriate component from
-            # VALIDMIN and VALIDMAX attributes
-            values.attrs['VALIDMIN'] = values.attrs['VALIDMIN'][i]
-            values.attrs['VALIDMAX'] = values.attrs['VALIDMAX'][i]
+                # Grab the appropriate component from
+                # VALIDMIN and VALIDMAX attributes
+                values.attrs['VALIDMIN'] = values.attrs['VALIDMIN'][i]
+                values.attrs['VALIDMAX'] = values.attrs['VALIDMAX'][i]
 
-            # Store in acedata dict
-            acedata[local_name+coord] = t, values
+                # Store in acedata dict
+                acedata[local_name+coord] = t, values
 
-    for var in acedata.keys():
-        # Restrict to only valid data
-        t_var, varIn = acedata[var]
-        goodpoints = (varIn < varIn.attrs['VALIDMAX']) & (varIn > varIn.attrs['VALIDMIN'])
-        t_var, varIn = t_var[goodpoints], varIn[goodpoints]
+    for acedata in draws:
+        for var in acedata.keys():
+            # Restrict to only valid data
+            t_var, varIn = acedata[var]
+            goodpoints = (varIn < varIn.attrs['VALIDMAX']) & (varIn > varIn.attrs['VALIDMIN'])
+            t_var, varIn = t_var[goodpoints], varIn[goodpoints]
 
-        acedata[var] = (t_var, varIn)
+            acedata[var] = (t_var, varIn)
 
-    return acedata
+    return draws if ndraws is not None else draws[0]
 
 
-@cache_result(clear=False)
-def load_dscovr(tstart, tend, noise=True, proxy=None):
+@cache_result(clear=False, ignore=('proxy',))
+def load_dscovr(tstart, tend, noise=True, proxy=None, seed=None, ndraws=None):
     """
     Fetch DSCOVR data from CDAWeb
 
     tstart: Desired start time
     tend: Desired end time
     noise: Adds noise to fill_gaps function
+    seed: Seed for the noise. The same seed gives the same noise.
+    ndraws: If given, return this many copies of the data, with the gaps
+            filled with independent noise in each
 
-    Returns: A dictionary of tuples, each containing an array of times and an
-             array of DSCOVR observations for a particular variable
+    Returns: A dictionary of tuples, each containing an array of times
+             (datetime64) and an array of DSCOVR observations for a particular
+             variable (or a list of ndraws such dictionaries)
     """
 
+    rng = np.random.default_rng(seed)
+
     # Download SWEPAM and Mag data from CDAWeb
-    plasma_data = get_cdf('sp_phys', 'DSCOVR_H1_FC', tstart, tend,
-                          ['Np', 'V_GSE', 'THERMAL_TEMP'], proxy=proxy)
-    mag_data = get_cdf('sp_phys', 'DSCOVR_H0_MAG', tstart, tend, ['B1GSE'], proxy=proxy)
-    orbit_data = get_cdf('sp_phys', 'DSCOVR_ORBIT_PRE', tstart, tend, ['GSE_POS'], proxy=proxy)
+    plasma_data = fetch_dataset('DSCOVR', 'plasma', tstart, tend, proxy=proxy)
+    mag_data = fetch_dataset('DSCOVR', 'mag', tstart, tend, proxy=proxy)
+    orbit_data = fetch_dataset('DSCOVR', 'orbit', tstart, tend, proxy=proxy)
 
-    # Dictionary to store all the data from DSCOVR
-    dscovrdata = {'T': (plasma_data['Epoch'], plasma_data['THERMAL_TEMP']),
-                  'n': (plasma_data['Epoch'], plasma_data['Np']),
-                  }
+    # Dictionaries to store all the data from DSCOVR
+    plasma_time = as_datetime64(plasma_data['Epoch'])
+    draws = [{'T': (plasma_time, plasma_data['THERMAL_TEMP']),
+              'n': (plasma_time, plasma_data['Np']),
+              } for draw in range(ndraws or 1)]
 
     # Store all the vector data in the array
     for i, coord in enumerate('xyz'):
@@ -102,39 +195,80 @@ def load_dscovr(tstart, tend, noise=True, proxy=None):
                 (mag_data, 'b', 'B1GSE', 'Epoch1'),
                 (plasma_data, 'u', 'V_GSE', 'Epoch'),
                 (orbit_data, '', 'GSE_POS', 'Epoch')]:
-            t = dataset[cdaweb_time_var]
-            values = fill_gaps(dataset[cdaweb_name][:, i],
-                               fillval=dataset[cdaweb_name].attrs['FILLVAL'],
-                               noise=noise)
+            t = as_datetime64(dataset[cdaweb_time_var])
+            for dscovrdata, values in zip(draws, fill_vector_gaps(dataset, cdaweb_name, i,
+                                                                  noise, rng, ndraws)):
 
-            for attr in ('VALIDMIN', 'VALIDMAX'):
+                for attr in ('VALIDMIN', 'VALIDMAX'):
 
-                try:
-                    len(values.attrs[attr])
-                except TypeError:
-                    # It's a scalar, leave it as it is
-                    pass
-                else:
-                    # Grab the appropriate component from
-                    # VALIDMIN and VALIDMAX attributes
-                    values.attrs[attr] = values.attrs[attr][0]
+                    try:
+                        len(values.attrs[attr])
+                    except TypeError:
+                        # It's a scalar, leave it as it is
+                        pass
+                    else:
+                        # Grab the appropriate component from
+                        # VALIDMIN and VALIDMAX attributes
+                        values.attrs[attr] = values.attrs[attr][0]
 
-            # Store in data dict
-            dscovrdata[local_name+coord] = t, values
+                # Store in data dict
+                dscovrdata[local_name+coord] = t, values
 
-    for var in dscovrdata.keys():
-        # Restrict to only valid data
-        t_var, varIn = dscovrdata[var]
-        goodpoints = (varIn > varIn.attrs['VALIDMIN'])
-        t_var, varIn = t_var[goodpoints], varIn[goodpoints]
+    for dscovrdata in draws:
+        for var in dscovrdata.keys():
+            # Restrict to only valid data
+            t_var, varIn = dscovrdata[var]
+            goodpoints = (varIn > varIn.attrs['VALIDMIN'])
+            t_var, varIn = t_var[goodpoints], varIn[goodpoints]
 
-        dscovrdata[var] = (t_var, varIn)
+            dscovrdata[var] = (t_var, varIn)
 
-    return dscovrdata
+    return draws if ndraws is not None else draws[0]
+
+
+def to_seconds(sw_data, t0=None):
+    """
+    Convert the times in an L1 data dictionary to seconds since a start time
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned from
+             load_acedata or load_dscovr
+    t0: Start time. Defaults to the first time for which all variables have
+        valid data, and is never earlier than that time.
+
+    Returns: Dictionary of L1 data with numerical times, and the start time
+             (datetime)
+    """
+
+    from .l1store import L1Store
+
+    if isinstance(sw_data, L1Store):
+        # Times are already stored in seconds
+        return sw_data.to_seconds(t0)
+
+    l1data = {}
+
+    sw_times = {var: as_datetime64(t) for var, (t, values) in sw_data.items()}
+
+    # Start time of simulation is first point for which all variables have valid data
+    # (or the requested start time, if that is later)
+    tfirst = np.max([t[0] for t in sw_times.values()])
+    t0 = tfirst if t0 is None else max(np.datetime64(t0, 'us'), tfirst)
+
+    for var in sw_data.keys():
+
+        t_var, values = sw_data[var]
+
+        # Subtract epoch time from time arrays and convert them to seconds
+        t_var = (sw_times[var]-t0)/np.timedelta64(1, 's')
+
+        l1data[var] = t_var, values
+
+    return l1data, t0.astype(datetime)
 
 
 def initialize(sw_data, advect_vars=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T'],
-               ncells=1000, l1_x=1.6e6, output_x=0):
+               ncells=1000, l1_x=1.6e6, output_x=0, dtype=np.float64, t0=None,
+               ballistic=False):
     """
     Initialize advection simulation
 
@@ -144,10 +278,15 @@ def initialize(sw_data, advect_vars=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T
     ncells: Number of cells in the computational grid
     l1_x: Maximum coordinate (in GSM/GSE x, units of km) of the upstream solar wind data
     output_x: Minimum coordinate (in GSM/GSE x, km) where output will be needed
+    dtype: Floating point type of the advected state variables. The grid
+           coordinates are always float64.
+    t0: Start time of the simulation. Defaults to the first time for which all
+        variables have valid data.
+    ballistic: If True, fill the grid by ballistically propagating the
+               observations made before t0, instead of filling it with the
+               first observed values
     """
 
-    l1data = {}
-
     xextent = l1_x-output_x
     max_x = l1_x+xextent*(2./ncells)
     min_x = output_x-xextent*(2./ncells)
@@ -159,21 +298,16 @@ def initialize(sw_data, advect_vars=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T
     if 'ux' not in advect_vars:
         advect_vars = list(advect_vars)+['ux']
 
-    # Start time of simulation is first point for which all variables have valid data
-    t0 = np.max([t[0] for var, (t, values) in sw_data.items()])
-
-    for var in sw_data.keys():
-
-        t_var, values = sw_data[var]
-
-        # Subtract epoch time from time arrays and convert them to seconds
-        t_var = np.array([(t-t0).total_seconds() for t in t_var])
-
-        l1data[var] = t_var, values
+    l1data, t0 = to_seconds(sw_data, t0)
 
     # Initialize simulation state vectors
-    state = {var: np.ones([ncells])*values[0] for var, [t, values] in sw_data.items()
-             if var in advect_vars}
+    if ballistic:
+        from .ballistic import backmap
+        state = {var: backmap(l1data, var, x).astype(dtype)
+                 for var in sw_data.keys() if var in advect_vars}
+    else:
+        state = {var: np.full([ncells], values[0], dtype=dtype)
+                 for var, [t, values] in sw_data.items() if var in advect_vars}
     state['x'] = x
 
     # Dictionary to hold output variables
@@ -183,7 +317,18 @@ def initialize(sw_data, advect_vars=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T
     return state, outdata, t0, l1data
 
 
-def iterate(state, t, outdata, sw_data, nuMax=0.5, output_x=0, limiter='Minmod'):
+# Names of the flux limiter functions in limiters.py
+limiter_names = ['FirstOrderUpwind', 'LaxWendroff', 'Minmod', 'Harmonic', 'Geometric',
+                 'Superbee']
+
+# Limiters that rely on the explicit scheme's time-centering to be TVD, and
+# so can not be used with the Runge-Kutta schemes
+ssprk_unsupported_limiters = ['Superbee']
+
+
+def iterate(state, t, outdata, sw_data, nuMax=0.5, output_x=0, limiter='Minmod',
+            executor=None, trim=False, trim_margin=4, scheme='explicit', adaptive=False,
+            skip_quiet=False, quiet_tol=0., activity=None):
     """
     Advect L1 observations to Earth
 
@@ -195,13 +340,50 @@ def iterate(state, t, outdata, sw_data, nuMax=0.5, output_x=0, limiter='Minmod')
     nuMax: Maximum allowed CFL
     output_x: x coordinate (in the GSM/GSE coordinate system with units of km) where
               output values should be provided
+    limiter: Name of one of the flux limiter functions in limiters.py
+    executor: Optional concurrent.futures.Executor (normally a ThreadPoolExecutor)
+              used to step the passively advected variables concurrently
+    trim: If True, only step the cells between output_x and the satellite
+          (the rest of the grid never affects the output)
+    trim_margin: Number of extra cells stepped beyond each end of the trimmed
+                 region, so the flux stencil near its ends is unaffected
+    scheme: "explicit" for the flux-limited explicit scheme (requires
+            nuMax<1), "ssprk2" or "ssprk3" for the same fluxes integrated with
+            a second or third order SSP Runge-Kutta scheme, or
+            "semilagrangian" for the semi-Lagrangian scheme, which is stable
+            for nuMax>1
+    adaptive: If True, allow for a non-uniform grid (as produced by regrid)
+    skip_quiet: If True, only step the ranges of cells where some variable
+                is not uniform (explicit scheme only)
+    quiet_tol: Relative differences between neighboring cells no larger than
+               this are treated as uniform, if skip_quiet. With the default of 0 the
+               results are identical to stepping every cell.
+    activity: Optional dictionary in which the ranges of cells to step are
+              kept between calls, if skip_quiet. The ranges are then grown
+              from one step to the next instead of being found from scratch.
+              Clear it whenever the grid changes (as in regrid).
     """
 
-    from .advect1d import step, step_burgers, updateboundary
+    from .advect1d import (step, step_burgers, updateboundary, departure_points,
+                           step_semilagrangian, step_semilagrangian_burgers,
+                           face_positions, step_ssprk, step_ssprk_burgers,
+                           active_ranges, grow_ranges, cell_sizes, interp_window)
+
+    if scheme not in ('explicit', 'ssprk2', 'ssprk3', 'semilagrangian'):
+        raise ValueError("Invalid scheme '{}'".format(scheme))
+
+    if skip_quiet and scheme != 'explicit':
+        raise ValueError('skip_quiet is only supported by the explicit scheme')
+
+    if scheme.startswith('ssprk') and limiter in ssprk_unsupported_limiters:
+        raise ValueError("The {} limiter is not TVD with the {} scheme; use Minmod "
+                         "or Harmonic instead".format(limiter, scheme))
 
-    u = state['ux']
     x = state['x']
-    dx = x[1]-x[0]
+    if adaptive:
+        dx = np.diff(face_positions(x))
+    else:
+        dx = x[1]-x[0]
 
     # Variables to be advected include everything in state except 'x'
     advect_vars = list(state.keys())
@@ -211,24 +393,106 @@ def iterate(state, t, outdata, sw_data, nuMax=0.5, output_x=0, limiter='Minmod')
     advect_vars.remove('ux')
     advect_vars.append('ux')
 
+    if scheme == 'semilagrangian':
+        # Up to nuMax cells cross the satellite each step, so they all need
+        # boundary values
+        nfill = int(np.ceil(nuMax))+1
+        trim_margin = max(trim_margin, nfill+2)
+        speed = interp_window(t, *sw_data['ux'])
+    elif scheme.startswith('ssprk'):
+        # The intermediate stages update the cells next to the satellite, so
+        # the cells upstream of it (which the reconstruction reaches into)
+        # need boundary values too
+        nfill = 3
+        trim_margin = max(trim_margin, nfill+2)
+        speed = interp_window(t, *sw_data['ux'])
+    else:
+        nfill = 1
+        speed = None
+
     # Update boundary conditions with values at new time step
     for var in advect_vars:
         a = state[var]
         var_t, values = sw_data[var]
         x_sat_t, x_sat = sw_data['x']
-        updateboundary(a, t, x, x_sat, x_sat_t, values, var_t)
+        ind = updateboundary(a, t, x, x_sat, x_sat_t, values, var_t, nfill, speed)
+
+    if trim:
+        # Region between the output location and the cell holding the
+        # boundary conditions. This follows the satellite as it moves.
+        lo = max(np.searchsorted(x, output_x)-trim_margin, 0)
+        hi = min(ind+1+trim_margin, len(x))
+        active = slice(lo, hi)
+    else:
+        active = slice(None)
+
+    # Views of the state in the region to be stepped
+    u = state['ux'][active]
+    active_state = {var: state[var][active] for var in advect_vars}
 
-    # Find the time step
-    dt = nuMax/np.abs(np.min(u))*dx
+    # Find the time step (always in double precision, whatever the type of u,
+    # so that time does not drift as it accumulates)
+    if adaptive:
+        dx = dx[active]
+        dt = nuMax*float(np.min(dx/np.abs(u)))
+    else:
+        dt = nuMax/np.abs(float(np.min(u)))*dx
+
+    if scheme == 'semilagrangian':
+        x_active = x[active]
+        departure, U = departure_points(x_active, u, dt)
+
+        def step_passive(var):
+            step_semilagrangian(active_state[var], x_active, departure)
+    elif scheme.startswith('ssprk'):
+        order = int(scheme[-1])
+
+        def step_passive(var):
+            step_ssprk(active_state[var], u, dx, dt, limiter, order)
+    elif skip_quiet:
+        if activity is None:
+            activity = {}
+        if activity.get('ranges') is None:
+            ranges = active_ranges([state[var] for var in advect_vars], quiet_tol)
+        else:
+            ranges = grow_ranges(activity['ranges'], len(x), [(ind, ind+nfill)])
+        activity['ranges'] = ranges
+
+        # Slices of the region being stepped covering each range of cells to
+        # update, plus the two cells the stencil reaches beyond each end
+        lo, hi, _ = active.indices(len(x))
+        regions = [slice(max(start, lo+2)-lo-2, min(stop, hi-2)-lo+2)
+                   for start, stop in ranges if start < hi-2 and stop > lo+2]
+
+        def step_passive(var):
+            for region in regions:
+                step(active_state[var][region], u[region],
+                     cell_sizes(dx, region.start, region.stop), dt, limiter)
+    else:
+        def step_passive(var):
+            step(active_state[var], u, dx, dt, limiter)
 
     # Step variables forward in time
-    for var in advect_vars[:-1]:
-        a = state[var]
-        step(a, u, dx, dt, limiter)
+    if executor is None:
+        for var in advect_vars[:-1]:
+            step_passive(var)
+    else:
+        # The passive variables depend only on ux (which is not modified until
+        # they are all done), so they can be stepped concurrently. NumPy
+        # releases the GIL for the bulk of the work in step.
+        list(executor.map(step_passive, advect_vars[:-1]))
 
     # ux handled separately since it has a different governing equation
-    step_burgers(u, dx, dt, limiter)
-    state['ux'][:] = u
+    # (and must be stepped last since the other variables are advected by it)
+    if scheme == 'semilagrangian':
+        step_semilagrangian_burgers(u, x_active, U)
+    elif scheme.startswith('ssprk'):
+        step_ssprk_burgers(u, dx, dt, limiter, order)
+    elif skip_quiet:
+        for region in regions:
+            step_burgers(u[region], cell_sizes(dx, region.start, region.stop), dt, limiter)
+    else:
+        step_burgers(u, dx, dt, limiter)
 
     # Store output state
     for var in advect_vars:
@@ -242,25 +506,57 @@ def iterate(state, t, outdata, sw_data, nuMax=0.5, output_x=0, limiter='Minmod')
 
     return dt
 
+def regrid(state, alpha=5, refine_vars=['ux', 'n', 'bx', 'by', 'bz']):
+    """
+    Move the grid cells so that they are concentrated at steep gradients
+    (see advect1d.refine_grid), and interpolate the state onto the new grid
+
+    state: dictionary of state variables, as generated by initialize()
+    alpha: Approximate ratio of the largest to the smallest cell size
+    refine_vars: Variables whose gradients are used to place the cells
+    """
+
+    from .advect1d import refine_grid
+
+    x = state['x']
+    x_new = refine_grid(x, [state[var] for var in refine_vars if var in state], alpha)
+
+    for var in state.keys():
+        if var == 'x': continue
+        state[var][:] = np.interp(x_new, x, state[var])
+
+    state['x'] = x_new
+
+
 def convert_proxy(proxy):
 
-    proxy = proxy or os.environment.get('http_proxy') or os.environment.get('HTTP_PROXY')
+    proxy = proxy or os.environ.get('http_proxy') or os.environ.get('HTTP_PROXY')
+
+    if not proxy:
+        return None
 
-    if proxy:
-        # Convert proxy URL into a tuple to be passed to
-        # urllib2.Request.set_proxy
-        import re
-        m = re.match('((?P<scheme>[a-z]+)://)?(?P<host>\w+)/?', proxy)
-        scheme = m.group('scheme') or 'http'
-        host = m.group('host')
+    # Convert proxy URL into a tuple to be passed to
+    # urllib2.Request.set_proxy
+    import re
+    m = re.match(r'((?P<scheme>[a-z]+)://)?(?P<host>[^/]+)/?', proxy)
+    scheme = m.group('scheme') or 'http'
+    host = m.group('host')
 
     return (host, scheme)
 
-def parse_args(starttime=None, endtime=None):
+def make_parser(starttime=None, endtime=None, **kwargs):
+    """
+    Create an argument parser with the options common to the advect1d command
+    line tools
+
+    starttime: Default start time
+    endtime: Default end time
+    kwargs: Passed to ArgumentParser
+    """
     from argparse import ArgumentParser
     import dateutil.parser
 
-    parser = ArgumentParser()
+    parser = ArgumentParser(**kwargs)
 
     starttime = starttime or datetime(2017, 9, 6, 20)
     endtime = endtime or datetime(2017, 9, 7, 5)
@@ -289,8 +585,60 @@ def parse_args(starttime=None, endtime=None):
                         dest='ncells',
                         help='Number of cells, between L1 and Earth, used by advection ' +
                              'code. Defaults to 1000.')
+    parser.add_argument('--scheme', default='explicit',
+                        choices=['explicit', 'ssprk2', 'ssprk3', 'semilagrangian'],
+                        help='Numerical scheme used by the advection solver. ' +
+                             'ssprk2 and ssprk3 integrate the explicit ' +
+                             "scheme's fluxes with SSP Runge-Kutta time " +
+                             'stepping. The semi-Lagrangian scheme is stable for CFL ' +
+                             'numbers above 1 (see --nu-max). Defaults to explicit.')
+    parser.add_argument('--nu-max', type=float, default=0.5, dest='nuMax',
+                        help='CFL number used to choose the time step. Must ' +
+                             'be below 1 for the explicit scheme. Defaults to 0.5.')
+    parser.add_argument('--limiter', default='Minmod', choices=limiter_names,
+                        help='Flux limiter used by the explicit and Runge-Kutta ' +
+                             'schemes. Superbee can not be used with ssprk2 or ' +
+                             'ssprk3. Defaults to Minmod.')
+    parser.add_argument('--adaptive-grid', action='store_true', dest='adaptive',
+                        help='Periodically move the grid cells to concentrate ' +
+                             'them at shocks and other steep gradients')
+    parser.add_argument('--skip-quiet', action='store_true', dest='skip_quiet',
+                        help='Only step the parts of the grid where the solar ' +
+                             'wind is not uniform (explicit scheme only). The ' +
+                             'output is unchanged unless --quiet-tol is set.')
+    parser.add_argument('--quiet-tol', type=float, default=0., dest='quiet_tol',
+                        help='Relative differences between neighboring cells ' +
+                             'no larger than this are treated as uniform by ' +
+                             '--skip-quiet. ' +
+                             'Defaults to 0.')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Number of threads used to step the passively ' +
+                             'advected variables concurrently. By default ' +
+                             'they are stepped serially.')
+    parser.add_argument('--dtype', default='float64', choices=['float32', 'float64'],
+                        help='Floating point precision of the advected ' +
+                             'variables. Defaults to float64.')
+    parser.add_argument('--trim-domain', action='store_true', dest='trim',
+                        help='Only step the part of the grid between the ' +
+                             'output location and the spacecraft, instead ' +
+                             'of the whole grid out to L1')
+    parser.add_argument('--method', default='advect', choices=['advect', 'ballistic'],
+                        help='Propagation method: "advect" solves the advection ' +
+                             'equations on a grid, "ballistic" time-shifts each ' +
+                             'observation using its own velocity (much faster, ' +
+                             'but does not model interactions between solar wind ' +
+                             'streams). Defaults to advect.')
+    parser.add_argument('--ballistic-init', action='store_true', dest='ballistic',
+                        help='Fill the grid at the start time by ballistically ' +
+                             'propagating earlier observations, so that output ' +
+                             'is usable from the start time')
     parser.add_argument('--source', default='DSCOVR',
                         help='Solar wind data source ("ACE" or "DSCOVR")')
+    parser.add_argument('--l1-store', dest='store', default=None,
+                        help='Directory in which to store the solar wind data ' +
+                             'on disk, a day at a time, so that long intervals ' +
+                             'need not fit in memory. An existing store of the ' +
+                             'same data is reused.')
     parser.add_argument('--proxy', help='Proxy server URL', type=convert_proxy)
     parser.add_argument('--disable-noise', action='store_true',
                         help='By default, data gaps in the upstream solar ' +
@@ -299,8 +647,26 @@ def parse_args(starttime=None, endtime=None):
                              'and S. Morley. With this argument, the noisy ' +
                              'interpolation is disabled and a linear ' +
                              'interpolation used instead')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the noise used to fill data gaps. Runs ' +
+                             'with the same seed use the same noise.')
     parser.add_argument('-c', '--config', dest='configFile', default=None,
                         help='Name of configuration file to use (optional)')
+
+    return parser
+
+
+def parse_args(starttime=None, endtime=None, parser=None):
+    """
+    Parse command line arguments
+
+    starttime: Default start time
+    endtime: Default end time
+    parser: Argument parser to use (defaults to the one returned by make_parser)
+    """
+
+    parser = parser or make_parser(starttime, endtime)
+
     args = parser.parse_args()
 
     # handle config file if present
@@ -314,88 +680,285 @@ def parse_args(starttime=None, endtime=None):
                 config.readfp(fh)  # legacy Python 2 support
         for ckey in config.options('Settings'):
             try:
-                setting = config.get('Settings', ckey)
-                if ckey.endswith('time'):
-                    setting = datetime.strptime(setting, '%Y-%m-%dT%H:%M:%S')
-                elif ckey.lower() in ['ncells', 'output_x']:
-                    setting = int(setting)
-                args.__dict__[ckey] = setting
+                args.__dict__[ckey] = convert_setting(ckey, config.get('Settings', ckey))
             except:
                 pass
 
     return args
 
 
-def fetch_solarwind(starttime, endtime, source='DSCOVR', proxy=None, noise=True):
+def convert_setting(key, setting):
+    """
+    Convert a setting read from a configuration file to the appropriate type
+
+    key: Name of the setting
+    setting: String value of the setting
+    """
+
+    if key.endswith('time'):
+        return datetime.strptime(setting, '%Y-%m-%dT%H:%M:%S')
+    elif key.lower() in ['ncells', 'output_x', 'seed']:
+        return int(setting)
+    else:
+        return setting
+
+
+def fetch_solarwind(starttime, endtime, source='DSCOVR', proxy=None, noise=True, seed=None,
+                    ndraws=None):
+    """
+    Fetch solar wind data and fill the gaps in them
+
+    starttime, endtime: Time range of the data
+    source: Solar wind data source ("ACE" or "DSCOVR")
+    proxy: Proxy server, as returned from convert_proxy
+    noise: Use noisy interpolation to fill data gaps
+    seed: Seed for the noise. The same seed gives the same noise. If not
+          given, the noise is different for each new time range (but is
+          cached along with the data).
+    ndraws: If given, return a list of this many ensemble members, with the
+            gaps filled with independent noise in each
+
+    Returns: sw_data dictionary, as returned from load_acedata or load_dscovr
+    """
+
     if source == 'DSCOVR':
-        sw_data = load_dscovr(starttime, endtime, proxy=proxy, noise=noise)
+        sw_data = load_dscovr(starttime, endtime, noise=noise, proxy=proxy, seed=seed,
+                              ndraws=ndraws)
     elif source == 'ACE':
-        sw_data = load_acedata(starttime, endtime, proxy=proxy, noise=noise)
+        sw_data = load_acedata(starttime, endtime, noise=noise, proxy=proxy, seed=seed,
+                               ndraws=ndraws)
     else:
         raise ValueError("Invalid source '{}'".format(source))
 
     return sw_data
 
-def detect_pybats_imf_vars(imf):
+def fetch_with_spinup(starttime, endtime, source='DSCOVR', proxy=None, noise=True,
+                      output_x=203872, min_speed=250, seed=None):
+    """
+    Fetch solar wind data, starting early enough to cover the time it takes
+    the solar wind to travel from the spacecraft to output_x
 
-    for denvar in ['rho','n']:
-        if denvar in imf.keys(): break
-    else:
-        raise ValueError("Could not identify the ImfInput density variable")
+    min_speed: Solar wind speed (km/s) used for the initial guess at the
+               spin-up time. If the slowest observed speed is lower, the data
+               are fetched again with a longer spin-up.
 
-    for tempvar in ['temp','t']:
-        if tempvar in imf.keys(): break
-    else:
-        raise ValueError("Could not identify the ImfInput temperature variable")
+    Other arguments are as for fetch_solarwind
 
-    return denvar, tempvar
+    Returns: sw_data dictionary, as returned from fetch_solarwind
+    """
 
-def fetch_and_advect(starttime, endtime, source='DSCOVR', proxy=None, output_x=203872, ncells=1000, noise=True):
+    from .ballistic import spinup_time
 
-    from . import __version__
+    # Initial guess at the spin-up time, refined using the observed speeds
+    spinup = timedelta(seconds=(1.6e6-output_x)/min_speed)
 
-    imf = pybats.ImfInput(load=False)
+    for attempt in range(3):
+        sw_data = fetch_solarwind(starttime-spinup, endtime, source=source,
+                                  proxy=proxy, noise=noise, seed=seed)
+        needed = spinup_time(sw_data, output_x)
+        if needed <= spinup:
+            break
+        spinup = needed*1.1
 
-    denvar, tempvar = detect_pybats_imf_vars(imf)
+    return sw_data
 
-    # Fetch solar wind data
-    sw_data = fetch_solarwind(starttime, endtime, source=source, proxy=proxy, noise=noise)
+
+def advect(sw_data, output_x=203872, ncells=1000, nuMax=0.5, limiter='Minmod', threads=None,
+           dtype=np.float64, trim=False, t0=None, ballistic=False, scheme='explicit',
+           adaptive=False, regrid_interval=10, refine_alpha=5, skip_quiet=False,
+           quiet_tol=0., quiet_interval=20):
+    """
+    Advect L1 solar wind data to output_x
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned from
+             load_acedata or load_dscovr, or an l1store.L1Store
+    output_x: x coordinate (GSM/GSE, km) where output values should be provided
+    ncells: Number of cells in the computational grid
+    nuMax: Maximum allowed CFL
+    limiter: Name of one of the flux limiter functions in limiters.py
+    threads: If given, step the passively advected variables concurrently using
+             a pool of this many threads
+    dtype: Floating point type of the advected state variables (e.g. np.float32
+           to halve memory traffic on large grids)
+    trim: If True, only step the part of the grid between output_x and the
+          satellite
+    t0: Start time of the simulation (see initialize)
+    ballistic: If True, initialize the grid by ballistically propagating the
+               observations made before t0 (see initialize)
+    scheme: "explicit", "ssprk2", "ssprk3" or "semilagrangian" (see iterate)
+    adaptive: If True, periodically move the grid cells to concentrate them at
+              shocks and other steep gradients (see regrid)
+    regrid_interval: Number of steps between moves of the grid, if adaptive
+    refine_alpha: Approximate ratio of the largest to the smallest cell size,
+                  if adaptive
+    skip_quiet: If True, skip cells where the solar wind is uniform (see iterate)
+    quiet_tol: Tolerance used to identify uniform cells, if skip_quiet
+    quiet_interval: Number of steps between searches for uniform cells, if
+                    skip_quiet (in between, the region being stepped grows
+                    by the width of the stencil each step)
+
+    Returns: Dictionary of output time series (arrays, with times in seconds
+             since t0), and t0
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
 
     # Initialize the simulation state
-    state, outdata, t0, l1data_tnum = initialize(sw_data, ncells=ncells, output_x=output_x)
+    state, outdata, t0, l1data_tnum = initialize(sw_data, ncells=ncells, output_x=output_x,
+                                                 dtype=dtype, t0=t0, ballistic=ballistic)
 
     # Stop time of simulation is last point for which all variables have valid data
     tmax = np.min([t[-1] for var, (t, values) in l1data_tnum.items()])
 
+    executor = ThreadPoolExecutor(threads) if threads else None
+
+    # Ranges of cells being stepped, if skip_quiet
+    activity = {}
+
     # Step forward in time
     t = 0
     i = 0
-    while t < tmax:
-        dt = iterate(state, t, outdata, l1data_tnum, output_x=output_x)
-        t += dt
-        i += 1
+    try:
+        while t < tmax:
+            if adaptive and i % regrid_interval == 0:
+                regrid(state, refine_alpha)
+                activity.clear()
+            if i % quiet_interval == 0:
+                activity.clear()
+            dt = iterate(state, t, outdata, l1data_tnum, nuMax=nuMax, output_x=output_x,
+                         limiter=limiter, executor=executor, trim=trim, scheme=scheme,
+                         adaptive=adaptive, skip_quiet=skip_quiet, quiet_tol=quiet_tol,
+                         activity=activity)
+            t += dt
+            i += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    outdata = {var: np.array(values) for var, values in outdata.items()}
+
+    return outdata, t0
+
+
+def advect_ballistic(sw_data, output_x=203872, cadence=60,
+                     advect_vars=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T']):
+    """
+    Propagate L1 solar wind data to output_x ballistically, as a fast
+    alternative to advect
+
+    Each observation travels to output_x at its own observed velocity.
+    Observations overtaken by faster solar wind are discarded.
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned from
+             load_acedata or load_dscovr
+    output_x: x coordinate (GSM/GSE, km) where output values should be provided
+    cadence: Time between output values (seconds)
+    advect_vars: Keys in the sw_data dictionary for variables to propagate
+
+    Returns: Dictionary of output time series (times in seconds since t0), and t0,
+             in the same form as returned by advect
+    """
+
+    from .ballistic import arrival_times
+
+    l1data, t0 = to_seconds(sw_data)
+
+    advect_vars = [var for var in advect_vars if var in l1data]
+
+    arrivals = {var: arrival_times(l1data, var, output_x) for var in advect_vars}
+
+    # Output covers the times for which every variable has arrived
+    tstart = np.max([t_arrival[0] for t_arrival, values in arrivals.values()])
+    tend = np.min([t_arrival[-1] for t_arrival, values in arrivals.values()])
+    times = np.arange(tstart, tend, cadence)
+
+    outdata = {var: np.interp(times, t_arrival, values)
+               for var, (t_arrival, values) in arrivals.items()}
+    outdata['time'] = times
+
+    return outdata, t0
+
+
+def write_output(outdata, t0, imf_file='IMF_data.dat', hdf_file='advected.h5', header=''):
+    """
+    Write advected solar wind data to an SWMF IMF input file and an HDF5 file
+
+    outdata: Dictionary of output time series, as returned from advect
+    t0: Epoch for the times in outdata['time']
+    imf_file: Name of the SWMF IMF input file to write (compressed with gzip
+              if the name ends in .gz)
+    hdf_file: Name of the HDF5 file to write
+    header: Header text for the IMF input file
+    """
+
+    from spacepy import datamodel as dm
+    from . import imf_io
+
+    outdata = dict(outdata)
 
     # Convert timesteps to datetimes
-    outdata['time'] = [starttime + timedelta(seconds=n)
-                       for n in outdata['time']]
+    outdata['time'] = from_seconds(outdata['time'], t0)
 
     # Set up pram and temp keys
     outdata['pram_1'] = np.multiply(outdata['ux'], outdata['ux'])
     outdata['pram_2'] = np.multiply(outdata['pram_1'], outdata['n'])
     outdata['pram'] = 1.67621e-6*outdata['pram_2']
 
-    outdata[tempvar] = outdata['T']
-    outdata[denvar] = outdata['n']
+    outdata['t'] = outdata['T']
 
-    # Set up dictionary
-    for key in imf.keys():
-        if key=='v': continue
-        imf[key] = dm.dmarray(outdata[key])
+    # Write the IMF data to .dat file
+    imf_io.write_imf(imf_file, outdata, header=header, coor='GSE')
+
+    # Write the IMF data to .h5 file
+    outhdf = dm.SpaceData()
+    for key in outdata.keys():
+        outhdf[key] = dm.dmarray(outdata[key])
+    outhdf['time'].attrs['epoch'] = t0.isoformat()
+    outhdf.toHDF5(hdf_file)
+
+
+def read_output(group, variables=['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T'],
+                starttime=None, endtime=None):
+    """
+    Read advected solar wind data from an HDF5 file written by write_output
+
+    Only the times and the requested variables between starttime and endtime
+    are read from the file.
+
+    group: An open h5py File (or, for files written by sweep.write_sweep,
+           the Group holding one run)
+    variables: Names of the variables to read
+    starttime, endtime: Time range to read (by default, all of it)
+
+    Returns: Dictionary with 'time' (datetime64) and a float array for each
+             variable
+    """
+
+    times = group['time'][...].astype('datetime64[us]')
+    start = 0 if starttime is None else np.searchsorted(times, np.datetime64(starttime, 'us'))
+    end = len(times) if endtime is None else \
+        np.searchsorted(times, np.datetime64(endtime, 'us'), side='right')
+
+    data = {'time': times[start:end]}
+    for var in variables:
+        data[var] = group[var][start:end].astype(np.float64)
+
+    return data
 
-    imf['v']=-np.array(outdata['ux'])
 
-    imf.attrs['coor']='GSE'
-    imf.attrs['header']='\nCreated using advect1d.advect_imf {version} using solar wind data from {source}, gaps filled with {interpolation} interpolation, advected to x={output_x} km using a {ncells} cell grid.\n\n'.format(
+def imf_header(source, output_x, ncells, noise, method='advect'):
+    """
+    Header text describing how an advected IMF input file was produced
+    """
+
+    from . import __version__
+
+    if method == 'ballistic':
+        propagation = 'ballistically propagated to x={output_x} km'
+    else:
+        propagation = 'advected to x={output_x} km using a {ncells} cell grid'
+
+    return ('\nCreated using advect1d.advect_imf {version} using solar wind data from {source}, gaps filled with {interpolation} interpolation, '+propagation+'.\n\n').format(
         source=source,
         version=__version__,
         interpolation='noisy' if noise else 'linear',
@@ -403,17 +966,85 @@ def fetch_and_advect(starttime, endtime, source='DSCOVR', proxy=None, output_x=2
         output_x=output_x
     )
 
-    # Write the IMF data to .dat file
-    imf.write('IMF_data.dat')
 
-    # Write the IMF data to .h5 file
-    outhdf = dm.SpaceData()
-    for key in outdata.keys():
-        outhdf[key] = dm.dmarray(outdata[key])
-    outhdf['time'].attrs['epoch'] = t0.isoformat()
-    outhdf.toHDF5('advected.h5')
+def fetch_window(starttime, endtime, source='DSCOVR', proxy=None, output_x=203872, noise=True,
+                 ballistic=False, method='advect', store=None, seed=None):
+    """
+    Fetch the solar wind data that fetch_and_advect needs for a window
 
-if __name__ == '__main__':
+    store: If given, write the data a day at a time to an out-of-core store
+           in this directory (see l1store) and return it memory-mapped,
+           instead of holding it all in memory
+
+    Other arguments are as for fetch_and_advect
+
+    Returns: (sw_data, t0) tuple, where t0 is the epoch to pass to advect
+             (None to start from the first observation)
+    """
+
+    if method not in ('advect', 'ballistic'):
+        raise ValueError("Invalid method '{}'".format(method))
+
+    if store is not None:
+        if ballistic or method == 'ballistic':
+            raise ValueError('Ballistic propagation is not supported with an L1 data store')
+        from .l1store import build_store
+        return build_store(store, starttime, endtime, source=source, proxy=proxy,
+                           noise=noise, seed=seed), None
+
+    if ballistic and method == 'advect':
+        # Also fetch the data needed to fill the grid at starttime
+        sw_data = fetch_with_spinup(starttime, endtime, source=source, proxy=proxy,
+                                    noise=noise, output_x=output_x, seed=seed)
+        return sw_data, starttime
+
+    return fetch_solarwind(starttime, endtime, source=source, proxy=proxy, noise=noise,
+                           seed=seed), None
+
+
+def advect_and_write(sw_data, t0=None, source='DSCOVR', output_x=203872, ncells=1000, noise=True,
+                     imf_file='IMF_data.dat', hdf_file='advected.h5', threads=None, dtype=np.float64,
+                     trim=False, ballistic=False, method='advect', scheme='explicit', nuMax=0.5,
+                     adaptive=False, skip_quiet=False, quiet_tol=0., limiter='Minmod'):
+    """
+    Advect solar wind data returned from fetch_window and write the output files
+
+    sw_data, t0: As returned from fetch_window
+
+    Other arguments are as for fetch_and_advect (source and noise are only
+    used to describe the data in the output header)
+    """
+
+    if method == 'ballistic':
+        outdata, t0 = advect_ballistic(sw_data, output_x=output_x)
+    else:
+        outdata, t0 = advect(sw_data, output_x=output_x, ncells=ncells, threads=threads,
+                             dtype=dtype, trim=trim, t0=t0, ballistic=ballistic,
+                             scheme=scheme, nuMax=nuMax, adaptive=adaptive,
+                             skip_quiet=skip_quiet, quiet_tol=quiet_tol, limiter=limiter)
+
+    write_output(outdata, t0, imf_file=imf_file, hdf_file=hdf_file,
+                 header=imf_header(source, output_x, ncells, noise, method))
+
+
+def fetch_and_advect(starttime, endtime, source='DSCOVR', proxy=None, output_x=203872, ncells=1000, noise=True,
+                     imf_file='IMF_data.dat', hdf_file='advected.h5', threads=None, dtype=np.float64,
+                     trim=False, ballistic=False, method='advect', scheme='explicit', nuMax=0.5,
+                     adaptive=False, skip_quiet=False, quiet_tol=0., store=None, limiter='Minmod',
+                     seed=None):
+
+    # Fetch solar wind data
+    sw_data, t0 = fetch_window(starttime, endtime, source=source, proxy=proxy,
+                               output_x=output_x, noise=noise, ballistic=ballistic,
+                               method=method, store=store, seed=seed)
+
+    advect_and_write(sw_data, t0, source=source, output_x=output_x, ncells=ncells, noise=noise,
+                     imf_file=imf_file, hdf_file=hdf_file, threads=threads, dtype=dtype,
+                     trim=trim, ballistic=ballistic, method=method, scheme=scheme,
+                     nuMax=nuMax, adaptive=adaptive, skip_quiet=skip_quiet,
+                     quiet_tol=quiet_tol, limiter=limiter)
+
+def advect_imf_cli():
 
     args = parse_args()
 
@@ -425,5 +1056,26 @@ if __name__ == '__main__':
     proxy = args.proxy
     output_x = args.output_x
     ncells = args.ncells
+    threads = args.threads
+    dtype = np.dtype(args.dtype)
+    trim = args.trim
+    ballistic = args.ballistic
+    method = args.method
+    scheme = args.scheme
+    nuMax = args.nuMax
+    adaptive = args.adaptive
+    skip_quiet = args.skip_quiet
+    quiet_tol = args.quiet_tol
+    store = args.store
+    limiter = args.limiter
+    seed = args.seed
+
+    fetch_and_advect(starttime, endtime, source, proxy, output_x, ncells, noise=noise,
+                     threads=threads, dtype=dtype, trim=trim, ballistic=ballistic,
+                     method=method, scheme=scheme, nuMax=nuMax, adaptive=adaptive,
+                     skip_quiet=skip_quiet, quiet_tol=quiet_tol, store=store,
+                     limiter=limiter, seed=seed)
+
+if __name__ == '__main__':
 
-    fetch_and_advect(starttime, endtime, source, proxy, output_x, ncells)
+    advect_imf_cli()
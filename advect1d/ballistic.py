@@ -0,0 +1,104 @@
+"""
+Ballistic propagation of solar wind observations, in which each observation
+is assumed to travel at its own (constant) observed velocity.
+"""
+
+import numpy as np
+from datetime import timedelta
+
+
+def not_overtaken(arrival):
+    """
+    Find samples that are not overtaken by any later sample
+
+    arrival: Arrival times (at a fixed position) or positions (at a fixed time)
+             of samples, ordered by observation time. A sample is overtaken if
+             some later sample arrives no later than it does (or has reached
+             a position no further downstream).
+
+    Returns: Boolean mask of samples that are not overtaken
+    """
+
+    # Minimum over all later samples
+    later_min = np.append(np.minimum.accumulate(arrival[::-1])[::-1][1:], np.inf)
+
+    return arrival < later_min
+
+
+def backmap(l1data, var, x, t=0):
+    """
+    Estimate the values of a variable in grid cells by ballistically
+    propagating observations made before time t
+
+    l1data: Dictionary of L1 solar wind data with numerical times, as returned
+            from advect_imf.to_seconds
+    var: Variable to map
+    x: Positions of grid cells
+    t: Time at which to map the observations
+
+    Returns: Array of values of var at each position in x. Cells downstream of
+             the oldest observation get the oldest observed value, and cells
+             upstream of the satellite get the value observed at time t.
+    """
+
+    t_var, values = l1data[var]
+    t_u, ux = l1data['ux']
+    t_x, x_sat = l1data['x']
+
+    earlier = t_var <= t
+    t_obs = t_var[earlier]
+    values = np.asarray(values)[earlier]
+
+    # Where each observation has travelled to by time t
+    u_obs = np.interp(t_obs, t_u, ux)
+    x_obs = np.interp(t_obs, t_x, x_sat)
+    position = x_obs+u_obs*(t-t_obs)
+
+    # Observations that were overtaken by faster wind are dropped. The rest
+    # are ordered by increasing position.
+    keep = not_overtaken(position)
+
+    return np.interp(x, position[keep], values[keep])
+
+
+def arrival_times(l1data, var, output_x):
+    """
+    Find when each observation of a variable reaches output_x
+
+    l1data: Dictionary of L1 solar wind data with numerical times, as returned
+            from advect_imf.to_seconds
+    var: Variable to propagate
+    output_x: x coordinate (GSM/GSE, km) the observations are propagated to
+
+    Returns: Arrival times and values of the observations that are not
+             overtaken by faster solar wind, in increasing order of arrival
+    """
+
+    t_var, values = l1data[var]
+    t_u, ux = l1data['ux']
+    t_x, x_sat = l1data['x']
+
+    u_obs = np.interp(t_var, t_u, ux)
+    x_obs = np.interp(t_var, t_x, x_sat)
+    arrival = t_var+(output_x-x_obs)/u_obs
+
+    keep = not_overtaken(arrival)
+
+    return arrival[keep], np.asarray(values)[keep]
+
+
+def spinup_time(sw_data, output_x=203872):
+    """
+    Time needed for the solar wind to cross from the spacecraft to output_x
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned from
+             load_acedata or load_dscovr
+    output_x: x coordinate (GSM/GSE, km) where output values are needed
+
+    Returns: Spin-up time (timedelta), computed using the slowest observed speed
+    """
+
+    t, ux = sw_data['ux']
+    t, x_sat = sw_data['x']
+
+    return timedelta(seconds=float((np.max(x_sat)-output_x)/np.min(np.abs(ux))))
@@ -11,6 +11,7 @@ except ImportError:
 
 import hashlib
 import sys
+import time
 from functools import partial
 
 if sys.version_info >= (3, 9):
@@ -22,19 +23,40 @@ def get_cache_filename(func, args, kwargs):
 
     import hashlib
 
-    # Pickle the function name and arguments
-    key=pkl.dumps((func.__name__,args,frozenset(list(kwargs.keys())),
-                   frozenset(list(kwargs.values()))))
+    # Pickle the function name and arguments (keyword arguments sorted by
+    # name, so that each value stays paired with its name)
+    key=pkl.dumps((func.__name__,args,tuple(sorted(kwargs.items()))))
 
     # Convert the pickled data into a (shorter) unique filename
     cachename=md5(key).hexdigest()+'.pkl'
 
     return cachename
 
-def cache_result(clear=False,checkfunc=None,maxsize=10, cache_dir='cache'):
-
+def cache_result(clear=False,checkfunc=None,maxsize=10, cache_dir='cache', ignore=(), ttl=None,
+                 cache_if=None, stale_on_error=()):
+    """
+    Cache the results of a function in pickle files
+
+    clear: If True, always call the function (and overwrite the cache)
+    checkfunc: Optional function that returns True if a cache file is stale.
+               It is called with the path of the cache file followed by the
+               arguments of the function.
+    maxsize: Number of results held in memory
+    cache_dir: Directory where cache files are written
+    ignore: Names of keyword arguments that do not affect the result (such
+            as a proxy server), which are left out of the cache key
+    ttl: Optional age in seconds after which a cache file is stale
+    cache_if: Optional function of the result that returns False if the
+              result should not be written to the cache
+    stale_on_error: Exception types (such as network errors) that, when
+                    raised while refreshing a stale cache file, are ignored
+                    and the stale result returned instead
+    """
+
+    # The modification time is part of the key so that results held in
+    # memory are dropped once their cache file is rewritten
     @lru_cache(maxsize=maxsize)
-    def load_cache(cache_path):
+    def load_cache(cache_path, mtime):
 
         with open(cache_path, 'rb') as cache_file:
             return pkl.load(cache_file)
@@ -44,7 +66,8 @@ def cache_result(clear=False,checkfunc=None,maxsize=10, cache_dir='cache'):
         def wrapper(*args,**kwargs):
 
             # Generate a unique name for the function call
-            cachename=get_cache_filename(func,args,kwargs)
+            cachename=get_cache_filename(func,args,{key:value for key,value in kwargs.items()
+                                                    if key not in ignore})
 
             if os.path.isfile(os.path.join(cache_dir,cachename)):
                 cache_path=os.path.join(cache_dir,cachename)
@@ -56,20 +79,38 @@ def cache_result(clear=False,checkfunc=None,maxsize=10, cache_dir='cache'):
             stale=False
             if os.path.exists(cache_path) and checkfunc is not None:
                 # Check whether cache is stale
-                stale=checkfunc(cachename,*args,**kwargs)
+                stale=checkfunc(cache_path,*args,**kwargs)
+            if os.path.exists(cache_path) and ttl is not None:
+                stale=stale or time.time()-os.path.getmtime(cache_path)>ttl
 
             if os.path.exists(cache_path) and not clear and not stale:
                 try:
-                    result=load_cache(cache_path)
+                    result=load_cache(cache_path,os.path.getmtime(cache_path))
                 except:
                     print('Error loading result from function '+func.__name__+' with args: '+str(args))
                     print('and kwargs: '+str(kwargs))
                     print('from file '+cachename)
                     raise
             else:
-                result=func(*args,**kwargs)
+                try:
+                    result=func(*args,**kwargs)
+                except stale_on_error:
+                    if clear or not os.path.exists(cache_path):
+                        raise
+                    print('Using stale result of '+func.__name__+' from file '+cachename)
+                    return load_cache(cache_path,os.path.getmtime(cache_path))
+
+                if cache_if is not None and not cache_if(result):
+                    return result
+
                 os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-                pkl.dump(result,open(cache_path,'wb'))
+
+                # Write to a temporary file first so that other processes
+                # never see a partially written cache file
+                tmp_path=cache_path+'.{}.tmp'.format(os.getpid())
+                with open(tmp_path,'wb') as cache_file:
+                    pkl.dump(result,cache_file)
+                os.replace(tmp_path,cache_path)
             return result
         
         return wrapper
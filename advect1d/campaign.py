@@ -0,0 +1,392 @@
+"""
+Run fetch_and_advect over many event windows in parallel.
+
+Jobs are run in a process pool, or with --pipeline one at a time in a single
+process, with the data for the next job fetched in a background thread while
+the current job is advected.
+
+A campaign is a list of jobs, each a dictionary with (at least) the keys
+start_time, end_time, source and output_x. Jobs can be read from either of
+two file formats:
+
+A configuration file in the same format as test_config, with one section per
+job (the section name is used as the job name):
+
+    [event1]
+    start_time = 2017-09-06T20:00:00
+    end_time = 2017-09-07T05:00:00
+    source = DSCOVR
+    output_x = 203872
+
+A plain text table with one job per line, with columns separated by
+whitespace or commas (lines starting with # are ignored):
+
+    # start_time          end_time             source  output_x
+    2017-09-06T20:00:00   2017-09-07T05:00:00  DSCOVR  203872
+"""
+
+# stdlib
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+try:
+    # Python 3
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+try:
+    # Python 3
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser
+
+# local
+from .advect_imf import (convert_setting, convert_proxy, fetch_and_advect, fetch_window,
+                         advect_and_write)
+
+job_columns = ['start_time', 'end_time', 'source', 'output_x']
+
+
+def job_name(job):
+    """
+    Default name for a job, derived from its source and start time
+    """
+    return '{0:%Y%m%dT%H%M%S}_{1}'.format(job['start_time'], job['source'])
+
+
+def read_jobs(filename):
+    """
+    Read a list of campaign jobs from a file
+
+    filename: Name of a configuration file or a plain text table of jobs
+
+    Returns: A list of job dictionaries
+    """
+
+    with open(filename, 'r') as fh:
+        lines = fh.readlines()
+
+    content = [line.strip() for line in lines
+               if line.strip() and not line.strip().startswith('#')]
+
+    jobs = []
+
+    if content and content[0].startswith('['):
+
+        # ConfigParser format, one section per job
+        config = ConfigParser()
+        config.read_string(''.join(lines))
+        for section in config.sections():
+            job = {key: convert_setting(key, config.get(section, key))
+                   for key in config.options(section)}
+            job['name'] = section
+            jobs.append(job)
+
+    else:
+
+        # Plain text table
+        for line in content:
+            tokens = line.replace(',', ' ').split()
+            if len(tokens) != len(job_columns):
+                raise ValueError("Expected {} columns in job line '{}'".format(
+                    len(job_columns), line))
+            job = {key: convert_setting(key, token)
+                   for key, token in zip(job_columns, tokens)}
+            jobs.append(job)
+
+    # Make sure every job has a unique name
+    names = set()
+    for job in jobs:
+        name = job.get('name', job_name(job))
+        base, i = name, 1
+        while name in names:
+            name = '{}_{}'.format(base, i)
+            i += 1
+        names.add(name)
+        job['name'] = name
+
+    return jobs
+
+
+def job_record(job, output_dir='campaign'):
+    """
+    Create the output directory for a job, and the manifest record describing it
+
+    job: Job dictionary, as returned from read_jobs
+    output_dir: Directory in which a subdirectory will be created for the job's output
+    """
+
+    job_dir = os.path.join(output_dir, job['name'])
+    os.makedirs(job_dir, exist_ok=True)
+
+    return {
+        'name': job['name'],
+        'start_time': job['start_time'].isoformat(),
+        'end_time': job['end_time'].isoformat(),
+        'source': job['source'],
+        'output_x': job['output_x'],
+        'imf_file': os.path.join(job_dir, 'IMF_data.dat'),
+        'hdf_file': os.path.join(job_dir, 'advected.h5'),
+    }
+
+
+def run_job(job, output_dir='campaign', proxy=None, noise=True, ncells=1000, seed=None):
+    """
+    Run fetch_and_advect for a single campaign job
+
+    job: Job dictionary, as returned from read_jobs
+    output_dir: Directory in which a subdirectory will be created for the job's output
+    proxy: Proxy server, as returned from advect_imf.convert_proxy
+    noise: Use noisy interpolation to fill data gaps
+    ncells: Default number of cells (overridden by an ncells key in the job)
+    seed: Seed for the noise used to fill data gaps
+
+    Returns: A dictionary summarizing the job's outcome
+    """
+
+    record = job_record(job, output_dir)
+
+    tstart = time.time()
+    try:
+        fetch_and_advect(job['start_time'], job['end_time'], source=job['source'],
+                         proxy=proxy, output_x=job['output_x'],
+                         ncells=job.get('ncells', ncells), noise=noise,
+                         imf_file=record['imf_file'], hdf_file=record['hdf_file'],
+                         seed=seed)
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = repr(e)
+        record['traceback'] = traceback.format_exc()
+    else:
+        record['status'] = 'ok'
+    record['elapsed'] = time.time()-tstart
+
+    return record
+
+
+def iter_prefetched(jobs, fetch, depth=1):
+    """
+    Call fetch for each job in a background thread, staying up to depth jobs
+    ahead of the consumer
+
+    jobs: List of job dictionaries
+    fetch: Function taking a job and returning its data
+    depth: Size of the queue of fetched jobs waiting to be consumed. At most
+           depth+1 jobs' data are held at once (including the one being
+           fetched), in addition to the one being consumed.
+
+    Yields: (job, data, error, elapsed) tuples in the order of jobs, where
+            error is None or an (exception repr, traceback) tuple if fetch
+            raised, and elapsed is the time fetch took
+    """
+
+    queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        for job in jobs:
+            if stop.is_set():
+                return
+            tstart = time.time()
+            try:
+                item = (job, fetch(job), None)
+            except Exception as e:
+                item = (job, None, (repr(e), traceback.format_exc()))
+            queue.put(item+(time.time()-tstart,))
+        queue.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            yield item
+    finally:
+        # If the consumer stopped early, let the producer finish its current
+        # fetch and exit
+        stop.set()
+        while producer.is_alive():
+            try:
+                queue.get(timeout=0.1)
+            except Empty:
+                pass
+
+
+def run_pipeline(jobs, output_dir='campaign', manifest='manifest.json', proxy=None,
+                 noise=True, ncells=1000, depth=1, seed=None):
+    """
+    Run a list of jobs one at a time, fetching the data for the following
+    jobs in a background thread while each job is advected
+
+    depth: Number of fetched jobs that may wait to be advected
+
+    Other arguments are as for run_campaign
+
+    Returns: A list of job records, in the same order as jobs
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    tstart = time.time()
+
+    def fetch(job):
+        return fetch_window(job['start_time'], job['end_time'], source=job['source'],
+                            proxy=proxy, output_x=job['output_x'], noise=noise,
+                            seed=seed)
+
+    records = []
+    for job, data, error, fetch_elapsed in iter_prefetched(jobs, fetch, depth):
+        record = job_record(job, output_dir)
+        record['fetch_elapsed'] = fetch_elapsed
+
+        job_start = time.time()
+        if error is not None:
+            record['status'] = 'failed'
+            record['error'], record['traceback'] = error
+        else:
+            sw_data, t0 = data
+            try:
+                advect_and_write(sw_data, t0, source=job['source'], output_x=job['output_x'],
+                                 ncells=job.get('ncells', ncells), noise=noise,
+                                 imf_file=record['imf_file'], hdf_file=record['hdf_file'])
+            except Exception as e:
+                record['status'] = 'failed'
+                record['error'] = repr(e)
+                record['traceback'] = traceback.format_exc()
+            else:
+                record['status'] = 'ok'
+        record['elapsed'] = time.time()-job_start
+        records.append(record)
+
+    write_manifest(records, os.path.join(output_dir, manifest), time.time()-tstart)
+
+    return records
+
+
+def write_manifest(records, filename, elapsed):
+    """
+    Write a summary of a campaign's job records to a JSON file
+    """
+
+    summary = {
+        'elapsed': elapsed,
+        'njobs': len(records),
+        'nfailed': len([record for record in records if record['status'] != 'ok']),
+        'jobs': records,
+    }
+
+    with open(filename, 'w') as fh:
+        json.dump(summary, fh, indent=2)
+
+
+def run_campaign(jobs, output_dir='campaign', workers=None, manifest='manifest.json',
+                 proxy=None, noise=True, ncells=1000, seed=None):
+    """
+    Run a list of jobs across a process pool and write a summary manifest
+
+    jobs: List of job dictionaries, as returned from read_jobs
+    output_dir: Directory where the output of each job will be written
+    workers: Number of worker processes (defaults to the number of CPUs)
+    manifest: Name of the manifest file (relative to output_dir)
+    proxy: Proxy server, as returned from advect_imf.convert_proxy
+    noise: Use noisy interpolation to fill data gaps
+    ncells: Default number of cells for jobs that do not specify ncells
+    seed: Seed for the noise used to fill data gaps
+
+    Returns: A list of job records, in the same order as jobs
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    tstart = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, job, output_dir, proxy, noise, ncells, seed)
+                   for job in jobs]
+        records = [future.result() for future in futures]
+
+    write_manifest(records, os.path.join(output_dir, manifest), time.time()-tstart)
+
+    return records
+
+
+def parse_args():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        prog="advect1d_campaign",
+        description="Advect solar wind data for many event windows in parallel."
+    )
+
+    parser.add_argument('jobs',
+                        help='File listing the jobs to run, either in ' +
+                             'configuration file format (one section per job) ' +
+                             'or as a table of start_time, end_time, source and ' +
+                             'output_x')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes. Defaults to the ' +
+                             'number of CPUs.')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Run the jobs one at a time in a single process, ' +
+                             'fetching the data for the next job in a ' +
+                             'background thread while the current job is ' +
+                             'advected (--workers is ignored)')
+    parser.add_argument('--queue-size', type=int, default=1, dest='queue_size',
+                        help='With --pipeline, the number of fetched jobs ' +
+                             'that may wait to be advected. Defaults to 1.')
+    parser.add_argument('--output-dir', default='campaign', dest='output_dir',
+                        help='Directory where output will be written. Each ' +
+                             'job writes to its own subdirectory.')
+    parser.add_argument('--manifest', default='manifest.json',
+                        help='Name of the summary manifest, written to the ' +
+                             'output directory')
+    parser.add_argument('--ncells',
+                        default=1000,
+                        type=int,
+                        dest='ncells',
+                        help='Number of cells used for jobs that do not ' +
+                             'specify ncells. Defaults to 1000.')
+    parser.add_argument('--proxy', help='Proxy server URL', type=convert_proxy)
+    parser.add_argument('--disable-noise', action='store_true',
+                        help='Fill data gaps using linear interpolation ' +
+                             'instead of noisy interpolation')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the noise used to fill data gaps')
+
+    return parser.parse_args()
+
+
+def campaign_cli():
+
+    args = parse_args()
+
+    jobs = read_jobs(args.jobs)
+
+    if args.pipeline:
+        records = run_pipeline(jobs, output_dir=args.output_dir, manifest=args.manifest,
+                               proxy=args.proxy, noise=not args.disable_noise,
+                               ncells=args.ncells, depth=args.queue_size, seed=args.seed)
+    else:
+        records = run_campaign(jobs, output_dir=args.output_dir, workers=args.workers,
+                               manifest=args.manifest, proxy=args.proxy,
+                               noise=not args.disable_noise, ncells=args.ncells,
+                               seed=args.seed)
+
+    failed = [record for record in records if record['status'] != 'ok']
+    for record in failed:
+        print('Job {} failed: {}'.format(record['name'], record['error']))
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+
+    campaign_cli()
@@ -1,9 +1,13 @@
 try:
     from urllib2 import urlopen, Request
+    from httplib import HTTPException
 except ImportError: #python 3
     from urllib.request import urlopen, Request
+    from http.client import HTTPException
 import xml.etree.ElementTree as ET
 
+from .cache_decorator import cache_result
+
 cdaweb_base_url='https://cdaweb.gsfc.nasa.gov/WS/cdasr/1'
 
 def open_url(url, proxy=None):
@@ -67,19 +71,33 @@ def xml_to_dict(tree):
         dicts.append(element_to_dict(element))
     return dicts
 
-def get_dataviews():
+# Seconds before cached metadata is fetched again. The inventory changes as
+# new data are processed, so it is refreshed more often.
+metadata_ttl=7*24*3600
+inventory_ttl=24*3600
+
+# Errors raised when CDAWeb can not be reached (URLError and socket errors
+# are OSErrors). Cached results that are due to be refreshed are used as
+# they are when these occur, so that runs without network access can still
+# use the cache.
+network_errors=(OSError,HTTPException)
+
+@cache_result(ignore=('proxy',),ttl=metadata_ttl,stale_on_error=network_errors)
+def get_dataviews(proxy=None):
     """
     Get all the CDAWeb dataviews
     """
-    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews'))
+    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews',proxy))
 
-def get_observatories(dataview):
+@cache_result(ignore=('proxy',),ttl=metadata_ttl,stale_on_error=network_errors)
+def get_observatories(dataview,proxy=None):
     """
     Get a list of observatories in a dataview
     """
-    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/observatoryGroups'))
+    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/observatoryGroups',proxy))
 
-def get_datasets(dataview,observatoryGroup=None):
+@cache_result(ignore=('proxy',),ttl=metadata_ttl,stale_on_error=network_errors)
+def get_datasets(dataview,observatoryGroup=None,proxy=None):
     """
     Get a list of datasets in a dataview (optionally filtered by an 
     observatory group)
@@ -96,9 +114,10 @@ def get_datasets(dataview,observatoryGroup=None):
     getstr=''
     for key,value in getdata.items():
         getstr+= key+'='+value
-    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets?'+getstr))
+    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets?'+getstr,proxy))
 
-def get_dataset_variables(dataview,dataset):
+@cache_result(ignore=('proxy',),ttl=metadata_ttl,stale_on_error=network_errors)
+def get_dataset_variables(dataview,dataset,proxy=None):
     """
     Get the variables in a dataset
 
@@ -107,9 +126,10 @@ def get_dataset_variables(dataview,dataset):
     get_dataset_variables('sp_phys','OMNI2_H0_MRG1HR')
 
     """
-    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets/'+dataset+'/variables'))
+    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets/'+dataset+'/variables',proxy))
 
-def get_dataset_inventory(dataview,dataset):
+@cache_result(ignore=('proxy',),ttl=inventory_ttl,stale_on_error=network_errors)
+def get_dataset_inventory(dataview,dataset,proxy=None):
     """
     Get the inventory (available time ranges) for a dataset
 
@@ -118,7 +138,63 @@ def get_dataset_inventory(dataview,dataset):
     get_dataset_inventory('sp_phys','OMNI2_H0_MRG1HR')
 
     """
-    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets/'+dataset+'/inventory'))
+    return xml_to_dict(fetch_xml(cdaweb_base_url+'/dataviews/'+dataview+'/datasets/'+dataset+'/inventory',proxy))
+
+def parse_cdaweb_time(time_str):
+    """
+    Convert a time string from a CDAWeb response (ISO 8601, in UTC) to a
+    python datetime
+    """
+    import dateutil.parser
+
+    return dateutil.parser.isoparse(time_str).replace(tzinfo=None)
+
+def get_inventory_intervals(dataview,dataset,proxy=None):
+    """
+    Get the time intervals for which a dataset has data
+
+    Returns: Sorted list of (start, end) tuples (datetime)
+    """
+
+    intervals=[]
+    for description in get_dataset_inventory(dataview,dataset,proxy=proxy):
+        time_intervals=description.get('TimeInterval',[])
+        if isinstance(time_intervals,dict):
+            time_intervals=[time_intervals]
+        for interval in time_intervals:
+            intervals.append((parse_cdaweb_time(interval['Start']),
+                              parse_cdaweb_time(interval['End'])))
+    return sorted(intervals)
+
+def available_intervals(dataview,dataset,start_date,end_date,proxy=None):
+    """
+    Find the parts of an interval for which a dataset has data, according to
+    the dataset's inventory
+
+    Returns: Sorted list of (start, end) tuples (datetime), clipped to
+             start_date and end_date
+    """
+
+    return [(max(start,start_date),min(end,end_date))
+            for start,end in get_inventory_intervals(dataview,dataset,proxy=proxy)
+            if start<=end_date and end>=start_date]
+
+def split_interval(start_date,end_date,max_duration):
+    """
+    Split an interval into consecutive pieces no longer than max_duration
+
+    Returns: List of (start, end) tuples
+    """
+
+    pieces=[]
+    start=start_date
+    while True:
+        end=min(start+max_duration,end_date)
+        pieces.append((start,end))
+        if end>=end_date:
+            break
+        start=end
+    return pieces
 
 def datetime_to_cdaweb_url_format(datetime_value):
     """
@@ -198,3 +274,187 @@ def get_cdf(*args,**kwargs):
         data=dm.fromCDF(tmpfile.name)
 
     return data
+
+# Time after the end of a day during which CDAWeb may still add data for it,
+# and the age after which a cached day fetched within that time is fetched
+# again
+publication_latency_days=7
+recent_day_ttl=3600
+
+def incomplete_day(cache_path,dataview,dataset,day,variables,proxy=None):
+    """
+    Check whether a day cached by get_cdf_day was fetched before all of its
+    data could have been published, and long enough ago to fetch it again
+    """
+
+    import os
+    import time
+    from calendar import timegm
+    from datetime import timedelta
+
+    written=os.path.getmtime(cache_path)
+    published=timegm((day+timedelta(days=1+publication_latency_days)).timetuple())
+    return written<published and time.time()-written>recent_day_ttl
+
+@cache_result(ignore=('proxy',),checkfunc=incomplete_day,cache_if=lambda data: data is not None,
+              stale_on_error=network_errors)
+def get_cdf_day(dataview,dataset,day,variables,proxy=None):
+    """
+    Get one UTC day of data from CDAWeb (cached, so that a day is only ever
+    downloaded once, whatever time windows it is requested for)
+
+    Days with no data are not cached, and days fetched less than
+    publication_latency_days after they ended are fetched again after
+    recent_day_ttl seconds, so that data published later are picked up.
+
+    dataview (str): A CDAWeb dataview
+    dataset (str): A CDAWeb dataset
+    day (datetime): Start of the day
+    variables (sequence of strings): What variables to include
+    proxy: Proxy server, as for get_file. Not part of the cache key.
+
+    Returns: The data as read by get_cdf, or None if CDAWeb has no data for
+             the day
+    """
+
+    from datetime import timedelta
+
+    try:
+        return get_cdf(dataview,dataset,day,day+timedelta(days=1),variables,proxy=proxy)
+    except ValueError:
+        # CDAWeb reported that there is no data in the interval
+        return None
+
+def days_in(start_date,end_date):
+    """
+    List the starts of the UTC days overlapping an interval (an interval
+    ending at midnight does not overlap the day that starts then)
+    """
+
+    from datetime import datetime, timedelta
+
+    day=datetime(start_date.year,start_date.month,start_date.day)
+    days=[day]
+    day+=timedelta(days=1)
+    while day<end_date:
+        days.append(day)
+        day+=timedelta(days=1)
+    return days
+
+def record_varying(data):
+    """
+    Find the variables in data read from a CDF that vary from record to
+    record, and the time variable for each
+    """
+
+    time_vars={}
+    for var,values in data.items():
+        depend=values.attrs.get('DEPEND_0')
+        if depend in data:
+            time_vars[var]=depend
+            time_vars[depend]=depend
+    return time_vars
+
+def days_with_data(dataview,dataset,start_date,end_date,proxy=None):
+    """
+    List the starts of the UTC days overlapping an interval for which the
+    dataset's inventory lists data
+    """
+
+    from datetime import timedelta
+
+    intervals=available_intervals(dataview,dataset,start_date,end_date,proxy=proxy)
+    return [day for day in days_in(start_date,end_date)
+            if any(start<day+timedelta(days=1) and end>=day for start,end in intervals)]
+
+def join_parts(parts,start_date,end_date):
+    """
+    Join data read from several CDF files covering consecutive intervals
+
+    parts: List of (start, data) tuples, sorted by start. Records of each
+           part from its start up to the start of the next part are kept, so
+           a record on the boundary between two parts is only kept once.
+    start_date, end_date: Only records within this interval are kept
+
+    Returns: The data in the same form as returned from get_cdf
+    """
+
+    import numpy as np
+
+    first=parts[0][1]
+    data=first.__class__(attrs=first.attrs)
+    time_vars=record_varying(first)
+
+    starts=[np.datetime64(start,'us') for start,part in parts]
+    stops=starts[1:]+[np.datetime64(end_date,'us')+np.timedelta64(1,'us')]
+
+    for var,values in first.items():
+        if var not in time_vars:
+            data[var]=values
+            continue
+
+        chunks=[]
+        for (start,part),part_start,part_stop in zip(parts,starts,stops):
+            times=np.asarray(part[time_vars[var]],dtype='datetime64[us]')
+            keep=(times>=np.datetime64(start_date,'us'))&(times<=np.datetime64(end_date,'us'))
+            keep&=(times>=part_start)&(times<part_stop)
+            chunks.append(np.asarray(part[var])[keep])
+        data[var]=values.__class__(np.concatenate(chunks),attrs=values.attrs)
+
+    return data
+
+def get_cdf_chunked(dataview,dataset,start_date,end_date,variables,proxy=None):
+    """
+    Get data from CDAWeb one day at a time, using the cache from get_cdf_day,
+    and join it into a single data set covering start_date to end_date. Days
+    that are not in the dataset's inventory are not requested.
+
+    Arguments are as for get_file.
+
+    Returns: The data in the same form as returned from get_cdf
+    """
+
+    parts=[(day,get_cdf_day(dataview,dataset,day,tuple(variables),proxy=proxy))
+           for day in days_with_data(dataview,dataset,start_date,end_date,proxy=proxy)]
+    parts=[(day,part) for day,part in parts if part is not None]
+
+    if not parts:
+        raise ValueError('No data available for {} between {} and {}'.format(
+            dataset,start_date,end_date))
+
+    return join_parts(parts,start_date,end_date)
+
+def get_cdf_split(dataview,dataset,start_date,end_date,variables,max_duration=None,proxy=None):
+    """
+    Get data from CDAWeb in pieces no longer than max_duration, requesting
+    only the parts of the interval listed in the dataset's inventory, and
+    join the pieces into a single data set
+
+    Arguments are as for get_file, plus
+    max_duration (timedelta): Longest interval to request at once. Defaults
+                              to 30 days.
+
+    Returns: The data in the same form as returned from get_cdf
+    """
+
+    from datetime import timedelta
+
+    max_duration=max_duration or timedelta(days=30)
+
+    pieces=[]
+    for start,end in available_intervals(dataview,dataset,start_date,end_date,proxy=proxy):
+        pieces.extend(split_interval(start,end,max_duration))
+
+    parts=[]
+    for start,end in pieces:
+        try:
+            parts.append((start,get_cdf(dataview,dataset,start,end,variables,proxy=proxy)))
+        except ValueError:
+            # CDAWeb reported that there is no data in the interval
+            pass
+
+    if not parts:
+        raise ValueError('No data available for {} between {} and {}'.format(
+            dataset,start_date,end_date))
+
+    return join_parts(parts,start_date,end_date)
@@ -0,0 +1,270 @@
+"""
+Read and write SWMF IMF input files.
+
+The files are written in the same layout as spacepy.pybats.ImfInput.write:
+a creation time and header text, the #COOR (and if needed #VAR) commands,
+then #START followed by one row per time, with the time rounded to the
+millisecond and each variable formatted as %10.2f. Rows are formatted in
+bulk as arrays of characters rather than one Python string at a time, which
+is several times faster than ImfInput.write. Files whose name ends in .gz
+are compressed with gzip.
+"""
+
+# stdlib
+import gzip
+from datetime import datetime
+
+# local
+from .textio import read_chunks
+
+# extras
+import numpy as np
+
+# Default variables of an IMF input file, in order
+std_vars = ['bx', 'by', 'bz', 'ux', 'uy', 'uz', 'n', 't']
+
+time_width = 25
+column_width = 10
+
+
+def open_imf(filename, mode='rb', compress=None):
+    """
+    Open an IMF input file, using gzip if compress is True (by default, if
+    the name ends in .gz)
+    """
+
+    if compress is None:
+        compress = str(filename).endswith('.gz')
+    if compress:
+        # Level 6 compresses these files almost as well as the default (9) in a
+        # fraction of the time
+        return gzip.open(filename, mode, compresslevel=6)
+    return open(filename, mode)
+
+
+def format_header(header='', coor='GSE', var=std_vars):
+    """
+    Format the part of an IMF input file up to and including #START
+
+    header: Header text
+    coor: Coordinate system of the data
+    var: Names of the variables, in the order of the columns
+
+    Returns: bytes
+    """
+
+    text = 'File created on {}\n'.format(datetime.now().isoformat())
+    text += header
+    if coor:
+        text += '#COOR\n{}\n\n'.format(coor)
+    if list(var) != std_vars:
+        text += '#VAR\n{}\n\n'.format(' '.join(var))
+    text += '\n#START\n'
+    return text.encode()
+
+
+def digits(values, width):
+    """
+    Format non-negative integers as zero-padded decimal digits
+
+    Returns: uint8 array of shape (len(values), width) of ASCII characters
+    """
+
+    powers = 10**np.arange(width-1, -1, -1, dtype=np.int64)
+    return (values[:, None]//powers % 10 + ord('0')).astype(np.uint8)
+
+
+def format_times(times):
+    """
+    Format times as 'YYYY mm dd HH MM SS mmm  ', rounded to the millisecond
+
+    times: Array of times (datetime64)
+
+    Returns: uint8 array of shape (len(times), time_width)
+    """
+
+    times = np.asarray(times, dtype='datetime64[us]')
+    ms = np.round(times.astype(np.int64)/1e3).astype(np.int64).astype('datetime64[ms]')
+    years = ms.astype('datetime64[Y]')
+    months = ms.astype('datetime64[M]')
+    days = ms.astype('datetime64[D]')
+    ms_of_day = (ms-days).astype(np.int64)
+
+    fields = [(years.astype(np.int64)+1970, 4),
+              ((months-years.astype('datetime64[M]')).astype(np.int64)+1, 2),
+              ((days-months.astype('datetime64[D]')).astype(np.int64)+1, 2),
+              (ms_of_day//3600000, 2),
+              (ms_of_day//60000 % 60, 2),
+              (ms_of_day//1000 % 60, 2),
+              (ms_of_day % 1000, 3)]
+
+    chars = np.full((len(times), time_width), ord(' '), dtype=np.uint8)
+    pos = 0
+    for values, width in fields:
+        chars[:, pos:pos+width] = digits(values, width)
+        pos += width+1
+    return chars
+
+
+def format_column(values):
+    """
+    Format values as '%10.2f'
+
+    Returns: uint8 array of shape (len(values), column_width), and a
+             boolean array marking values that need more than column_width
+             characters (whose characters are not valid)
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    chars = np.full((len(values), column_width), ord(' '), dtype=np.uint8)
+
+    finite = np.isfinite(values)
+    scaled = np.abs(np.where(finite, values, 0))*100
+    hundredths = np.round(scaled).astype(np.int64)
+    whole = hundredths//100
+    ndigits = np.searchsorted(10**np.arange(1, 19, dtype=np.int64), whole, side='right')+1
+    negative = np.signbit(values)
+    overflow = ndigits+negative > column_width-3
+    ndigits[overflow] = 1
+
+    chars[:, -2:] = digits(hundredths % 100, 2)
+    chars[:, -3] = ord('.')
+    whole_chars = digits(whole, column_width-3)
+    rows = np.arange(len(values))
+    for i in range(column_width-3):
+        # Leading zeros are blank, except in the ones place
+        show = ndigits >= column_width-3-i
+        chars[show, i] = whole_chars[show, i]
+    chars[rows[negative], column_width-4-ndigits[negative]] = ord('-')
+
+    # Values that are not finite, or whose rounding scaled*100 can not
+    # decide correctly, are formatted individually
+    fraction = scaled-np.floor(scaled)
+    exact = finite & (np.abs(fraction-0.5) > 1e-6)
+    for i in np.flatnonzero(~exact & ~overflow):
+        chars[i] = np.frombuffer('{:10.2f}'.format(values[i]).encode(), dtype=np.uint8)
+
+    return chars, overflow
+
+
+def format_rows(times, columns):
+    """
+    Format rows of an IMF input file
+
+    times: Array of times (datetime64)
+    columns: List of arrays of values, in the order of the file's variables
+
+    Returns: bytes
+    """
+
+    space = np.full((len(times), 1), ord(' '), dtype=np.uint8)
+    parts = [format_times(times)]
+    overflow = np.zeros(len(times), dtype=bool)
+    for i, column in enumerate(columns):
+        chars, column_overflow = format_column(column)
+        overflow |= column_overflow
+        if i > 0:
+            parts.append(space)
+        parts.append(chars)
+    parts.append(np.full((len(times), 1), ord('\n'), dtype=np.uint8))
+    rows = np.concatenate(parts, axis=1)
+
+    if not np.any(overflow):
+        return rows.tobytes()
+
+    # Rows with values too large for the column width are formatted
+    # individually, and are wider than the others
+    out = []
+    start = 0
+    for i in np.flatnonzero(overflow):
+        out.append(rows[start:i].tobytes())
+        out.append(rows[i, :time_width].tobytes() +
+                   ' '.join('{:10.2f}'.format(column[i]) for column in columns).encode() + b'\n')
+        start = i+1
+    out.append(rows[start:].tobytes())
+    return b''.join(out)
+
+
+def write_imf(filename, data, header='', coor='GSE', var=std_vars, chunksize=100000,
+              compress=None):
+    """
+    Write an SWMF IMF input file
+
+    filename: Name of the file to write
+    data: Dictionary with 'time' (datetime64 or datetime) and an array for
+          each of var
+    header: Header text
+    coor: Coordinate system of the data
+    var: Names of the variables to write, in order
+    chunksize: Number of rows formatted at once
+    compress: If True, compress the file with gzip (by default, if the
+              name ends in .gz)
+    """
+
+    with open_imf(filename, 'wb', compress) as fh:
+        fh.write(format_header(header, coor, var))
+        write_rows(fh, data['time'], [data[name] for name in var], chunksize)
+
+
+def write_rows(fh, times, columns, chunksize=100000):
+    """
+    Append rows to an IMF input file, chunksize rows at a time
+
+    fh: File opened in binary mode, after the header has been written
+    times: Array of times (datetime64 or datetime)
+    columns: List of arrays of values, in the order of the file's variables
+    """
+
+    times = np.asarray(times, dtype='datetime64[us]')
+    for start in range(0, len(times), chunksize):
+        chunk = slice(start, start+chunksize)
+        fh.write(format_rows(times[chunk], [np.asarray(column)[chunk] for column in columns]))
+
+
+def read_imf(filename, chunksize=100000):
+    """
+    Read an SWMF IMF input file
+
+    filename: Name of the file (compressed with gzip if the name ends in .gz)
+    chunksize: Number of rows parsed at once
+
+    Returns: Dictionary with 'time' (datetime64) and a float array for each
+             variable, and a dictionary of attributes ('header', 'coor' and
+             'var')
+    """
+
+    attrs = {'header': '', 'coor': None, 'var': list(std_vars)}
+
+    with open_imf(filename, 'rt') as fh:
+        # The first line records when the file was written
+        fh.readline()
+        command = None
+        for line in fh:
+            if line.startswith('#START'):
+                break
+            elif line.startswith('#'):
+                command = line.split()[0]
+            elif command is None:
+                # Text before the first command
+                attrs['header'] += line
+            elif command == '#COOR' and line.strip():
+                attrs['coor'] = line.strip()
+            elif command == '#VAR' and line.strip():
+                attrs['var'] = line.split()
+
+        ncols = 7+len(attrs['var'])
+        chunks = [rows for rows in read_chunks(fh, ncols, chunksize)]
+
+    rows = np.concatenate(chunks) if chunks else np.empty((0, ncols))
+
+    fields = rows[:, :7].astype(np.int64)
+    days = ((fields[:, 0]-1970).astype('datetime64[Y]').astype('datetime64[M]') +
+            (fields[:, 1]-1).astype('timedelta64[M]')).astype('datetime64[D]')
+    days = days+(fields[:, 2]-1).astype('timedelta64[D]')
+    ms = ((fields[:, 3]*60+fields[:, 4])*60+fields[:, 5])*1000+fields[:, 6]
+
+    data = {'time': days.astype('datetime64[us]')+ms.astype('timedelta64[ms]')}
+    for i, name in enumerate(attrs['var']):
+        data[name] = rows[:, 7+i]
+
+    return data, attrs
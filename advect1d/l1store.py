@@ -0,0 +1,268 @@
+"""
+Out-of-core storage of L1 solar wind data, for intervals too long to hold in
+memory.
+
+A store is a directory holding one raw binary file of times and one of
+values for each variable, and a meta.json file describing them. It is built
+a chunk of time at a time (build_store), and opened as an L1Store, whose
+arrays are memory-mapped. An L1Store can be passed to advect_imf.advect in
+place of the dictionary returned from load_acedata or load_dscovr. The
+advection only reads the samples near the current simulation time (see
+advect1d.updateboundary), so the memory used for the input does not depend
+on the length of the interval.
+"""
+
+# stdlib
+import os
+import json
+from datetime import datetime, timedelta
+
+# extras
+import numpy as np
+
+meta_name = 'meta.json'
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, meta_name)) as fh:
+        return json.load(fh)
+
+
+def write_meta(directory, meta):
+    # Write to a temporary file first so that the metadata are never left
+    # partly written
+    path = os.path.join(directory, meta_name)
+    with open(path+'.tmp', 'w') as fh:
+        json.dump(meta, fh, indent=2)
+    os.replace(path+'.tmp', path)
+
+
+def data_path(directory, var, kind):
+    return os.path.join(directory, '{}.{}'.format(var, kind))
+
+
+def create_store(directory, epoch, **attrs):
+    """
+    Create an empty store, replacing any store already in the directory
+
+    directory: Directory to hold the store (created if needed)
+    epoch: Time (datetime) that the stored times are measured from while the
+           store is being built
+    attrs: Extra information to record in the metadata (such as the source
+           and time range of the data)
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Remove the data of any store previously built in the directory (which
+    # may not have been finished), so that appended data never follow it
+    for name in os.listdir(directory):
+        if name.endswith(('.time', '.time.i8', '.values')) or name == meta_name:
+            os.remove(os.path.join(directory, name))
+
+    write_meta(directory, {'epoch': epoch.isoformat(), 't0': None, 'variables': {},
+                           'attrs': attrs})
+
+
+def append_store(directory, sw_data):
+    """
+    Append L1 data to a store
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned
+             from load_acedata or load_dscovr. Records no later than the last
+             record already stored for a variable are skipped.
+    """
+
+    meta = read_meta(directory)
+    if meta['t0'] is not None:
+        raise ValueError('Store in {} has already been finished'.format(directory))
+
+    epoch = np.datetime64(meta['epoch'], 'us')
+
+    for var, (t, values) in sw_data.items():
+        info = meta['variables'].setdefault(
+            var, {'length': 0, 'dtype': np.asarray(values).dtype.str, 'last': None})
+
+        # Stored as integer microseconds while building, so no precision is lost
+        times = (np.asarray(t, dtype='datetime64[us]')-epoch).astype(np.int64)
+        keep = slice(None) if info['last'] is None else times > info['last']
+        times = times[keep]
+        if len(times) == 0:
+            continue
+
+        with open(data_path(directory, var, 'time.i8'), 'ab') as fh:
+            times.astype('<i8').tofile(fh)
+        with open(data_path(directory, var, 'values'), 'ab') as fh:
+            np.asarray(values)[keep].astype(info['dtype']).tofile(fh)
+
+        info['length'] += len(times)
+        info['last'] = int(times[-1])
+
+    write_meta(directory, meta)
+
+
+def finish_store(directory, chunksize=1000000):
+    """
+    Convert the times in a store to seconds since the first time for which
+    all variables have data (as advect_imf.to_seconds does), after which the
+    store can be opened as an L1Store
+    """
+
+    meta = read_meta(directory)
+    variables = meta['variables']
+
+    if not variables or any(info['length'] == 0 for info in variables.values()):
+        raise ValueError('Store in {} has variables with no data'.format(directory))
+
+    def first_time(var):
+        return int(np.fromfile(data_path(directory, var, 'time.i8'), dtype='<i8', count=1)[0])
+
+    offset = max(first_time(var) for var in variables)
+
+    for var, info in variables.items():
+        source = np.memmap(data_path(directory, var, 'time.i8'), dtype='<i8', mode='r',
+                           shape=(info['length'],))
+        with open(data_path(directory, var, 'time'), 'wb') as fh:
+            for start in range(0, info['length'], chunksize):
+                chunk = source[start:start+chunksize]
+                ((chunk-offset).astype(np.float64)/1e6).astype('<f8').tofile(fh)
+        del source
+        os.remove(data_path(directory, var, 'time.i8'))
+
+    t0 = np.datetime64(meta['epoch'], 'us')+np.timedelta64(offset, 'us')
+    meta['t0'] = t0.astype(datetime).isoformat()
+    write_meta(directory, meta)
+
+
+class L1Store(object):
+    """
+    Memory-mapped L1 solar wind data
+
+    Behaves like the dictionary of L1 data returned from
+    advect_imf.to_seconds: its keys are variable names and its values are
+    (times, values) tuples of arrays, with times in seconds since self.t0.
+    """
+
+    def __init__(self, directory):
+
+        meta = read_meta(directory)
+        if meta['t0'] is None:
+            raise ValueError('Store in {} has not been finished'.format(directory))
+
+        self.directory = directory
+        self.t0 = np.datetime64(meta['t0'], 'us').astype(datetime)
+        self.attrs = meta['attrs']
+        self.variables = meta['variables']
+
+        # Memory maps of each variable, opened when first used
+        self._arrays = {}
+
+    def __getitem__(self, var):
+        if var not in self._arrays:
+            info = self.variables[var]
+            times = np.memmap(data_path(self.directory, var, 'time'), dtype='<f8', mode='r',
+                              shape=(info['length'],))
+            values = np.memmap(data_path(self.directory, var, 'values'), dtype=info['dtype'],
+                               mode='r', shape=(info['length'],))
+            self._arrays[var] = times, values
+        return self._arrays[var]
+
+    def __getstate__(self):
+        # Pickle (e.g. to send to another process) without the memory maps,
+        # which would otherwise be copied into memory
+        state = self.__dict__.copy()
+        state['_arrays'] = {}
+        return state
+
+    def __contains__(self, var):
+        return var in self.variables
+
+    def __iter__(self):
+        return iter(self.variables)
+
+    def __len__(self):
+        return len(self.variables)
+
+    def keys(self):
+        return list(self.variables)
+
+    def items(self):
+        return [(var, self[var]) for var in self.variables]
+
+    def to_seconds(self, t0=None):
+        """
+        Return the data in the form returned from advect_imf.to_seconds
+
+        t0: Start time. Must not be later than self.t0 (the stored times can
+            not be shifted without reading them all).
+        """
+
+        if t0 is not None and t0 > self.t0:
+            raise ValueError('Store in {} starts at {}; build it to start at {} instead'.format(
+                self.directory, self.t0, t0))
+        return self, self.t0
+
+
+def build_store(directory, starttime, endtime, source='DSCOVR', proxy=None, noise=True,
+                chunk=timedelta(days=1), margin=timedelta(hours=1), seed=None):
+    """
+    Fetch L1 data a chunk at a time and write them to a store
+
+    If the directory already holds a finished store of the same data, it is
+    opened without fetching anything.
+
+    starttime, endtime: Time range of the data
+    source, proxy, noise: As for advect_imf.fetch_solarwind
+    chunk: Length of time fetched at once. Memory use is set by the chunk
+           length, not by the length of the interval.
+    margin: Extra data fetched either side of each chunk (and then
+            discarded), so that gaps of up to this length that span the
+            boundary between chunks are filled as if the data were fetched
+            at once
+    seed: Seed for the noise. Each chunk draws its noise from a generator
+          seeded with this and the index of the chunk.
+
+    Returns: L1Store
+    """
+
+    from .advect_imf import fetch_solarwind
+
+    attrs = {'source': source, 'start_time': starttime.isoformat(),
+             'end_time': endtime.isoformat(), 'noise': noise, 'seed': seed}
+
+    try:
+        meta = read_meta(directory)
+    except (IOError, OSError, ValueError):
+        meta = None
+    if meta is not None and meta['t0'] is not None and meta['attrs'] == attrs:
+        return L1Store(directory)
+
+    create_store(directory, starttime, **attrs)
+
+    chunk_start = starttime
+    index = 0
+    while chunk_start < endtime:
+        chunk_end = min(chunk_start+chunk, endtime)
+        last = chunk_end >= endtime
+
+        sw_data = fetch_solarwind(chunk_start-margin, chunk_end+margin, source=source,
+                                  proxy=proxy, noise=noise,
+                                  seed=None if seed is None else [seed, index])
+
+        # Keep only the records in [chunk_start, chunk_end), or up to and
+        # including endtime for the last chunk
+        lo = np.datetime64(chunk_start, 'us')
+        hi = np.datetime64(chunk_end, 'us')
+        chunk_data = {}
+        for var, (t, values) in sw_data.items():
+            t = np.asarray(t, dtype='datetime64[us]')
+            keep = (t >= lo) & ((t <= hi) if last else (t < hi))
+            chunk_data[var] = (t[keep], np.asarray(values)[keep])
+        append_store(directory, chunk_data)
+
+        chunk_start = chunk_end
+        index += 1
+
+    finish_store(directory)
+
+    return L1Store(directory)
@@ -5,7 +5,7 @@ import numpy as np
 """
 
 def FirstOrderUpwind(sm,sp):
-    return np.zeros(sm.shape)
+    return np.zeros_like(sm)
 
 def LaxWendroff(sm,sp):
     return sp
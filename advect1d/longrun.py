@@ -0,0 +1,188 @@
+"""
+Advect a long interval by splitting it into sub-windows that are run in
+parallel, then stitching the results together.
+
+Each sub-window is started early by a spin-up overlap, long enough for solar
+wind at the slowest observed speed to cross from the spacecraft to output_x.
+Output from the overlap is discarded, so after stitching the result matches a
+single serial run over the whole interval.
+"""
+
+# stdlib
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+# local
+from .advect_imf import (advect, advect_ballistic, fetch_with_spinup, imf_header,
+                         make_parser, parse_args, write_output)
+
+# extras
+import numpy as np
+
+
+def split_interval(starttime, endtime, window):
+    """
+    Split an interval into consecutive sub-windows
+
+    starttime: Start of the interval
+    endtime: End of the interval
+    window: Length of each sub-window (timedelta)
+
+    Returns: List of (start, end) tuples
+    """
+
+    windows = []
+    start = starttime
+    while start < endtime:
+        end = min(start+window, endtime)
+        windows.append((start, end))
+        start = end
+
+    return windows
+
+
+def advect_window(starttime, endtime, source='DSCOVR', proxy=None, output_x=203872,
+                  ncells=1000, noise=True, min_speed=250, last=False, ballistic=False,
+                  method='advect', nuMax=0.5, limiter='Minmod', threads=None,
+                  dtype=np.float64, trim=False, scheme='explicit', adaptive=False,
+                  skip_quiet=False, quiet_tol=0., seed=None):
+    """
+    Advect one sub-window, including its spin-up overlap
+
+    starttime: Start of the sub-window
+    endtime: End of the sub-window
+    source: Solar wind data source ("ACE" or "DSCOVR")
+    proxy: Proxy server, as returned from advect_imf.convert_proxy
+    output_x: x coordinate (GSM/GSE, km) where output values should be provided
+    ncells: Number of cells in the computational grid
+    noise: Use noisy interpolation to fill data gaps
+    min_speed: Solar wind speed (km/s) used for the initial guess at the overlap
+    last: If True, keep output after endtime (up to the end of the available data)
+    ballistic: If True, use the overlap to fill the grid ballistically at
+               starttime instead of stepping through it
+    method: "advect" to run the advection solver, or "ballistic" to time-shift
+            each observation with advect_imf.advect_ballistic
+    seed: Seed for the noise used to fill data gaps
+
+    The remaining arguments are passed to advect_imf.advect
+
+    Returns: Dictionary of output time series for the sub-window, with times in
+             seconds since starttime
+    """
+
+    if method not in ('advect', 'ballistic'):
+        raise ValueError("Invalid method '{}'".format(method))
+
+    sw_data = fetch_with_spinup(starttime, endtime, source=source, proxy=proxy,
+                                noise=noise, output_x=output_x, min_speed=min_speed,
+                                seed=seed)
+
+    if method == 'ballistic':
+        outdata, t0 = advect_ballistic(sw_data, output_x=output_x)
+    else:
+        outdata, t0 = advect(sw_data, output_x=output_x, ncells=ncells,
+                             t0=starttime if ballistic else None, ballistic=ballistic,
+                             nuMax=nuMax, limiter=limiter, threads=threads, dtype=dtype,
+                             trim=trim, scheme=scheme, adaptive=adaptive,
+                             skip_quiet=skip_quiet, quiet_tol=quiet_tol)
+
+    # Convert times to seconds since the start of the sub-window
+    outdata['time'] += (t0-starttime).total_seconds()
+
+    # Discard the spin-up overlap
+    keep = outdata['time'] >= 0
+    if not last:
+        keep &= outdata['time'] < (endtime-starttime).total_seconds()
+
+    return {var: values[keep] for var, values in outdata.items()}
+
+
+def stitch(windows, results):
+    """
+    Join sub-window results into a single set of time series
+
+    windows: List of (start, end) tuples
+    results: List of output dictionaries, as returned from advect_window
+
+    Returns: Dictionary of output time series with times in seconds since the
+             start of the first window
+    """
+
+    starttime = windows[0][0]
+
+    stitched = {}
+    for (start, end), outdata in zip(windows, results):
+        offset = (start-starttime).total_seconds()
+        for var, values in outdata.items():
+            if var == 'time':
+                values = values+offset
+            stitched.setdefault(var, []).append(values)
+
+    return {var: np.concatenate(values) for var, values in stitched.items()}
+
+
+def fetch_and_advect_split(starttime, endtime, window=timedelta(days=1), workers=None,
+                           source='DSCOVR', proxy=None, output_x=203872, ncells=1000,
+                           noise=True, imf_file='IMF_data.dat', hdf_file='advected.h5',
+                           ballistic=False, method='advect', nuMax=0.5, limiter='Minmod',
+                           threads=None, dtype=np.float64, trim=False, scheme='explicit',
+                           adaptive=False, skip_quiet=False, quiet_tol=0., seed=None):
+    """
+    Split an interval into sub-windows, advect them in parallel and write the
+    stitched result
+
+    window: Length of each sub-window (timedelta)
+    workers: Number of worker processes (defaults to the number of CPUs)
+
+    Other arguments are as for advect_imf.fetch_and_advect
+    """
+
+    windows = split_interval(starttime, endtime, window)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(advect_window, start, end, source, proxy,
+                                   output_x, ncells, noise, last=(i == len(windows)-1),
+                                   ballistic=ballistic, method=method, nuMax=nuMax,
+                                   limiter=limiter, threads=threads, dtype=dtype,
+                                   trim=trim, scheme=scheme, adaptive=adaptive,
+                                   skip_quiet=skip_quiet, quiet_tol=quiet_tol, seed=seed)
+                   for i, (start, end) in enumerate(windows)]
+        results = [future.result() for future in futures]
+
+    outdata = stitch(windows, results)
+
+    write_output(outdata, starttime, imf_file=imf_file, hdf_file=hdf_file,
+                 header=imf_header(source, output_x, ncells, noise, method))
+
+
+def longrun_cli():
+
+    parser = make_parser(description='Advect a long interval by running sub-windows ' +
+                                     'in parallel and stitching the output.')
+    parser.add_argument('--window-hours', type=float, default=24, dest='window_hours',
+                        help='Length of each sub-window in hours. Defaults to 24.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes. Defaults to the ' +
+                             'number of CPUs.')
+
+    args = parse_args(parser=parser)
+
+    if args.store is not None:
+        parser.error('--l1-store can not be used with split windows')
+
+    fetch_and_advect_split(args.start_time, args.end_time,
+                           window=timedelta(hours=args.window_hours),
+                           workers=args.workers, source=args.source,
+                           proxy=args.proxy, output_x=args.output_x,
+                           ncells=args.ncells, noise=not args.disable_noise,
+                           ballistic=args.ballistic, method=args.method,
+                           nuMax=args.nuMax, limiter=args.limiter,
+                           threads=args.threads, dtype=np.dtype(args.dtype),
+                           trim=args.trim, scheme=args.scheme, adaptive=args.adaptive,
+                           skip_quiet=args.skip_quiet, quiet_tol=args.quiet_tol,
+                           seed=args.seed)
+
+
+if __name__ == '__main__':
+
+    longrun_cli()
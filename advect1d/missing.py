@@ -1,10 +1,133 @@
-import random
 import numpy as np
-import spacepy.toolbox as tb
-from scipy.ndimage.filters import gaussian_filter
 
 
-def fill_gaps(data, fillval=9999999, sigma=5, winsor=0.05, noise=False, constrain=False):
+def find_gaps(data, fillval):
+    '''Find runs of fill in a data series
+
+    data - input numpy ndarray-like
+    fillval - value marking fill in the time series
+
+    Returns the indices of the first and last element of each run
+    '''
+    fill = np.concatenate([[False], np.isclose(data, fillval), [False]])
+    edges = np.flatnonzero(np.diff(fill.astype(np.int8)))
+    return edges[0::2], edges[1::2]-1
+
+
+def interpolate_gaps(data, fillval):
+    '''Fill gaps in a data series in place by linear interpolation
+
+    Gaps at the start and end of the series are filled with the nearest
+    valid value.
+
+    data - input numpy ndarray-like
+    fillval - value marking fill in the time series
+
+    Returns the indices of the first and last element of each gap that was
+    interpolated
+    '''
+    # gaps at the start and end of the series can only be filled with the
+    # nearest valid value
+    valid = np.flatnonzero(~np.isclose(data, fillval))
+    if len(valid) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    data[:valid[0]] = data[valid[0]]
+    data[valid[-1]+1:] = data[valid[-1]]
+
+    starts, ends = find_gaps(data, fillval)
+    if len(starts) == 0:
+        return starts, ends
+
+    lengths = ends-starts+1
+    a = np.asarray(data[starts-1])
+    b = np.asarray(data[ends+1])
+    dx = (b-a).astype(np.float64)/(lengths+1)
+
+    # Position of each filled element within its gap
+    gap = np.repeat(np.arange(len(starts)), lengths)
+    inds = np.arange(len(gap))-np.repeat(np.cumsum(lengths)-lengths, lengths)
+    data[np.repeat(starts, lengths)+inds] = a[gap] + dx[gap]*(inds+1)
+
+    return starts, ends
+
+
+def fluctuation_cdf(series, sigma=5, winsor=0.05):
+    '''Find the distribution of fluctuations of a data series about its
+    smoothed value
+
+    series - gap-filled data series
+    sigma - width of gaussian filter for finding fluctuation CDF
+    winsor - winsorization threshold, values above p=1-winsor and below p=winsor are capped
+
+    Returns the sorted fluctuations, which are the quantiles at evenly
+    spaced probabilities from 0 to 1. Compute this once and pass it to
+    fill_gaps (or use fill_gaps_draws) to fill gaps in the same series more
+    than once.
+    '''
+    from scipy.ndimage import gaussian_filter
+
+    # generate CDF from delta var
+    smooth = gaussian_filter(series, sigma)
+    dx = series-smooth
+    dx.sort()
+    p = np.linspace(0, 1, len(dx))
+    # "Winsorize" - all delta-Var above/below threshold at capped at threshold
+    dx[:p.searchsorted(0.+winsor)] = dx[p.searchsorted(0.+winsor)+1]
+    dx[p.searchsorted(1.-winsor):] = dx[p.searchsorted(1.-winsor)-1]
+    return dx
+
+
+def draw_fluctuations(cdf, size, rng=None):
+    '''Draw fluctuations from a distribution by inverse-CDF lookup
+
+    cdf - sorted fluctuations, as returned from fluctuation_cdf
+    size - number (or shape) of fluctuations to draw
+    rng - numpy Generator, or seed for one
+    '''
+    rng = np.random.default_rng(rng)
+    p = np.linspace(0, 1, len(cdf))
+    return cdf[p.searchsorted(rng.random(size))]
+
+
+def add_noise(series, starts, ends, cdf, rng=None, floor=None, ndraws=None):
+    '''Add fluctuations drawn from cdf to the gaps of a linearly filled series
+
+    series - linearly filled series, which is modified in place unless
+             ndraws is given
+    starts, ends - indices of the first and last element of each gap
+    cdf - sorted fluctuations, as returned from fluctuation_cdf
+    rng - numpy Generator, or seed for one
+    floor - if given, values below floor are raised to it
+    ndraws - if given, return an array of shape (ndraws, len(series)) with
+             independent fluctuations in each row
+    '''
+    lengths = ends-starts+1
+    inds = np.repeat(starts, lengths)+np.arange(np.sum(lengths)) - \
+        np.repeat(np.cumsum(lengths)-lengths, lengths)
+
+    if ndraws is None:
+        out = series
+        out[inds] += draw_fluctuations(cdf, len(inds), rng)
+    else:
+        out = np.repeat(np.asarray(series)[None, :], ndraws, axis=0)
+        out[:, inds] += draw_fluctuations(cdf, (ndraws, len(inds)), rng)
+
+    if floor is not None:
+        out[out < floor] = floor
+    return out
+
+
+def positive_floor(data, fillval):
+    '''Lowest measured value of a data series, if all measured values are
+    positive (otherwise None)'''
+    measured = np.asarray(data)[~np.isclose(data, fillval)]
+    if len(measured) > 0 and measured.min() > 0.0:
+        return measured.min()
+    return None
+
+
+def fill_gaps(data, fillval=9999999, sigma=5, winsor=0.05, noise=False, constrain=False,
+              rng=None, cdf=None):
     '''Fill gaps in input data series, using interpolation plus noise
 
     The noise approach is based on Owens et al. (Space Weather, 2014).
@@ -14,58 +137,45 @@ def fill_gaps(data, fillval=9999999, sigma=5, winsor=0.05, noise=False, constrai
     sigma - width of gaussian filter for finding fluctuation CDF
     winsor - winsorization threshold, values above p=1-winsor and below p=winsor are capped
     noise - Boolean, if True add noise to interpolated region, if False use linear interp only
-    constrain - Boolean, if True
+    constrain - Boolean, if True and the data are strictly positive (e.g. number
+                density), the noisy series is floored at the lowest measured value
+    rng - numpy Generator, or seed for one, used to draw the noise (the same
+          seed gives the same noise)
+    cdf - fluctuations to draw the noise from, as returned from
+          fluctuation_cdf for this series (computed from the series if not given)
     '''
-    # identify sequences of fill in data series
-    gaps = np.zeros((len(data), 2), dtype=int)
-    k = 0
-    for i in range(1, len(data)-1):
-        # Single space gap/fillval
-        if (np.isclose(data[i], fillval)) and (~np.isclose(data[i+1], fillval)) and (~np.isclose(data[i-1], fillval)):
-            gaps[k][0] = i
-            gaps[k][1] = i
-            k += 1
-        # Start of multispace gap/fillval
-        elif (np.isclose(data[i], fillval)) and (~np.isclose(data[i-1], fillval)):
-            gaps[k][0] = i
-        # End of multispace gap/fillval
-        elif (np.isclose(data[i], fillval)) and (~np.isclose(data[i+1], fillval)):
-            gaps[k][1] = i
-            k += 1
-    gaps = gaps[:k]
+    floor = positive_floor(data, fillval) if constrain else None
+
+    starts, ends = interpolate_gaps(data, fillval)
 
     # if no gaps detected
-    if k == 0:
+    if len(starts) == 0:
         return data
 
-    # fill gaps with linear interpolation
-    for gap in gaps:
-        a = data[gap[0]-1]
-        b = data[gap[1]+1]
-        dx = (b-a)/(gap[1]-gap[0]+2)
-        for i in range(gap[1]-gap[0]+1):
-            data[gap[0]+i] = a + dx*(i+1)
-
     if noise:
-        # generate CDF from delta var
         series = data.copy()
-        smooth = gaussian_filter(series, sigma)
-        dx = series-smooth
-        dx.sort()
-        p = np.linspace(0, 1, len(dx))
-        # "Winsorize" - all delta-Var above/below threshold at capped at threshold
-        dx[:p.searchsorted(0.+winsor)] = dx[p.searchsorted(0.+winsor)+1]
-        dx[p.searchsorted(1.-winsor):] = dx[p.searchsorted(1.-winsor)-1]
-
-        # draw fluctuations from CDF and apply to linearly filled gaps
-        for gap in gaps:
-            for i in range(gap[1]-gap[0]+1):
-                series[gap[0]+i] += dx[p.searchsorted(random.random())]
-
-        # cap variable if it should be strictly positive (e.g. number density)
-        # use lowest measured value as floor
-        if constrain and series.min() > 0.0:
-            series[series < series.min()] = series.min()
-        return series
+        if cdf is None:
+            cdf = fluctuation_cdf(series, sigma, winsor)
+        return add_noise(series, starts, ends, cdf, rng, floor)
 
     return data
+
+
+def fill_gaps_draws(data, ndraws, fillval=9999999, sigma=5, winsor=0.05, constrain=False,
+                    rng=None):
+    '''Fill gaps in a data series several times over, with independent noise
+
+    The gaps are interpolated and the fluctuation CDF computed once, and the
+    noise for all the draws is drawn at once, so this is much faster than
+    calling fill_gaps ndraws times. Arguments are as for fill_gaps.
+
+    Returns an array of shape (ndraws, len(data)) with one filled series
+    per row. data is filled by linear interpolation in place.
+    '''
+    floor = positive_floor(data, fillval) if constrain else None
+
+    starts, ends = interpolate_gaps(data, fillval)
+    series = np.asarray(data).copy()
+    cdf = fluctuation_cdf(series, sigma, winsor)
+
+    return add_noise(series, starts, ends, cdf, rng, floor, ndraws)
@@ -1,19 +1,176 @@
 from advect1d import cdaweb
 from datetime import datetime
-from .advect_imf import convert_proxy, detect_pybats_imf_vars
+from .advect_imf import convert_proxy
 from .missing import fill_gaps
+from . import imf_io
 import advect1d
 
-def get_omni(start_time, end_time, proxy):
+omni_vars=['Vx','Vy','Vz','BX_GSE','BY_GSE','BZ_GSE','proton_density','T']
 
-    import json
+def get_omni(start_time, end_time, proxy):
 
-    sw_vars=cdaweb.get_dataset_variables('sp_phys','OMNI_HRO_1MIN')
-    varlist=['Vx','Vy','Vz','BX_GSE','BY_GSE','BZ_GSE','proton_density','T']
-    swdata=cdaweb.get_cdf('sp_phys','OMNI_HRO_1MIN',start_time,end_time,varlist,proxy=proxy)
+    swdata=cdaweb.get_cdf_split('sp_phys','OMNI_HRO_1MIN',start_time,end_time,omni_vars,proxy=proxy)
 
     return swdata
 
+def load_omni(start_time, end_time, proxy=None):
+    """
+    Fetch OMNI data, with fill values and values outside the valid range
+    replaced by NaN
+
+    The data are fetched a day at a time and cached (see
+    cdaweb.get_cdf_chunked), so loading the same time again does not
+    download anything.
+
+    Returns: Dictionary with 'time' (datetime64) and a float array for each
+             of omni_vars
+    """
+
+    import numpy as np
+
+    omnidata=cdaweb.get_cdf_chunked('sp_phys','OMNI_HRO_1MIN',start_time,end_time,omni_vars,proxy=proxy)
+
+    data={'time':np.asarray(omnidata['Epoch'],dtype='datetime64[us]')}
+    for var in omni_vars:
+        values=np.asarray(omnidata[var],dtype=float)
+        attrs=omnidata[var].attrs
+        invalid=np.isclose(values,attrs['FILLVAL'])
+        if 'VALIDMIN' in attrs:
+            invalid|=values<attrs['VALIDMIN']
+        if 'VALIDMAX' in attrs:
+            invalid|=values>attrs['VALIDMAX']
+        values[invalid]=np.nan
+        data[var]=values
+
+    return data
+
+def month_chunks(start_time, end_time):
+    """
+    Split an interval at the starts of calendar months
+
+    Returns: List of (start, end) tuples
+    """
+
+    chunks=[]
+    start=start_time
+    while start<end_time:
+        if start.month==12:
+            end=datetime(start.year+1,1,1)
+        else:
+            end=datetime(start.year,start.month+1,1)
+        end=min(end,end_time)
+        chunks.append((start,end))
+        start=end
+    return chunks
+
+def iter_omni_chunks(start_time, end_time, proxy=None, workers=4):
+    """
+    Fetch OMNI data one calendar month at a time, fetching up to workers
+    months concurrently
+
+    Only workers months are held in memory at once (in addition to the one
+    being consumed), whatever the length of the interval.
+
+    Yields: (data, fillvals) tuples for each month with data, in time order.
+            data is a dictionary with 'time' (datetime64) and a float array
+            for each of omni_vars; fillvals holds the fill value of each
+            variable.
+    """
+
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+
+    chunks=month_chunks(start_time, end_time)
+
+    # Fetch the inventory once, rather than once for each thread
+    cdaweb.get_inventory_intervals('sp_phys','OMNI_HRO_1MIN',proxy=proxy)
+
+    def fetch(start, end, last):
+        try:
+            omnidata=get_omni(start, end, proxy=proxy)
+        except ValueError:
+            # No data for this month
+            return None
+
+        times=np.asarray(omnidata['Epoch'],dtype='datetime64[us]')
+
+        # Records at the end of a month are included in the next month
+        keep=slice(None) if last else times<np.datetime64(end,'us')
+
+        data={'time':times[keep]}
+        fillvals={}
+        for var in omni_vars:
+            data[var]=np.asarray(omnidata[var],dtype=float)[keep]
+            fillvals[var]=omnidata[var].attrs['FILLVAL']
+        return data, fillvals
+
+    pending=deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i,(start,end) in enumerate(chunks):
+            pending.append(executor.submit(fetch, start, end, i==len(chunks)-1))
+            if len(pending)>=workers:
+                result=pending.popleft().result()
+                if result is not None:
+                    yield result
+        while pending:
+            result=pending.popleft().result()
+            if result is not None:
+                yield result
+
+def fill_chunks(chunks):
+    """
+    Fill gaps in consecutive chunks of data, giving the same result as
+    filling the gaps in all the data at once
+
+    Rows from the last one where every variable is valid onwards are held
+    back and filled together with the next chunk, so that gaps spanning the
+    boundary between chunks are interpolated between the valid values on
+    either side.
+
+    chunks: Iterable of (data, fillvals) tuples, as from iter_omni_chunks
+
+    Yields: Dictionaries with the same keys as data, with gaps filled
+    """
+
+    import numpy as np
+
+    carry=None
+    written=0
+    filled=None
+    pending=0
+
+    for data, fillvals in chunks:
+        if carry is not None:
+            data={key:np.concatenate([carry[key],data[key]]) for key in data}
+
+        filled={'time':data['time']}
+        valid=np.ones(len(data['time']),dtype=bool)
+        for var,fillval in fillvals.items():
+            filled[var]=fill_gaps(data[var].copy(),fillval=fillval)
+            valid&=~np.isclose(data[var],fillval)
+
+        inds=np.flatnonzero(valid)
+        if len(inds)==0:
+            # Nothing can be filled until a valid row arrives
+            carry=data
+            pending=written
+            continue
+
+        last_valid=inds[-1]
+        yield {key:values[written:last_valid+1] for key,values in filled.items()}
+
+        # The first row of the carried data has already been written
+        carry={key:values[last_valid:] for key,values in data.items()}
+        written=1
+        pending=last_valid+1
+
+    # Rows after the last row where every variable is valid
+    if filled is not None:
+        rows={key:values[pending:] for key,values in filled.items()}
+        if len(rows['time'])>0:
+            yield rows
+
 def parse_args():
     from argparse import ArgumentParser
     import dateutil.parser
@@ -39,46 +196,42 @@ def parse_args():
                         help='Start time of solar wind observations ' +
                              'in ISO 8601 format')
     parser.add_argument('--proxy', help='Proxy server URL', type=convert_proxy)
-    parser.add_argument('--outfile', help='Output filename', default='omnidata.dat')
+    parser.add_argument('--outfile', default='omnidata.dat',
+                        help='Output filename (compressed with gzip if it ends in .gz)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of months of data to fetch concurrently. ' +
+                             'Defaults to 4.')
 
     return parser.parse_args()
 
-def omni2swmf(start_time, end_time, outfile, proxy=None):
-
-    from spacepy import pybats
-    from spacepy import datamodel as dm
-    import numpy as np
-    import sys
-
-    omnidata=get_omni(start_time, end_time,proxy=proxy)
+def omni2swmf(start_time, end_time, outfile, proxy=None, workers=4):
+    """
+    Write OMNI data to an SWMF IMF input file
 
-    for var in omnidata.keys():
-        if var=='Epoch': continue
-        omnidata[var]=fill_gaps(omnidata[var],
-                                fillval=omnidata[var].attrs['FILLVAL'])
+    The data are fetched a month at a time (see iter_omni_chunks) and written
+    as they arrive, so memory use does not grow with the length of the
+    interval.
 
-    imf = pybats.ImfInput(load=False)
+    workers: Number of months to fetch concurrently
+    """
 
-    denvar, tempvar = detect_pybats_imf_vars(imf)
+    # OMNI variable for each column of the file
+    source={'bx':'BX_GSE','by':'BY_GSE','bz':'BZ_GSE','ux':'Vx','uy':'Vy','uz':'Vz',
+            'n':'proton_density','t':'T'}
 
-    imf['time']=dm.dmarray(np.array(omnidata['Epoch']))
-    imf[denvar]=omnidata['proton_density']
-    imf[tempvar]=omnidata['T']
-    for dim in 'x','y','z':
-        imf['b{:}'.format(dim)]=omnidata['B{:}_GSE'.format(dim.upper())]
-        imf['u{:}'.format(dim)]=omnidata['V{:}'.format(dim)]
-    imf['v']=-imf['ux']
-    imf['pram']=1.67621e-6*imf['n']*imf['ux']**2
-    imf.attrs['coor']='GSE'
-    imf.attrs['header']='\nCreated using advect1d.omni2swmf {version} using solar wind data from the OMNI database, with gaps filled by linear interpolation.\n\n'.format(version=advect1d.__version__)
+    header='\nCreated using advect1d.omni2swmf {version} using solar wind data from the OMNI database, with gaps filled by linear interpolation.\n\n'.format(version=advect1d.__version__)
 
-    imf.write(outfile)
+    with imf_io.open_imf(outfile,'wb') as fh:
+        fh.write(imf_io.format_header(header, coor='GSE'))
+        for rows in fill_chunks(iter_omni_chunks(start_time, end_time, proxy=proxy, workers=workers)):
+            imf_io.write_rows(fh, rows['time'], [rows[source[var]] for var in imf_io.std_vars])
 
 def omni2swmf_cli():
 
     args=parse_args()
 
-    omni2swmf(args.start_time, args.end_time, args.outfile, proxy=args.proxy)
+    omni2swmf(args.start_time, args.end_time, args.outfile, proxy=args.proxy,
+              workers=args.workers)
 
 if __name__=='__main__':
 
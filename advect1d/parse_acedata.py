@@ -1,83 +1,111 @@
-from datetime import datetime, timedelta
+import numpy as np
 
-def parse_from_web(filename):
+from .textio import read_chunks
 
-    data={
-        'time':[],
-        'bx':[],
-        'by':[],
-        'bz':[],
-        'x':[],
-        'y':[],
-        'z':[],
-    }
+web_columns=['year','doy','h','m','s','bx','by','bz','fraction_good',
+             'n_vectors','quality','x','y','z']
+web_vars=['bx','by','bz','x','y','z']
 
-    with open(filename) as fh:
-        while True:
-            line=fh.readline()
-            if line.startswith('BEGIN DATA'):
-                break
+ruth_columns=['year','doy','dayfrac','n','T','speed','ux','uy','uz']
+ruth_vars=['n','T','ux','uy','uz']
 
-        while True:
-            line=fh.readline()
-            if line=='':
-                break
-            
-            tokens=line.split()
-
-            year,doy,h,m=[int(tok) for tok in tokens[:4]]
-
-            s,bx,by,bz,fraction_good=[float(tok) for tok in tokens[4:9]]
-            n_vectors,quality=[int(tok) for tok in tokens[9:11]]
-            x,y,z=[float(tok) for tok in tokens[11:]]
-
-            time=datetime(year,1,1)+timedelta(doy-1)+timedelta(seconds=h*3600+m*60+s)
-            data['time'].append(time)
-            data['bx'].append(bx)
-            data['by'].append(by)
-            data['bz'].append(bz)
-            data['x'].append(x)
-            data['y'].append(y)
-            data['z'].append(z)
-
-    return data
-
-def parse_from_ruth(filename):
-
-    data={
-        'time':[],
-        'n':[],
-        'T':[],
-        'ux':[],
-        'uy':[],
-        'uz':[],
-    }
-    with open(filename) as fh:
+def day_of_year_to_datetime64(year,doy,seconds):
+    """
+    Convert arrays of years, days of year (starting at 1) and seconds since
+    the start of the day to a datetime64 array with microsecond resolution
+    """
+    days=(np.asarray(year,dtype=int)-1970).astype('datetime64[Y]').astype('datetime64[D]')
+    days=days+(np.asarray(doy,dtype=int)-1).astype('timedelta64[D]')
+    return days.astype('datetime64[us]')+np.round(np.asarray(seconds)*1e6).astype('timedelta64[us]')
 
-        while True:
-            line=fh.readline()
+def iter_from_web(filename,chunksize=100000):
+    """
+    Read an ACE MAG file in the format served by the ACE Science Center in
+    chunks, for files too large to parse at once
 
-            if line=='': break
+    filename: Name of the file
+    chunksize: Number of rows in each chunk
 
-            tokens=line.split()
-            try:
-                int(tokens[0])
-            except (ValueError,IndexError):
-                continue
+    Yields: Dictionaries with 'time' (datetime64) and float arrays of bx,
+            by, bz, x, y and z
+    """
 
-            year=int(tokens[0])
-            doy=int(tokens[1])
+    with open(filename) as fh:
+        for line in fh:
+            if line.startswith('BEGIN DATA'):
+                break
 
-            dayfrac,nden,T,speed,ux,uy,uz=[float(s) for s in tokens[2:]]
+        for rows in read_chunks(fh,len(web_columns),chunksize):
+            cols=dict(zip(web_columns,rows.T))
+            data={'time':day_of_year_to_datetime64(
+                cols['year'],cols['doy'],cols['h']*3600+cols['m']*60+cols['s'])}
+            for var in web_vars:
+                data[var]=cols[var]
+            yield data
 
-            time=datetime(year,1,1)+timedelta(doy-1)+timedelta(seconds=dayfrac*3600*24)
+def iter_from_ruth(filename,chunksize=100000):
+    """
+    Read an ACE SWEPAM file with columns year, day of year, fraction of
+    day, n, T, speed, ux, uy and uz in chunks, for files too large to parse
+    at once
 
+    filename: Name of the file
+    chunksize: Number of rows in each chunk
 
-            data['time'].append(time)
-            data['n'].append(nden)
-            data['T'].append(T)
-            data['ux'].append(ux)
-            data['uy'].append(uy)
-            data['uz'].append(uz)
+    Yields: Dictionaries with 'time' (datetime64) and float arrays of n, T,
+            ux, uy and uz
+    """
 
-        return data
+    with open(filename) as fh:
+        for rows in read_chunks(fh,len(ruth_columns),chunksize):
+            cols=dict(zip(ruth_columns,rows.T))
+            data={'time':day_of_year_to_datetime64(
+                cols['year'],cols['doy'],cols['dayfrac']*3600*24)}
+            for var in ruth_vars:
+                data[var]=cols[var]
+            yield data
+
+def concatenate_chunks(chunks):
+    """
+    Join chunks returned from iter_from_web or iter_from_ruth
+    """
+    joined={}
+    for chunk in chunks:
+        for var,values in chunk.items():
+            joined.setdefault(var,[]).append(values)
+    return {var:np.concatenate(values) for var,values in joined.items()}
+
+def parse_from_web(filename,chunksize=100000):
+    """
+    Read an ACE MAG file in the format served by the ACE Science Center
+
+    Returns: Dictionary with 'time' (datetime64) and float arrays of bx, by,
+             bz, x, y and z
+    """
+    return concatenate_chunks(iter_from_web(filename,chunksize))
+
+def parse_from_ruth(filename,chunksize=100000):
+    """
+    Read an ACE SWEPAM file with columns year, day of year, fraction of
+    day, n, T, speed, ux, uy and uz
+
+    Returns: Dictionary with 'time' (datetime64) and float arrays of n, T,
+             ux, uy and uz
+    """
+    return concatenate_chunks(iter_from_ruth(filename,chunksize))
+
+def to_sw_data(*datasets):
+    """
+    Combine parsed data into the form returned from advect_imf.load_acedata,
+    as used by advect_imf.initialize
+
+    datasets: Dictionaries returned from parse_from_web and parse_from_ruth
+
+    Returns: Dictionary of (time, values) tuples for each variable
+    """
+    sw_data={}
+    for data in datasets:
+        for var,values in data.items():
+            if var!='time':
+                sw_data[var]=(data['time'],values)
+    return sw_data
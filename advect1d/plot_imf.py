@@ -1,78 +1,174 @@
+"""
+Plot advect1d output together with the L1 and OMNI data for the same time.
+
+Only the part of advected.h5 being plotted is read, and every series is
+decimated to the width of the figure in pixels before plotting, keeping the
+minimum and maximum of each pixel column so that spikes and shocks remain
+visible. The L1 and OMNI data are read from the cache where they have been
+fetched before (see cdaweb.get_cdf_day), so repeated plots do not download
+them again.
+"""
+
 # stdlib
 from datetime import datetime
 
 # local
-from cdaweb import get_cdf
-from advect_imf import parse_args, fetch_solarwind
-from cache_decorator import cache_result
+from .advect_imf import convert_proxy, fetch_solarwind, read_output
+from .omni2swmf import load_omni
 
-# others
+# extras
 import numpy as np
-from spacepy import datamodel as dm
-from matplotlib import pyplot as plt
-from matplotlib.gridspec import GridSpec
-
-
-@cache_result()
-def load_omni(dtstart, dtend, proxy=None):
-    return get_cdf('sp_phys', 'OMNI_HRO_1MIN', dtstart, dtend,
-                   ['BX_GSE', 'BY_GSM', 'BZ_GSM', 'Vx', 'Vy', 'Vz', 'T', 'proton_density'],
-                   proxy=proxy)
-
-
-# Read advect1d output
-advect1d_data = dm.fromHDF5('advected.h5')
-advect1d_data['time'] = advect1d_data['time'].astype('datetime64')
-
-# Retrieve start/end times of data and rount to nearest second
-starttime = advect1d_data['time'][0].astype('datetime64[s]').astype(datetime)
-endtime = advect1d_data['time'][-1].astype('datetime64[s]').astype(datetime)
-
-args = parse_args(starttime=starttime, endtime=endtime)
-
-starttime = args.start_time
-endtime = args.end_time
-source = args.source
-proxy = args.proxy
-
-# Fetch OMNI data
-omnidata = load_omni(starttime, endtime, proxy=proxy)
-
-l1data = fetch_solarwind(starttime, endtime, source, proxy)
 
+# Axis label, advect1d variable and OMNI variable of each panel
 varlist = [('$u_x$ (km/s)', 'ux', 'Vx'),
            ('$u_y$ (km/s)', 'uy', 'Vy'),
            ('$u_z$ (km/s)', 'uz', 'Vz'),
            ('$b_x$ (nT)', 'bx', 'BX_GSE'),
-           ('$b_y$ (nT)', 'by', 'BY_GSM'),
-           ('$b_z$ (nT)', 'bz', 'BZ_GSM'),
+           ('$b_y$ (nT)', 'by', 'BY_GSE'),
+           ('$b_z$ (nT)', 'bz', 'BZ_GSE'),
            (r'$\rho$ (cm$^{-3}$)', 'n', 'proton_density'),
            ('T (K)', 'T', 'T')
            ]
 
-gs = GridSpec(len(varlist), 1)
-fig = plt.figure()
-axes = [fig.add_subplot(gs[0, 0])]
-
-for i in range(1, len(varlist)):
-    axes.append(fig.add_subplot(gs[i, 0], sharex=axes[0]))
-
-for i, (ylabel, advect1d_name, omni_name) in enumerate(varlist):
-    ax = axes[i]
 
-    # Mask out bad OMNI data
-    omni_y = omnidata[omni_name]
-    mask = (omnidata[omni_name] < omnidata[omni_name].attrs['VALIDMIN']) | (omnidata[omni_name] > omnidata[omni_name].attrs['VALIDMAX'])
-    omni_y = np.ma.array(omni_y, mask=mask)
+def decimate(times, values, nbins):
+    """
+    Reduce a time series to the minimum and maximum in each of nbins
+    intervals of equal length
 
-    # Plot OMNI data and advect1d output for this variable
-    ax.plot(omnidata['Epoch'], omni_y, label='OMNI')
-    ax.plot(advect1d_data['time'], advect1d_data[advect1d_name], label='advect1d')
-    l1_t, l1_y = l1data[advect1d_name]
-    ax.plot(l1_t, l1_y, label='DSCOVR')
+    times: Array of times (datetime64), in increasing order
+    values: Array of values. NaN values are ignored.
+    nbins: Number of intervals (for example, the width of the plot in pixels)
 
-    ax.set_ylabel(ylabel)
+    Returns: Arrays of times and values of the samples kept (at most 2*nbins),
+             in their original order
+    """
 
-axes[-1].legend(loc='best')
+    times = np.asarray(times)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n <= 2*nbins:
+        return times, values
+
+    # Index of the first sample in each non-empty interval
+    tnum = times.astype('datetime64[us]').astype(np.int64)
+    edges = np.linspace(tnum[0], tnum[-1], nbins+1)[:-1]
+    starts = np.unique(np.searchsorted(tnum, edges))
+    interval = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+
+    keep = []
+    for reduce in (np.fmin, np.fmax):
+        extreme = reduce.reduceat(values, starts)
+        # The first sample in each interval equal to its extreme value
+        matches = np.flatnonzero(values == extreme[interval])
+        first = np.unique(interval[matches], return_index=True)[1]
+        keep.append(matches[first])
+    keep = np.unique(np.concatenate(keep))
+
+    return times[keep], values[keep]
+
+
+def plot_imf(hdf_file='advected.h5', starttime=None, endtime=None, source='DSCOVR',
+             proxy=None, l1=True, omni=True, fig=None, nbins=None):
+    """
+    Plot advect1d output, the L1 data it was made from and OMNI data
+
+    hdf_file: Name of an HDF5 file written by advect_imf
+    starttime, endtime: Time range to plot (by default, that of the output)
+    source: Solar wind data source of the L1 data ("ACE" or "DSCOVR")
+    proxy: Proxy server URL, if the L1 or OMNI data are not in the cache
+    l1, omni: Whether to plot the L1 and OMNI data
+    fig: Figure to plot in (by default, a new figure)
+    nbins: Number of intervals that each series is decimated to (by
+           default, the width of the figure in pixels)
+
+    Returns: The figure
+    """
+
+    import h5py
+    from matplotlib import pyplot as plt
+
+    # Read advect1d output
+    with h5py.File(hdf_file, 'r') as fh:
+        advect1d_data = read_output(fh, [name for ylabel, name, omni_name in varlist],
+                                    starttime, endtime)
+
+    # Start/end times of data, truncated to the second
+    if starttime is None:
+        starttime = advect1d_data['time'][0].astype('datetime64[s]').astype(datetime)
+    if endtime is None:
+        endtime = advect1d_data['time'][-1].astype('datetime64[s]').astype(datetime)
+
+    if fig is None:
+        fig = plt.figure()
+    if nbins is None:
+        nbins = int(fig.get_size_inches()[0]*fig.dpi)
+
+    # Times and values of each variable, for each data set
+    series = [('advect1d', {name: (advect1d_data['time'], advect1d_data[name])
+                            for ylabel, name, omni_name in varlist})]
+
+    if omni:
+        omnidata = load_omni(starttime, endtime, proxy)
+        series.insert(0, ('OMNI', {name: (omnidata['time'], omnidata[omni_name])
+                                   for ylabel, name, omni_name in varlist}))
+
+    if l1:
+        series.append((source, fetch_solarwind(starttime, endtime, source, proxy)))
+
+    axes = fig.subplots(len(varlist), 1, sharex=True, squeeze=False)[:, 0]
+
+    for ax, (ylabel, name, omni_name) in zip(axes, varlist):
+        for label, data in series:
+            t, y = data[name]
+            ax.plot(*decimate(np.asarray(t, dtype='datetime64[us]'), y, nbins), label=label)
+
+        ax.set_ylabel(ylabel)
+
+    axes[-1].legend(loc='best')
+
+    return fig
+
+
+def plot_imf_cli():
+
+    from argparse import ArgumentParser
+    import dateutil.parser
+
+    parser = ArgumentParser(description='Plot advect1d output together with ' +
+                                        'the L1 and OMNI data for the same time.')
+    parser.add_argument('hdf_file', nargs='?', default='advected.h5',
+                        help='advect1d output file. Defaults to advected.h5.')
+    parser.add_argument('--start-time', type=dateutil.parser.isoparse, default=None,
+                        dest='start_time',
+                        help='Start of the time range to plot, in ISO 8601 ' +
+                             'format. Defaults to the start of the output.')
+    parser.add_argument('--end-time', type=dateutil.parser.isoparse, default=None,
+                        dest='end_time',
+                        help='End of the time range to plot, in ISO 8601 ' +
+                             'format. Defaults to the end of the output.')
+    parser.add_argument('--source', default='DSCOVR',
+                        help='Solar wind data source ("ACE" or "DSCOVR")')
+    parser.add_argument('--proxy', help='Proxy server URL', type=convert_proxy)
+    parser.add_argument('--no-l1', action='store_false', dest='l1',
+                        help='Do not plot the L1 data')
+    parser.add_argument('--no-omni', action='store_false', dest='omni',
+                        help='Do not plot the OMNI data')
+    parser.add_argument('--outfile', default=None,
+                        help='Save the plot to this file instead of displaying it')
+
+    args = parser.parse_args()
+
+    fig = plot_imf(args.hdf_file, args.start_time, args.end_time, source=args.source,
+                   proxy=args.proxy, l1=args.l1, omni=args.omni)
 
-plt.show()
+    if args.outfile:
+        fig.savefig(args.outfile)
+    else:
+        from matplotlib import pyplot as plt
+        plt.show()
+
+
+if __name__ == '__main__':
+
+    plot_imf_cli()
@@ -0,0 +1,218 @@
+"""
+Download the CDAWeb data needed for a list of time windows into the cache, so
+that the windows can later be advected without network access.
+
+Data are fetched and cached one UTC day at a time (see cdaweb.get_cdf_day),
+which is also how advect_imf.load_acedata and load_dscovr read them. A day
+needed by several overlapping windows is downloaded only once. The cache is
+written to the cache directory under the current working directory, so run
+the compute jobs from the same directory (or copy the cache directory).
+"""
+
+# stdlib
+import sys
+import json
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# local
+from .advect_imf import source_datasets, make_parser, parse_args
+from .cdaweb import days_in, days_with_data, get_cdf_day, record_varying
+
+# extras
+import numpy as np
+
+
+def merge_windows(windows):
+    """
+    Merge overlapping time windows for each source
+
+    windows: List of (source, start, end) tuples
+
+    Returns: Sorted list of (source, start, end) tuples with no overlaps
+    """
+
+    merged = []
+    for source, start, end in sorted(windows):
+        if merged and merged[-1][0] == source and start <= merged[-1][2]:
+            merged[-1] = (source, merged[-1][1], max(merged[-1][2], end))
+        else:
+            merged.append((source, start, end))
+    return merged
+
+
+def prefetch_tasks(windows, proxy=None):
+    """
+    List the downloads needed to cover a list of time windows. Days that are
+    not in a data set's inventory are left out.
+
+    windows: List of (source, start, end) tuples
+    proxy: Proxy server, as returned from advect_imf.convert_proxy
+
+    Returns: Sorted list of (source, data set name, day) tuples, each listed once
+    """
+
+    tasks = set()
+    for source, start, end in merge_windows(windows):
+        for name, (dataview, dataset, variables) in source_datasets[source].items():
+            for day in days_with_data(dataview, dataset, start, end, proxy=proxy):
+                tasks.add((source, name, day))
+    return sorted(tasks)
+
+
+def fetch_day(task, proxy=None):
+    """
+    Download (or read from the cache) one day of one data set
+
+    task: (source, data set name, day) tuple
+
+    Returns: Array of the times of the records (datetime64), or None if
+             CDAWeb has no data for the day
+    """
+
+    source, name, day = task
+    dataview, dataset, variables = source_datasets[source][name]
+
+    data = get_cdf_day(dataview, dataset, day, tuple(variables), proxy=proxy)
+    if data is None:
+        return None
+
+    time_var = record_varying(data)[variables[0]]
+    return np.asarray(data[time_var], dtype='datetime64[us]')
+
+
+def find_gaps(times, start, end, max_gap=timedelta(minutes=10)):
+    """
+    Find gaps in a set of observation times
+
+    times: Array of times (datetime64)
+    start, end: Interval that the times should cover
+    max_gap: Shortest gap to report. Data with a coarser cadence than this
+             (such as orbit data) are only checked for gaps of more than five
+             times their typical spacing.
+
+    Returns: List of (gap start, gap end) tuples (datetime)
+    """
+
+    start = np.datetime64(start, 'us')
+    end = np.datetime64(end, 'us')
+    times = np.sort(times[(times >= start) & (times <= end)])
+
+    threshold = np.timedelta64(max_gap)
+    if len(times) > 1:
+        threshold = max(threshold, 5*np.median(np.diff(times)))
+
+    bounds = np.concatenate([[start], times, [end]])
+    spacing = np.diff(bounds)
+    inds = np.flatnonzero(spacing > threshold)
+
+    return [(bounds[i].astype(object), bounds[i+1].astype(object)) for i in inds]
+
+
+def prefetch(windows, connections=4, proxy=None, max_gap=timedelta(minutes=10)):
+    """
+    Download the data for a list of time windows into the cache
+
+    windows: List of (source, start, end) tuples
+    connections: Maximum number of concurrent downloads
+    proxy: Proxy server, as returned from advect_imf.convert_proxy
+    max_gap: Shortest gap in the data to report (see find_gaps)
+
+    Returns: Dictionary with a list of failed downloads ('failed') and a list
+             of gaps in the coverage of each window ('gaps')
+    """
+
+    tasks = prefetch_tasks(windows, proxy=proxy)
+
+    def fetch(task):
+        try:
+            return fetch_day(task, proxy=proxy), None
+        except Exception as e:
+            return None, repr(e)
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        results = dict(zip(tasks, executor.map(fetch, tasks)))
+
+    failed = [{'source': source, 'dataset': source_datasets[source][name][1],
+               'day': day.isoformat(), 'error': error}
+              for (source, name, day), (times, error) in results.items()
+              if error is not None]
+
+    gaps = []
+    for source, start, end in merge_windows(windows):
+        for name in source_datasets[source]:
+            times = [results.get((source, name, day), (None, None))[0]
+                     for day in days_in(start, end)]
+            times = [day_times for day_times in times if day_times is not None]
+            times = np.concatenate(times) if times else np.array([], dtype='datetime64[us]')
+            for gap_start, gap_end in find_gaps(times, start, end, max_gap):
+                gaps.append({'source': source, 'dataset': source_datasets[source][name][1],
+                             'start': gap_start.isoformat(), 'end': gap_end.isoformat()})
+
+    return {'ndownloads': len(tasks), 'failed': failed, 'gaps': gaps}
+
+
+def read_windows(filename, margin=timedelta(0)):
+    """
+    Read time windows from a campaign job file (see campaign.read_jobs)
+
+    margin: Extra time to fetch before the start of each window (for spin-up)
+
+    Returns: List of (source, start, end) tuples
+    """
+
+    from .campaign import read_jobs
+
+    return [(job['source'], job['start_time']-margin, job['end_time'])
+            for job in read_jobs(filename)]
+
+
+def prefetch_cli():
+
+    parser = make_parser(description='Download the CDAWeb data for a list of time ' +
+                                     'windows into the cache, and report gaps in ' +
+                                     'the data.')
+    parser.add_argument('jobs', nargs='?',
+                        help='Campaign job file listing the windows to fetch (see ' +
+                             'advect1d.campaign). If not given, the window is ' +
+                             'taken from --start-time, --end-time and --source.')
+    parser.add_argument('--connections', type=int, default=4,
+                        help='Maximum number of concurrent downloads. Defaults to 4.')
+    parser.add_argument('--margin-hours', type=float, default=0, dest='margin_hours',
+                        help='Extra time to fetch before the start of each ' +
+                             'window, e.g. for spin-up. Defaults to 0.')
+    parser.add_argument('--max-gap-minutes', type=float, default=10, dest='max_gap_minutes',
+                        help='Shortest gap in the data to report. Defaults to 10.')
+    parser.add_argument('--report',
+                        help='Name of a JSON file to write the coverage report to')
+
+    args = parse_args(parser=parser)
+
+    margin = timedelta(hours=args.margin_hours)
+
+    if args.jobs:
+        windows = read_windows(args.jobs, margin)
+    else:
+        windows = [(args.source, args.start_time-margin, args.end_time)]
+
+    report = prefetch(windows, connections=args.connections, proxy=args.proxy,
+                      max_gap=timedelta(minutes=args.max_gap_minutes))
+
+    print('{} day(s) of data fetched for {} window(s)'.format(report['ndownloads'],
+                                                              len(windows)))
+    for failure in report['failed']:
+        print('Failed to fetch {dataset} for {day}: {error}'.format(**failure))
+    for gap in report['gaps']:
+        print('Gap in {dataset} from {start} to {end}'.format(**gap))
+
+    if args.report:
+        with open(args.report, 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+
+    prefetch_cli()
@@ -0,0 +1,266 @@
+"""
+Score advect1d output against OMNI.
+
+Each run (an advected.h5 file from advect_imf, or each run_NNN group of a
+sweep file) is averaged onto a common cadence together with OMNI, and for
+each variable the RMSE, correlation and timing offset of the run relative to
+OMNI are computed. Resampling is done with np.bincount and the timing offset
+with an FFT cross-correlation, so month-long series score in milliseconds.
+"""
+
+# stdlib
+import csv
+from datetime import datetime
+
+# extras
+import numpy as np
+
+# advect1d variable and the corresponding OMNI variable (both GSE)
+score_vars = [('ux', 'Vx'), ('uy', 'Vy'), ('uz', 'Vz'),
+              ('bx', 'BX_GSE'), ('by', 'BY_GSE'), ('bz', 'BZ_GSE'),
+              ('n', 'proton_density'), ('T', 'T')]
+
+table_columns = ['file', 'run', 'var', 'n', 'rmse', 'corr', 'lag', 'lag_corr']
+
+
+def read_runs(filename, variables=[var for var, omni_var in score_vars]):
+    """
+    Read the runs in an advect1d output file
+
+    filename: An HDF5 file written by advect_imf.write_output, or by
+              sweep.write_sweep
+    variables: Names of the variables to read (others are not read)
+
+    Returns: List of (run name, data) tuples, where data is a dictionary
+             with 'time' (datetime64) and an array for each variable. The run
+             name is '' for a file holding a single run.
+    """
+
+    import h5py
+    from .advect_imf import read_output
+
+    with h5py.File(filename, 'r') as fh:
+        if 'time' in fh:
+            return [('', read_output(fh, variables))]
+        return [(name, read_output(fh[name], variables)) for name in sorted(fh)
+                if isinstance(fh[name], h5py.Group) and 'time' in fh[name]]
+
+
+def resample(times, values, start, cadence, nbins):
+    """
+    Average a time series into bins of equal length
+
+    times: Array of times (datetime64)
+    values: Array of values. NaN values are ignored.
+    start: Start of the first bin (datetime64)
+    cadence: Length of each bin (timedelta64)
+    nbins: Number of bins
+
+    Returns: Array of the mean of the values in each bin (NaN for bins with
+             no valid values)
+    """
+
+    bins = (np.asarray(times, dtype='datetime64[us]')-np.datetime64(start, 'us')) // \
+        np.timedelta64(cadence, 'us')
+    values = np.asarray(values, dtype=np.float64)
+    keep = (bins >= 0) & (bins < nbins) & np.isfinite(values)
+
+    counts = np.bincount(bins[keep], minlength=nbins)
+    sums = np.bincount(bins[keep], weights=values[keep], minlength=nbins)
+
+    with np.errstate(invalid='ignore'):
+        return sums/counts
+
+
+def fft_lag(model, obs, max_lag):
+    """
+    Find the shift of model that best correlates it with obs
+
+    model, obs: Arrays of equal length on the same uniform time grid. NaN
+                values are ignored.
+    max_lag: Largest shift to consider, in samples
+
+    Returns: Shift in samples (positive if features appear later in model
+             than in obs), and the correlation at that shift
+    """
+
+    n = len(model)
+    max_lag = min(max_lag, n-1)
+
+    model_valid = np.isfinite(model)
+    obs_valid = np.isfinite(obs)
+    if not np.any(model_valid) or not np.any(obs_valid):
+        return 0, np.nan
+
+    a = np.where(obs_valid, obs-np.mean(obs[obs_valid]), 0.)
+    b = np.where(model_valid, model-np.mean(model[model_valid]), 0.)
+
+    # Zero-padded so that, for shifts of up to max_lag, the circular
+    # correlation computed with the FFT equals the linear one
+    nfft = 1 << int(np.ceil(np.log2(n+max_lag)))
+    spectra = [np.fft.rfft(x, nfft) for x in
+               (obs_valid.astype(float), model_valid.astype(float), a, b, a**2, b**2)]
+    obs_valid_f, model_valid_f, a_f, b_f, a2_f, b2_f = spectra
+
+    def xcorr(x_f, y_f):
+        # Sums over t of x[t]*y[t+k], for k from -max_lag to max_lag
+        c = np.fft.irfft(np.conj(x_f)*y_f, nfft)
+        return np.concatenate([c[nfft-max_lag:], c[:max_lag+1]])
+
+    # Normalized by the variance of the values that overlap at each shift
+    count = np.round(xcorr(obs_valid_f, model_valid_f))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = xcorr(a_f, b_f)/np.sqrt(xcorr(a2_f, model_valid_f)*xcorr(obs_valid_f, b2_f))
+
+    # Shifts that overlap less than half the valid data are not trusted
+    corr[count < 0.5*min(np.sum(obs_valid), np.sum(model_valid))] = np.nan
+    if np.all(np.isnan(corr)):
+        return 0, np.nan
+
+    best = np.nanargmax(corr)
+    return int(best-max_lag), corr[best]
+
+
+def score_series(model, obs, max_lag):
+    """
+    Compare two time series on the same uniform time grid
+
+    model, obs: Arrays of values. NaN values are ignored.
+    max_lag: Largest timing offset to consider, in samples
+
+    Returns: Dictionary with the number of samples where both are valid
+             ('n'), the RMSE ('rmse') and correlation ('corr') at zero
+             offset, and the timing offset in samples ('lag', see fft_lag)
+             and the correlation at that offset ('lag_corr')
+    """
+
+    both = np.isfinite(model) & np.isfinite(obs)
+    n = int(np.sum(both))
+    if n < 2:
+        return {'n': n, 'rmse': np.nan, 'corr': np.nan, 'lag': np.nan, 'lag_corr': np.nan}
+
+    diff = model[both]-obs[both]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.corrcoef(model[both], obs[both])[0, 1]
+    lag, lag_corr = fft_lag(model, obs, max_lag)
+
+    return {'n': n, 'rmse': np.sqrt(np.mean(diff**2)), 'corr': corr, 'lag': lag,
+            'lag_corr': lag_corr}
+
+
+def score_run(data, omnidata, cadence=60, max_lag=3600, variables=score_vars):
+    """
+    Score one advect1d run against OMNI
+
+    data: Dictionary of advect1d output, as from read_runs
+    omnidata: Dictionary of OMNI data, as from omni2swmf.load_omni
+    cadence: Length (seconds) of the bins that both are averaged into
+    max_lag: Largest timing offset to consider (seconds)
+    variables: List of (advect1d variable, OMNI variable) pairs
+
+    Returns: Dictionary mapping each advect1d variable to a dictionary of
+             scores (see score_series), with the lag in seconds
+    """
+
+    step = np.timedelta64(int(cadence*1e6), 'us')
+    start = data['time'][0]
+    nbins = int((data['time'][-1]-start)//step)+1
+
+    scores = {}
+    for var, omni_var in variables:
+        model = resample(data['time'], data[var], start, step, nbins)
+        obs = resample(omnidata['time'], omnidata[omni_var], start, step, nbins)
+        scores[var] = score_series(model, obs, int(max_lag//cadence))
+        scores[var]['lag'] *= cadence
+
+    return scores
+
+
+def score_files(filenames, omnidata=None, cadence=60, max_lag=3600, proxy=None):
+    """
+    Score the runs in one or more advect1d output files against OMNI
+
+    filenames: Names of files written by advect_imf or sweep
+    omnidata: Dictionary of OMNI data, as from omni2swmf.load_omni. By
+              default, OMNI data covering all of the runs are fetched.
+    cadence, max_lag: As for score_run
+    proxy: Proxy server URL, for fetching OMNI data
+
+    Returns: List of rows of scores, one for each run and variable, as
+             dictionaries with the keys in table_columns
+    """
+
+    runs = [(filename, name, data) for filename in filenames
+            for name, data in read_runs(filename)]
+
+    if omnidata is None:
+        from .omni2swmf import load_omni
+        start = min(data['time'][0] for filename, name, data in runs)
+        end = max(data['time'][-1] for filename, name, data in runs)
+        omnidata = load_omni(start.astype(datetime), end.astype(datetime), proxy)
+
+    rows = []
+    for filename, name, data in runs:
+        scores = score_run(data, omnidata, cadence=cadence, max_lag=max_lag)
+        for var, omni_var in score_vars:
+            row = {'file': filename, 'run': name, 'var': var}
+            row.update(scores[var])
+            rows.append(row)
+
+    return rows
+
+
+def write_table(rows, outfile):
+    """
+    Write rows of scores to a CSV file
+
+    rows: List of rows, as from score_files
+    outfile: Name of the file, or a file object
+    """
+
+    def format_value(value):
+        if isinstance(value, float):
+            return '{:.6g}'.format(value)
+        return value
+
+    def write(fh):
+        writer = csv.DictWriter(fh, table_columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: format_value(value) for key, value in row.items()})
+
+    if hasattr(outfile, 'write'):
+        write(outfile)
+    else:
+        with open(outfile, 'w', newline='') as fh:
+            write(fh)
+
+
+def score_cli():
+
+    from argparse import ArgumentParser
+    from .advect_imf import convert_proxy
+
+    parser = ArgumentParser(description='Score advect1d output against OMNI.')
+    parser.add_argument('files', nargs='+',
+                        help='advect1d output files (advected.h5, or sweep output)')
+    parser.add_argument('--cadence', type=float, default=60,
+                        help='Length of the bins (seconds) that the output ' +
+                             'and OMNI are averaged into. Defaults to 60.')
+    parser.add_argument('--max-lag', type=float, default=3600, dest='max_lag',
+                        help='Largest timing offset (seconds) to search for. ' +
+                             'Defaults to 3600.')
+    parser.add_argument('--proxy', help='Proxy server URL', type=convert_proxy)
+    parser.add_argument('--outfile', default='scores.csv',
+                        help='Output filename. Defaults to scores.csv.')
+
+    args = parser.parse_args()
+
+    rows = score_files(args.files, cadence=args.cadence, max_lag=args.max_lag,
+                       proxy=args.proxy)
+    write_table(rows, args.outfile)
+
+
+if __name__ == '__main__':
+
+    score_cli()
@@ -0,0 +1,154 @@
+"""
+Run the advection solver over the Cartesian product of several solver settings.
+
+The L1 data is fetched and gap-filled once, and handed to each worker process
+when the pool starts, so every run in the sweep uses identical input.
+"""
+
+# stdlib
+from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+
+# local
+from .advect_imf import (advect, fetch_solarwind, from_seconds, make_parser, parse_args,
+                         limiter_names, ssprk_unsupported_limiters)
+
+# L1 data shared (read-only) by all runs in a worker process
+_sw_data = None
+
+
+def _init_worker(sw_data):
+    global _sw_data
+    _sw_data = sw_data
+
+
+def _run(settings, output_x):
+    return advect(_sw_data, output_x=output_x, **settings)
+
+
+def sweep_settings(ncells=(1000,), nuMax=(0.5,), limiter=('Minmod',), **fixed):
+    """
+    List all combinations of solver settings
+
+    ncells: Sequence of grid sizes
+    nuMax: Sequence of maximum CFL numbers
+    limiter: Sequence of names of flux limiter functions in limiters.py
+    fixed: Other keyword arguments for advect_imf.advect (e.g. scheme), used
+           for every run
+
+    Returns: List of dictionaries of keyword arguments for advect_imf.advect
+    """
+
+    # Check the limiters here, rather than in the worker processes
+    scheme = fixed.get('scheme', 'explicit')
+    for lim in limiter:
+        if lim not in limiter_names:
+            raise ValueError("Invalid limiter '{}'".format(lim))
+        if scheme.startswith('ssprk') and lim in ssprk_unsupported_limiters:
+            raise ValueError("The {} limiter can not be used with the {} scheme".format(
+                lim, scheme))
+
+    return [dict(fixed, ncells=n, nuMax=nu, limiter=lim)
+            for n, nu, lim in product(ncells, nuMax, limiter)]
+
+
+def sweep(sw_data, settings, output_x=203872, workers=None):
+    """
+    Advect the same L1 data with each of a list of solver settings, in parallel
+
+    sw_data: Dictionary of L1 solar wind data, structured in the form returned from
+             load_acedata or load_dscovr
+    settings: List of dictionaries of keyword arguments for advect_imf.advect, as
+              returned from sweep_settings
+    output_x: x coordinate (GSM/GSE, km) where output values should be provided
+    workers: Number of worker processes (defaults to the number of CPUs)
+
+    Returns: List of (outdata, t0) tuples in the same order as settings
+    """
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(sw_data,)) as executor:
+        futures = [executor.submit(_run, run_settings, output_x)
+                   for run_settings in settings]
+        return [future.result() for future in futures]
+
+
+def write_sweep(filename, settings, results, output_x=203872):
+    """
+    Write the output of a sweep to a single HDF5 file
+
+    Each run is stored in its own group (run_000, run_001, ...), with the solver
+    settings stored as attributes of the group.
+
+    filename: Name of the HDF5 file to write
+    settings: List of solver settings, as passed to sweep
+    results: List of (outdata, t0) tuples, as returned from sweep
+    output_x: x coordinate (GSM/GSE, km) of the output
+    """
+
+    from spacepy import datamodel as dm
+
+    outhdf = dm.SpaceData(attrs={'output_x': output_x})
+
+    for i, (run_settings, (outdata, t0)) in enumerate(zip(settings, results)):
+        group = dm.SpaceData(attrs=dict(run_settings))
+        for var, values in outdata.items():
+            group[var] = dm.dmarray(values)
+        group['time'] = dm.dmarray(from_seconds(outdata['time'], t0))
+        group['time'].attrs['epoch'] = t0.isoformat()
+        outhdf['run_{:03d}'.format(i)] = group
+
+    outhdf.toHDF5(filename)
+
+
+def sweep_cli():
+
+    parser = make_parser(description='Advect solar wind data using every ' +
+                                     'combination of the given solver settings.',
+                         conflict_handler='resolve')
+    parser.add_argument('--ncells', type=int, nargs='+', default=[1000],
+                        help='Grid sizes to run. Defaults to 1000.')
+    parser.add_argument('--nu-max', type=float, nargs='+', default=[0.5], dest='nuMax',
+                        help='Maximum CFL numbers to run. Defaults to 0.5.')
+    parser.add_argument('--limiter', nargs='+', default=['Minmod'], choices=limiter_names,
+                        help='Flux limiters (from limiters.py) to run. ' +
+                             'Defaults to Minmod.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes. Defaults to the ' +
+                             'number of CPUs.')
+    parser.add_argument('--outfile', default='sweep.h5',
+                        help='Output filename. Defaults to sweep.h5.')
+
+    args = parse_args(parser=parser)
+
+    if args.method != 'advect':
+        parser.error('Only the advection solver can be swept')
+    if args.ballistic:
+        parser.error('--ballistic-init is not supported by sweeps')
+    if args.store is not None:
+        parser.error('--l1-store is not supported by sweeps')
+
+    # Settings used for every run
+    fixed = {'scheme': args.scheme, 'dtype': args.dtype, 'trim': args.trim,
+             'adaptive': args.adaptive, 'skip_quiet': args.skip_quiet,
+             'quiet_tol': args.quiet_tol}
+    if args.threads:
+        fixed['threads'] = args.threads
+
+    try:
+        settings = sweep_settings(args.ncells, args.nuMax, args.limiter, **fixed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    sw_data = fetch_solarwind(args.start_time, args.end_time, source=args.source,
+                              proxy=args.proxy, noise=not args.disable_noise,
+                              seed=args.seed)
+
+    results = sweep(sw_data, settings, output_x=args.output_x, workers=args.workers)
+
+    write_sweep(args.outfile, settings, results, output_x=args.output_x)
+
+
+if __name__ == '__main__':
+
+    sweep_cli()
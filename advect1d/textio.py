@@ -0,0 +1,45 @@
+"""
+Read numeric text tables, such as ACE data files and SWMF IMF input files,
+a chunk of rows at a time.
+"""
+
+# stdlib
+from itertools import islice
+
+# extras
+import numpy as np
+
+
+def is_data_row(line):
+    """
+    True if the first token of a line is an integer (such as a year), as in
+    the rows of data of the tables read here
+    """
+    tokens = line.split(None, 1)
+    return len(tokens) > 0 and tokens[0].isdigit()
+
+
+def read_chunks(fh, columns, chunksize):
+    """
+    Read whitespace-separated numeric rows from an open file in chunks
+
+    fh: Open file, positioned at the first row to read
+    columns: Number of columns in each row
+    chunksize: Maximum number of rows in each chunk
+
+    Yields: 2-D float arrays of shape (rows, columns). Rows that are not
+            numeric (such as headers) are skipped.
+    """
+    while True:
+        lines = list(islice(fh, chunksize))
+        if not lines:
+            break
+        try:
+            rows = np.loadtxt(lines, ndmin=2)
+        except ValueError:
+            # Only rows whose first token is an integer hold data
+            lines = [line for line in lines if is_data_row(line)]
+            rows = np.loadtxt(lines, ndmin=2) if lines else np.empty((0, columns))
+        if rows.size == 0:
+            rows = np.empty((0, columns))
+        yield rows
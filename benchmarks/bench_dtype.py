@@ -0,0 +1,41 @@
+"""
+Compare float32 and float64 advection of the reference event (the interval in
+test_config), reporting run times and the largest differences in the output.
+
+Usage: python benchmarks/bench_dtype.py [ncells]
+"""
+
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from advect1d.advect_imf import advect, fetch_solarwind
+
+if __name__ == '__main__':
+
+    ncells = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    # Linear gap filling so that both runs see identical input
+    sw_data = fetch_solarwind(datetime(2017, 9, 6, 20), datetime(2017, 9, 7, 5),
+                              source='DSCOVR', noise=False)
+
+    results = {}
+    for dtype in [np.float64, np.float32]:
+        tstart = time.time()
+        outdata, t0 = advect(sw_data, output_x=203872, ncells=ncells, dtype=dtype)
+        results[dtype] = outdata
+        print('{}: {:.1f} s'.format(np.dtype(dtype).name, time.time()-tstart))
+
+    ref = results[np.float64]
+    single = results[np.float32]
+
+    print('{:>4} {:>14} {:>14}'.format('var', 'max abs diff', 'max rel diff'))
+    for var in ['ux', 'uy', 'uz', 'bx', 'by', 'bz', 'n', 'T']:
+        # The two runs take slightly different time steps, so compare on the
+        # float64 output times
+        values = np.interp(ref['time'], single['time'], np.array(single[var], dtype=float))
+        diff = np.abs(values-np.array(ref[var], dtype=float))
+        print('{:>4} {:>14.3g} {:>14.3g}'.format(
+            var, diff.max(), diff.max()/np.abs(ref[var]).max()))
@@ -0,0 +1,65 @@
+"""
+Compare the time taken to write and read an SWMF IMF input file with
+advect1d.imf_io and with spacepy.pybats.ImfInput, for a series of irregularly
+spaced rows like those written by advect_imf.
+
+Usage: python benchmarks/bench_imf_io.py [rows]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from advect1d import imf_io
+
+if __name__ == '__main__':
+
+    from spacepy import pybats
+    from spacepy import datamodel as dm
+
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+
+    rng = np.random.default_rng(0)
+    data = {'time': np.datetime64('2017-09-06T20:00', 'us') +
+            np.cumsum(rng.integers(1, 2000000, nrows)).astype('timedelta64[us]')}
+    for var in imf_io.std_vars:
+        data[var] = rng.normal(size=nrows)*100
+
+    imf = pybats.ImfInput(load=False)
+    for var in imf_io.std_vars:
+        imf[var] = dm.dmarray(data[var])
+    imf['time'] = dm.dmarray(data['time'].astype(datetime))
+    imf.attrs['coor'] = 'GSE'
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'imf.dat')
+
+        timings = []
+
+        tstart = time.time()
+        imf.write(filename)
+        timings.append(('ImfInput.write', time.time()-tstart))
+
+        tstart = time.time()
+        pybats.ImfInput(filename)
+        timings.append(('ImfInput (read)', time.time()-tstart))
+
+        tstart = time.time()
+        imf_io.write_imf(filename, data, coor='GSE')
+        timings.append(('imf_io.write_imf', time.time()-tstart))
+
+        tstart = time.time()
+        imf_io.read_imf(filename)
+        timings.append(('imf_io.read_imf', time.time()-tstart))
+
+        tstart = time.time()
+        imf_io.write_imf(filename+'.gz', data, coor='GSE')
+        timings.append(('imf_io.write_imf (gzip)', time.time()-tstart))
+
+    print('{} rows'.format(nrows))
+    for name, elapsed in timings:
+        print('{:>24}: {:.3f} s'.format(name, elapsed))
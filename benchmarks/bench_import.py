@@ -0,0 +1,31 @@
+"""
+Measure the start-up time of the advect1d modules and command line tools, each
+in a fresh interpreter.
+
+Usage: python benchmarks/bench_import.py [repeats]
+"""
+
+import sys
+import time
+import subprocess
+
+commands = [
+    ('python (baseline)', ['-c', 'pass']),
+    ('import numpy', ['-c', 'import numpy']),
+    ('import advect1d.advect_imf', ['-c', 'import advect1d.advect_imf']),
+    ('import advect1d.omni2swmf', ['-c', 'import advect1d.omni2swmf']),
+    ('advect_imf --help', ['-m', 'advect1d.advect_imf', '--help']),
+    ('omni2swmf --help', ['-m', 'advect1d.omni2swmf', '--help']),
+]
+
+if __name__ == '__main__':
+
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for name, args in commands:
+        times = []
+        for i in range(repeats):
+            tstart = time.time()
+            subprocess.run([sys.executable]+args, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.time()-tstart)
+        print('{:>28}: {:.3f} s (best of {})'.format(name, min(times), repeats))
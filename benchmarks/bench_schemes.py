@@ -0,0 +1,48 @@
+"""
+Compare the accuracy and run time of the time integration schemes for the
+reference event (the interval in test_config) at several grid sizes.
+
+Errors are the mean absolute differences from a run of the explicit scheme
+with a fine grid.
+
+Usage: python benchmarks/bench_schemes.py [limiter]
+"""
+
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from advect1d.advect_imf import advect, fetch_solarwind
+
+if __name__ == '__main__':
+
+    limiter = sys.argv[1] if len(sys.argv) > 1 else 'Minmod'
+
+    # Linear gap filling so that every run sees identical input
+    sw_data = fetch_solarwind(datetime(2017, 9, 6, 20), datetime(2017, 9, 7, 5),
+                              source='DSCOVR', noise=False)
+
+    ref, t0 = advect(sw_data, output_x=203872, ncells=4000, limiter=limiter)
+    ref_time = np.array(ref['time'])
+
+    runs = [('explicit', 0.5), ('explicit', 0.9), ('ssprk2', 0.9), ('ssprk3', 0.9)]
+
+    print('{:>9} {:>5} {:>6} {:>7} {:>7} {:>7} {:>7} {:>7}'.format(
+        'scheme', 'nuMax', 'ncells', 'steps', 'time', 'ux', 'bz', 'n'))
+    for ncells in [300, 600, 1000]:
+        for scheme, nuMax in runs:
+            tstart = time.time()
+            outdata, t0 = advect(sw_data, output_x=203872, ncells=ncells, nuMax=nuMax,
+                                 limiter=limiter, scheme=scheme)
+            elapsed = time.time()-tstart
+
+            out_time = np.array(outdata['time'])
+            errors = [np.mean(np.abs(np.array(outdata[var], dtype=float) -
+                                     np.interp(out_time, ref_time,
+                                               np.array(ref[var], dtype=float))))
+                      for var in ['ux', 'bz', 'n']]
+
+            print('{:>9} {:>5} {:>6} {:>7} {:>7.1f} {:>7.3f} {:>7.3f} {:>7.3f}'.format(
+                scheme, nuMax, ncells, len(out_time), elapsed, *errors))
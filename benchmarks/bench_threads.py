@@ -0,0 +1,54 @@
+"""
+Compare stepping the passively advected variables serially and across a
+thread pool, for a range of grid sizes.
+
+Usage: python benchmarks/bench_threads.py [nthreads]
+"""
+
+import sys
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from advect1d.advect1d import step, step_burgers
+
+passive_vars = ['uy', 'uz', 'bx', 'by', 'bz', 'n', 'T']
+
+
+def make_state(ncells):
+    x = np.linspace(0, 1.6e6, ncells)
+    state = {var: 1+np.sin(x/1e5+i) for i, var in enumerate(passive_vars)}
+    state['ux'] = -400-100*(x > 8e5)
+    return state, x[1]-x[0]
+
+
+def step_serial(state, dx, dt):
+    u = state['ux']
+    for var in passive_vars:
+        step(state[var], u, dx, dt, 'Minmod')
+    step_burgers(u, dx, dt, 'Minmod')
+
+
+def step_threaded(state, dx, dt, executor):
+    u = state['ux']
+    list(executor.map(lambda var: step(state[var], u, dx, dt, 'Minmod'),
+                      passive_vars))
+    step_burgers(u, dx, dt, 'Minmod')
+
+
+if __name__ == '__main__':
+
+    nthreads = int(sys.argv[1]) if len(sys.argv) > 1 else len(passive_vars)
+
+    with ThreadPoolExecutor(nthreads) as executor:
+        print('{:>10} {:>12} {:>12} {:>8}'.format('ncells', 'serial (ms)', 'threads (ms)', 'speedup'))
+        for ncells in [1000, 10000, 100000, 1000000]:
+            state, dx = make_state(ncells)
+            dt = 0.5*dx/500
+            number = max(1, 200000//ncells)
+            serial = timeit.timeit(lambda: step_serial(state, dx, dt), number=number)/number
+            threaded = timeit.timeit(lambda: step_threaded(state, dx, dt, executor),
+                                     number=number)/number
+            print('{:>10} {:>12.3f} {:>12.3f} {:>8.2f}'.format(
+                ncells, serial*1e3, threaded*1e3, serial/threaded))
@@ -12,3 +12,169 @@ def test_omni2swmf():
     from advect1d.omni2swmf import omni2swmf
 
     omni2swmf(datetime(2010,1,1), datetime(2010,1,1,1), 'omni2swmf_test.dat')
+
+def test_semilagrangian_shock_speed():
+    import numpy as np
+    from advect1d.advect1d import departure_points, step_semilagrangian, step_semilagrangian_burgers
+
+    x=np.arange(400.)
+
+    # Shock moves at the mean of the upstream and downstream velocities,
+    # whatever the Courant number
+    for courant in [0.5,2,8]:
+        u=np.where(x>300,-2.,-1.)
+        n=np.where(x>300,2.,1.)
+        dt=courant/2
+        for i in range(int(100/dt)):
+            departure,U=departure_points(x,u,dt)
+            step_semilagrangian(n,x,departure)
+            step_semilagrangian_burgers(u,x,U)
+        assert abs(x[np.argmax(u<-1.5)]-150)<=1
+        assert n[2:-2].max()<2+1e-9
+
+def test_ssprk_advection():
+    import numpy as np
+    from advect1d.advect1d import step_ssprk
+
+    x=np.arange(200.)
+    n0=np.exp(-((x-100)/10)**2)
+
+    # Profile is carried at the flow speed in either direction without
+    # creating new extrema
+    for speed in [1.,-1.]:
+        for order in [2,3]:
+            n=n0.copy()
+            a=np.full(len(x),speed)
+            for i in range(40):
+                step_ssprk(n,a,1.,0.5,'Harmonic',order)
+            assert np.abs(n-np.interp(x-speed*20,x,n0)).max()<0.05
+            assert n.max()<=n0.max() and n.min()>=0
+
+def test_skip_quiet_cells():
+    import numpy as np
+    from advect1d.advect1d import step, active_ranges, grow_ranges
+
+    x=np.arange(300.)
+    a=np.where(x<100,-2.,-1.)
+    n=np.where((x>150)&(x<160),2.,1.)
+
+    # Stepping only the active ranges gives exactly the same result as
+    # stepping every cell
+    full=n.copy()
+    quiet=n.copy()
+    ranges=active_ranges([quiet,a])
+    for i in range(50):
+        step(full,a,1.,0.25,'Minmod')
+        for start,stop in ranges:
+            step(quiet[start-2:stop+2],a[start-2:stop+2],1.,0.25,'Minmod')
+        ranges=grow_ranges(ranges,len(x))
+        assert np.array_equal(full,quiet)
+    assert sum(stop-start for start,stop in ranges)<len(x)-4
+
+def test_limiter_option():
+    import pytest
+    from advect1d.advect_imf import make_parser, iterate
+
+    args=make_parser().parse_args(['--scheme','ssprk3','--limiter','Harmonic'])
+    assert (args.scheme,args.limiter)==('ssprk3','Harmonic')
+    assert make_parser().parse_args([]).limiter=='Minmod'
+
+    # Superbee is only TVD with the explicit scheme
+    for scheme in ['ssprk2','ssprk3']:
+        with pytest.raises(ValueError):
+            iterate({},0.,{},{},limiter='Superbee',scheme=scheme)
+
+def synthetic_data(n=120):
+    # Minute data with a shock halfway through, from a spacecraft moving in x
+    import numpy as np
+    from datetime import datetime,timedelta
+    t=np.array([datetime(2017,9,6)+timedelta(seconds=60*i) for i in range(n)])
+    s=np.arange(n)*60.
+    shock=s>n*30
+    return {'ux':(t,-400-150*shock+10*np.sin(s/900)),'uy':(t,5*np.sin(s/500)),
+            'uz':(t,3*np.cos(s/700)),'bx':(t,2+np.sin(s/300)),'by':(t,-3+np.cos(s/100)),
+            'bz':(t,np.where(shock,-10.,2.)),'n':(t,5+3*shock),'T':(t,1e5+0*s),
+            'x':(t,1.5e6+2e4*np.sin(s/2000)),'y':(t,2e5+0*s),'z':(t,1e4+0*s)}
+
+def test_trim_domain():
+    import numpy as np
+    from advect1d.advect_imf import advect
+
+    # The spacecraft moves, so the trimmed region changes every step
+    sw_data=synthetic_data()
+    full,t0=advect(sw_data,ncells=300)
+    trimmed,t0_trimmed=advect(sw_data,ncells=300,trim=True)
+    assert t0==t0_trimmed
+    for var,values in full.items():
+        assert np.array_equal(trimmed[var],values)
+
+def test_threads():
+    import numpy as np
+    from advect1d.advect_imf import advect
+
+    # Stepping the passive variables concurrently gives the serial result
+    sw_data=synthetic_data()
+    serial,t0=advect(sw_data,ncells=300)
+    threaded,t0_threaded=advect(sw_data,ncells=300,threads=4)
+    assert t0==t0_threaded
+    for var,values in serial.items():
+        assert np.array_equal(threaded[var],values)
+def test_nonuniform_grid():
+    import numpy as np
+    from advect1d.advect1d import step, step_burgers, step_ssprk, refine_grid
+
+    # An array of equal cell sizes gives the same result as a scalar cell size
+    x=np.arange(200.)
+    u0=np.where((x>80)&(x<120),-2.,-1.)+0.1*np.sin(x/7)
+    n0=np.where(x>100,2.,1.)+0.1*np.cos(x/5)
+    for dtype in [np.float64,np.float32]:
+        dx=np.full(len(x),3.,dtype=dtype)
+        for limiter in ['Minmod','Harmonic','Superbee']:
+            n_scalar,n_array=n0.astype(dtype),n0.astype(dtype)
+            u_scalar,u_array=u0.astype(dtype),u0.astype(dtype)
+            for i in range(20):
+                step(n_scalar,u_scalar,3.,0.5,limiter)
+                step(n_array,u_array,dx,0.5,limiter)
+                step_burgers(u_scalar,3.,0.5,limiter)
+                step_burgers(u_array,dx,0.5,limiter)
+            assert np.array_equal(n_scalar,n_array)
+            assert np.array_equal(u_scalar,u_array)
+        n_scalar,n_array=n0.astype(dtype),n0.astype(dtype)
+        step_ssprk(n_scalar,u0.astype(dtype),3.,0.5,'Minmod')
+        step_ssprk(n_array,u0.astype(dtype),dx,0.5,'Minmod')
+        assert np.array_equal(n_scalar,n_array)
+
+    # Refined grids keep their end points and stay in order
+    x=np.linspace(2e5,1.6e6,300)
+    u=np.where(x>9e5,-550.,-400.)
+    for alpha in [1,5,20,100]:
+        x_new=refine_grid(x,[u,np.sin(x/1e5)],alpha)
+        assert x_new[0]==x[0] and x_new[-1]==x[-1]
+        assert np.all(np.diff(x_new)>0)
+        # Cells are concentrated at the shock
+        assert np.diff(x_new)[np.searchsorted(x_new,9e5)-1]<np.diff(x).mean()
+
+def test_single_precision():
+    import numpy as np
+    from advect1d.advect_imf import advect, initialize, iterate
+
+    sw_data=synthetic_data()
+
+    # The state stays in single precision as it is stepped, and the grid
+    # in double precision
+    state,outdata,t0,l1data=initialize(sw_data,ncells=300,dtype=np.float32)
+    t=0
+    for i in range(20):
+        t+=iterate(state,t,outdata,l1data)
+    for var,values in state.items():
+        assert values.dtype==(np.float64 if var=='x' else np.float32)
+
+    # Differences from double precision are a few parts in 1e4 of each
+    # variable's peak magnitude
+    single,t0_single=advect(sw_data,ncells=300,dtype=np.float32)
+    double,t0_double=advect(sw_data,ncells=300)
+    assert t0_single==t0_double
+    for var,values in double.items():
+        if var=='time': continue
+        assert np.allclose(single[var],np.interp(single['time'],double['time'],values),
+                           rtol=0,atol=3e-4*np.abs(values).max())
@@ -0,0 +1,18 @@
+from advect1d.ballistic import not_overtaken, arrival_times
+import numpy as np
+
+def test_not_overtaken():
+    arrival=np.array([10.,20.,15.,30.,40.,35.])
+    assert list(not_overtaken(arrival))==[True,False,True,True,False,True]
+
+def test_arrival_times():
+    t=np.arange(0.,600.,60.)
+    ux=np.where(t<300,-400.,-800.)
+    l1data={'ux':(t,ux),'x':(t,np.full(t.shape,1.6e5)),'n':(t,np.arange(len(t)))}
+
+    t_arrival,n=arrival_times(l1data,'n',0)
+
+    # Slow wind observed shortly before the fast wind is overtaken
+    assert np.all(np.diff(t_arrival)>0)
+    assert list(n)==[0,1,5,6,7,8,9]
+    assert np.isclose(t_arrival[0],400)
@@ -34,3 +34,46 @@ def test_cache_decorator():
         shutil.move(os.path.join('cache', cachename), '.')
         cached_function()
         mockfunc.assert_not_called()
+
+@cache_result(ttl=3600)
+def expiring_function():
+    mockfunc()
+    return None
+
+def test_cache_ttl():
+
+    cache_path=os.path.join('cache',get_cache_filename(expiring_function,(),{}))
+
+    try:
+        os.remove(cache_path)
+    except FileNotFoundError:
+        pass
+
+    with patch('cache_decorator_test.mockfunc', create=True) as mockfunc:
+        expiring_function()
+        assert mockfunc.call_count==1
+        expiring_function()
+        assert mockfunc.call_count==1
+
+        # Make the cache file older than the TTL
+        old=os.path.getmtime(cache_path)-7200
+        os.utime(cache_path,(old,old))
+
+        expiring_function()
+        assert mockfunc.call_count==2
+
+@cache_result()
+def keyword_function(noise=False,seed=None):
+    return noise,seed
+
+def test_cache_keyword_arguments(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    # Each keyword value is keyed together with its name
+    assert get_cache_filename(keyword_function,(),{'seed':1})!= \
+        get_cache_filename(keyword_function,(),{'noise':True})
+    assert get_cache_filename(keyword_function,(),{'noise':True,'seed':1})== \
+        get_cache_filename(keyword_function,(),{'seed':1,'noise':True})
+
+    assert keyword_function(noise=True)==(True,None)
+    assert keyword_function(seed=1)==(False,1)
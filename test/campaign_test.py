@@ -0,0 +1,56 @@
+from advect1d import campaign
+from datetime import datetime
+from unittest.mock import patch
+import json
+import os
+import threading
+import time
+
+def test_iter_prefetched():
+
+    jobs=list(range(6))
+    fetched=[]
+
+    def fetch(job):
+        fetched.append(job)
+        if job==3:
+            raise ValueError('no data')
+        return job*10
+
+    results=[]
+    for job,data,error,elapsed in campaign.iter_prefetched(jobs,fetch,depth=1):
+        # Give the producer time to run ahead, and check it stays bounded
+        time.sleep(0.02)
+        assert len(fetched)<=job+3
+        results.append((job,data,error is not None))
+
+    assert results==[(0,0,False),(1,10,False),(2,20,False),(3,None,True),(4,40,False),(5,50,False)]
+
+def test_run_pipeline(tmp_path):
+
+    jobs=[{'name':'job{}'.format(i),'start_time':datetime(2017,9,6+i),'end_time':datetime(2017,9,6+i,6),
+           'source':'DSCOVR','output_x':203872} for i in range(3)]
+
+    threads={}
+
+    def fetch_window(starttime,endtime,**kwargs):
+        threads.setdefault('fetch',set()).add(threading.current_thread())
+        return {'start':starttime},None
+
+    def advect_and_write(sw_data,t0,**kwargs):
+        threads.setdefault('advect',set()).add(threading.current_thread())
+        if sw_data['start']==datetime(2017,9,7):
+            raise RuntimeError('unstable')
+
+    with patch('advect1d.campaign.fetch_window',side_effect=fetch_window), \
+         patch('advect1d.campaign.advect_and_write',side_effect=advect_and_write):
+        records=campaign.run_pipeline(jobs,output_dir=str(tmp_path))
+
+    # Fetching happens in a background thread
+    assert threads['fetch'].isdisjoint(threads['advect'])
+
+    assert [record['name'] for record in records]==['job0','job1','job2']
+    assert [record['status'] for record in records]==['ok','failed','ok']
+
+    with open(os.path.join(str(tmp_path),'manifest.json')) as fh:
+        assert json.load(fh)['nfailed']==1
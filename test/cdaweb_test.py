@@ -0,0 +1,110 @@
+from advect1d import cdaweb
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import os
+import time
+import numpy as np
+import spacepy.datamodel as dm
+
+inventory=[{'Id':'OMNI_HRO_1MIN',
+            'TimeInterval':[{'Start':'2017-01-01T00:00:00.000Z','End':'2017-03-01T00:00:00.000Z'},
+                            {'Start':'2017-06-01T00:00:00.000Z','End':'2018-01-01T00:00:00.000Z'}]}]
+
+def fake_cdf(dataview,dataset,start,end,variables,proxy=None):
+    # One record per hour, including both ends of the interval
+    times=np.arange(np.datetime64(start,'h'),np.datetime64(end,'h')+1)
+    data=dm.SpaceData()
+    data['Epoch']=dm.dmarray(times.astype('datetime64[us]').astype(datetime))
+    for var in variables:
+        data[var]=dm.dmarray(np.ones(len(times)),attrs={'DEPEND_0':'Epoch','FILLVAL':-1e31})
+    return data
+
+def test_get_cdf_split():
+
+    with patch('advect1d.cdaweb.get_dataset_inventory',return_value=inventory), \
+         patch('advect1d.cdaweb.get_cdf',side_effect=fake_cdf) as get_cdf:
+        data=cdaweb.get_cdf_split('sp_phys','OMNI_HRO_1MIN',datetime(2017,2,1),datetime(2017,7,1),
+                                  ['BZ_GSE'],max_duration=timedelta(days=10))
+
+    # Only the intervals in the inventory are requested, in pieces of at most 10 days
+    requested=[call.args[2:4] for call in get_cdf.call_args_list]
+    assert all(end-start<=timedelta(days=10) for start,end in requested)
+    assert requested[0]==(datetime(2017,2,1),datetime(2017,2,11))
+    assert requested[-1][1]==datetime(2017,7,1)
+    assert not any(datetime(2017,3,1)<start<datetime(2017,6,1) for start,end in requested)
+
+    # Records on the boundaries between pieces are only kept once
+    times=np.asarray(data['Epoch'],dtype='datetime64[us]')
+    assert np.all(np.diff(times)>np.timedelta64(0))
+    assert len(times)==(28+30)*24+2
+    assert len(data['BZ_GSE'])==len(times)
+    assert data['BZ_GSE'].attrs['FILLVAL']==-1e31
+
+def test_get_cdf_day_cache(tmp_path,monkeypatch):
+
+    monkeypatch.chdir(tmp_path)
+
+    def no_data(*args,**kwargs):
+        raise ValueError('No data')
+
+    # Days with no data are not cached
+    with patch('advect1d.cdaweb.get_cdf',side_effect=no_data) as get_cdf:
+        assert cdaweb.get_cdf_day('sp_phys','TEST',datetime(2017,9,6),('BZ',)) is None
+        assert cdaweb.get_cdf_day('sp_phys','TEST',datetime(2017,9,6),('BZ',)) is None
+    assert get_cdf.call_count==2
+
+    recent=datetime(*time.gmtime()[:3])
+    with patch('advect1d.cdaweb.get_cdf',side_effect=fake_cdf) as get_cdf:
+        for day in [datetime(2017,9,6),recent]:
+            cdaweb.get_cdf_day('sp_phys','TEST',day,('BZ',))
+            cdaweb.get_cdf_day('sp_phys','TEST',day,('BZ',))
+    assert get_cdf.call_count==2
+
+    # Make the cache files older than recent_day_ttl. Only the day that was
+    # fetched before it could have been complete is fetched again.
+    for name in (tmp_path/'cache').iterdir():
+        old=name.stat().st_mtime-2*cdaweb.recent_day_ttl
+        os.utime(str(name),(old,old))
+
+    with patch('advect1d.cdaweb.get_cdf',side_effect=fake_cdf) as get_cdf:
+        cdaweb.get_cdf_day('sp_phys','TEST',datetime(2017,9,6),('BZ',))
+        cdaweb.get_cdf_day('sp_phys','TEST',recent,('BZ',))
+    assert [call.args[2] for call in get_cdf.call_args_list]==[recent]
+
+def test_days_in():
+
+    assert cdaweb.days_in(datetime(2017,9,6,20),datetime(2017,9,8))==[datetime(2017,9,6),datetime(2017,9,7)]
+    assert cdaweb.days_in(datetime(2017,9,6,20),datetime(2017,9,8,1))==[datetime(2017,9,6),datetime(2017,9,7),
+                                                                       datetime(2017,9,8)]
+
+def test_offline_with_expired_cache(tmp_path,monkeypatch):
+
+    from urllib.error import URLError
+
+    monkeypatch.chdir(tmp_path)
+
+    with patch('advect1d.cdaweb.fetch_xml'), \
+         patch('advect1d.cdaweb.xml_to_dict',return_value=inventory), \
+         patch('advect1d.cdaweb.get_cdf',side_effect=fake_cdf):
+        expected=cdaweb.get_cdf_chunked('sp_phys','OMNI_HRO_1MIN',datetime(2017,2,1),datetime(2017,2,3),['BZ_GSE'])
+
+    # Expire the inventory and make the days look due for a refresh
+    for name in (tmp_path/'cache').iterdir():
+        old=name.stat().st_mtime-2*cdaweb.inventory_ttl
+        os.utime(str(name),(old,old))
+
+    with patch('advect1d.cdaweb.fetch_xml',side_effect=URLError('offline')), \
+         patch('advect1d.cdaweb.get_cdf',side_effect=URLError('offline')), \
+         patch('advect1d.cdaweb.publication_latency_days',10**6):
+        data=cdaweb.get_cdf_chunked('sp_phys','OMNI_HRO_1MIN',datetime(2017,2,1),datetime(2017,2,3),['BZ_GSE'])
+
+    assert np.array_equal(data['BZ_GSE'],expected['BZ_GSE'])
+
+    # Errors are still raised when nothing is cached
+    with patch('advect1d.cdaweb.fetch_xml',side_effect=URLError('offline')):
+        try:
+            cdaweb.get_dataset_inventory('sp_phys','OTHER')
+        except URLError:
+            pass
+        else:
+            assert False
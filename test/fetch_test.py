@@ -0,0 +1,63 @@
+import numpy as np
+from datetime import datetime,timedelta
+from unittest.mock import patch
+from spacepy import datamodel as dm
+
+from advect1d import advect_imf
+
+def fake_dataset(source,name,tstart,tend,proxy=None):
+    # One day of minute data with gaps, in the layout returned by CDAWeb
+    n=1440
+    rng=np.random.default_rng(len(name))
+    epoch=np.array([tstart+timedelta(minutes=i) for i in range(n)])
+    gaps=np.zeros(n,dtype=bool)
+    gaps[100:160]=True
+    gaps[rng.random(n)<0.1]=True
+    def variable(values,validmin,validmax):
+        values=np.where(gaps[:,None] if values.ndim==2 else gaps,-1e31,values)
+        return dm.dmarray(values,attrs={'FILLVAL':-1e31,'VALIDMIN':validmin,'VALIDMAX':validmax})
+    vector=np.cumsum(rng.normal(size=(n,3)),axis=0)
+    scalar=5+np.abs(np.cumsum(rng.normal(size=n)))
+    data={'Epoch':epoch,'Epoch1':epoch}
+    data.update({'Np':variable(scalar,[0.],[1e3]),'THERMAL_TEMP':variable(1e5*scalar,[0.],[1e8]),
+                 'V_GSE':variable(vector-400,[-2e3]*3,[2e3]*3),'B1GSE':variable(vector,[-1e3]*3,[1e3]*3),
+                 'GSE_POS':variable(vector+1.5e6,[-1e8]*3,[1e8]*3)})
+    return data
+
+def test_seeded_noise(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    start,end=datetime(2017,9,6),datetime(2017,9,7)
+
+    with patch('advect1d.advect_imf.fetch_dataset',side_effect=fake_dataset):
+        # Cached results for different seeds are kept apart
+        unseeded=advect_imf.fetch_solarwind(start,end)
+        first=advect_imf.fetch_solarwind(start,end,seed=1)
+        other=advect_imf.fetch_solarwind(start,end,seed=2)
+        # The same seed gives the same noise without the cache
+        again=advect_imf.load_dscovr.__wrapped__(start,end,True,None,1)
+
+    for var in ['bx','uy','z']:
+        assert np.array_equal(first[var][1],again[var][1])
+        assert not np.array_equal(first[var][1],other[var][1])
+        assert not np.array_equal(first[var][1],unseeded[var][1])
+
+def test_ensemble_draws(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    start,end=datetime(2017,9,6),datetime(2017,9,7)
+
+    with patch('advect1d.advect_imf.fetch_dataset',side_effect=fake_dataset):
+        draws=advect_imf.fetch_solarwind(start,end,seed=3,ndraws=4)
+        again=advect_imf.load_dscovr.__wrapped__(start,end,True,None,3,4)
+        single=advect_imf.fetch_solarwind(start,end,seed=3)
+
+    assert len(draws)==4
+    gaps=fake_dataset('DSCOVR','mag',start,end)['B1GSE'][:,0]==-1e31
+    for var in ['bx','uz']:
+        for draw,draw_again in zip(draws,again):
+            assert np.array_equal(draw[var][1],draw_again[var][1])
+            # Only the gaps differ between members
+            assert np.array_equal(draw[var][0],single[var][0])
+        assert not np.array_equal(draws[0][var][1],draws[1][var][1])
+    bx=np.array([draw['bx'][1] for draw in draws])
+    assert np.all(bx[:,~gaps]==bx[0,~gaps])
+    assert np.all(np.std(bx[:,100:160],axis=0)>0)
@@ -0,0 +1,40 @@
+from advect1d import imf_io
+from datetime import datetime
+import numpy as np
+
+def test_write_imf(tmp_path):
+
+    from spacepy import pybats
+    from spacepy import datamodel as dm
+
+    rng=np.random.default_rng(2)
+    times=np.datetime64('2017-09-06T20:00','us')+np.arange(50)*np.timedelta64(61501400,'us')
+
+    imf=pybats.ImfInput(load=False)
+    for var in imf.attrs['var']:
+        imf[var]=dm.dmarray(rng.normal(size=len(times))*10.**rng.integers(-3,8,len(times)))
+    # Values that round to a tie, negative zero, and not a number
+    imf['bx'][:5]=[0.125,-0.001,2.675,-0.0,np.nan]
+    imf['time']=dm.dmarray(times.astype(datetime))
+    imf.attrs['coor']='GSE'
+    imf.attrs['header']='\nTest header\n\n'
+    imf.write(str(tmp_path/'pybats.dat'))
+
+    data={var:np.asarray(imf[var]) for var in imf.attrs['var']}
+    data['time']=times
+    imf_io.write_imf(tmp_path/'imf_io.dat',data,header='\nTest header\n\n',coor='GSE',chunksize=16)
+    imf_io.write_imf(tmp_path/'imf_io.dat.gz',data,header='\nTest header\n\n',coor='GSE')
+
+    # Identical apart from the creation time on the first line
+    with open(tmp_path/'pybats.dat') as fh:
+        expected=fh.readlines()[1:]
+    with open(tmp_path/'imf_io.dat') as fh:
+        assert fh.readlines()[1:]==expected
+
+    for filename in 'imf_io.dat','imf_io.dat.gz':
+        read,attrs=imf_io.read_imf(tmp_path/filename)
+        assert attrs=={'header':'\nTest header\n\n','coor':'GSE','var':imf_io.std_vars}
+        rounded=(times.astype(np.int64)+500)//1000*1000
+        assert np.array_equal(read['time'],rounded.astype('datetime64[us]'))
+        for var in imf_io.std_vars:
+            assert np.allclose(read[var],data[var],rtol=0,atol=0.0051,equal_nan=True)
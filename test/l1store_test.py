@@ -0,0 +1,90 @@
+from advect1d import l1store
+from advect1d.advect_imf import advect, to_seconds
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+
+def synthetic_data(start,hours):
+    n=int(hours*60)
+    t=np.array([start+timedelta(seconds=60*i+7) for i in range(n)])
+    s=np.arange(n)*60.
+    data={'ux':-400-150*(s>hours*1800)+10*np.sin(s/900),'uy':5*np.sin(s/500),'uz':3*np.cos(s/700),
+          'bx':2+np.sin(s/300),'by':-3+np.cos(s/100),'bz':np.where(s>hours*1800,-10.,2.),
+          'n':5+3*(s>hours*1800),'T':1e5+2e4*np.sin(s/1000),
+          'x':1.5e6+1e3*np.sin(s/5000),'y':2e5+0*s,'z':1e4+0*s}
+    # Variables start at different times, as they do in real data
+    return {var:(t[i%3:],values[i%3:]) for i,(var,values) in enumerate(data.items())}
+
+def test_build_store(tmp_path):
+
+    start=datetime(2017,9,6)
+    sw_data=synthetic_data(start,hours=4)
+
+    def fetch_solarwind(starttime,endtime,**kwargs):
+        return {var:(t[(t>=starttime)&(t<=endtime)],values[(t>=starttime)&(t<=endtime)])
+                for var,(t,values) in sw_data.items()}
+
+    with patch('advect1d.advect_imf.fetch_solarwind',side_effect=fetch_solarwind) as fetch:
+        store=l1store.build_store(str(tmp_path),start,start+timedelta(hours=4),
+                                  chunk=timedelta(minutes=50))
+        assert fetch.call_count==5
+
+        # A finished store of the same data is reused
+        l1store.build_store(str(tmp_path),start,start+timedelta(hours=4),chunk=timedelta(minutes=50))
+        assert fetch.call_count==5
+
+    expected,t0=to_seconds(sw_data)
+    assert store.t0==t0
+    for var,(t,values) in expected.items():
+        assert np.array_equal(store[var][0],t)
+        assert np.array_equal(store[var][1],values)
+
+    # Advecting from the store gives the same result as advecting from memory
+    outdata,t0_store=advect(store,ncells=200)
+    expected_outdata,t0_memory=advect(sw_data,ncells=200)
+    assert t0_store==t0_memory
+    for var,values in expected_outdata.items():
+        assert np.array_equal(outdata[var],values)
+
+def test_rebuild_store(tmp_path):
+
+    start=datetime(2017,9,6)
+    sw_data=synthetic_data(start,hours=2)
+
+    def fetch_solarwind(starttime,endtime,**kwargs):
+        return {var:(t[(t>=starttime)&(t<=endtime)],values[(t>=starttime)&(t<=endtime)])
+                for var,(t,values) in sw_data.items()}
+
+    with patch('advect1d.advect_imf.fetch_solarwind',side_effect=fetch_solarwind):
+        l1store.build_store(str(tmp_path),start,start+timedelta(hours=1))
+
+        # An interrupted build leaves unfinished data behind
+        l1store.create_store(str(tmp_path),start,source='DSCOVR')
+        l1store.append_store(str(tmp_path),fetch_solarwind(start,start+timedelta(minutes=30)))
+
+        # Rebuilding in place, for a different interval, keeps none of the old data
+        sw_data={var:(t+timedelta(days=1),values*0+123) for var,(t,values) in sw_data.items()}
+        store=l1store.build_store(str(tmp_path),start+timedelta(days=1),start+timedelta(days=1,hours=1))
+
+    expected,t0=to_seconds(fetch_solarwind(start+timedelta(days=1),start+timedelta(days=1,hours=1)))
+    assert store.t0==t0
+    for var,(t,values) in expected.items():
+        assert np.array_equal(store[var][0],t)
+        assert np.all(store[var][1]==123)
+
+def test_store_arrays_opened_once(tmp_path):
+    import pickle
+
+    start=datetime(2017,9,6)
+    sw_data=synthetic_data(start,hours=2)
+    with patch('advect1d.advect_imf.fetch_solarwind',
+               side_effect=lambda starttime,endtime,**kwargs:sw_data):
+        store=l1store.build_store(str(tmp_path),start,start+timedelta(hours=2))
+
+    times,values=store['bx']
+    assert store['bx'][0] is times and store['bx'][1] is values
+
+    # Pickled stores reopen their files rather than carrying the data
+    copy=pickle.loads(pickle.dumps(store))
+    assert copy._arrays=={}
+    assert np.array_equal(copy['bx'][1],values)
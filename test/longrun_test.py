@@ -0,0 +1,69 @@
+import numpy as np
+from datetime import datetime,timedelta
+from unittest.mock import patch
+
+from advect1d import longrun
+from advect1d.advect_imf import advect
+
+def synthetic_data(start,hours):
+    # A shock halfway through the interval, on top of smooth variations
+    n=int(hours*60)
+    t=np.array([start+timedelta(seconds=60*i+7) for i in range(n)])
+    s=np.arange(n)*60.
+    shock=s>hours*1800
+    data={'ux':-400-150*shock+10*np.sin(s/900),'uy':5*np.sin(s/500),'uz':3*np.cos(s/700),
+          'bx':2+np.sin(s/300),'by':-3+np.cos(s/100),'bz':np.where(shock,-10.,2.),
+          'n':5+3*shock,'T':1e5+2e4*np.sin(s/1000),
+          'x':1.5e6+1e3*np.sin(s/5000),'y':2e5+0*s,'z':1e4+0*s}
+    return {var:(t,values) for var,values in data.items()}
+
+def test_split_interval():
+    start=datetime(2017,9,6)
+    windows=longrun.split_interval(start,start+timedelta(hours=5),timedelta(hours=2))
+    assert windows==[(start,start+timedelta(hours=2)),
+                     (start+timedelta(hours=2),start+timedelta(hours=4)),
+                     (start+timedelta(hours=4),start+timedelta(hours=5))]
+
+def test_stitch_matches_serial_run():
+
+    start=datetime(2017,9,6)
+    sw_data=synthetic_data(start,hours=7)
+    spinup=timedelta(hours=2)
+
+    def fetch_with_spinup(starttime,endtime,**kwargs):
+        keep=lambda t:(t>=starttime-spinup)&(t<=endtime)
+        return {var:(t[keep(t)],values[keep(t)]) for var,(t,values) in sw_data.items()}
+
+    starttime,endtime=start+spinup,start+timedelta(hours=7)
+    windows=longrun.split_interval(starttime,endtime,timedelta(hours=2.5))
+    with patch('advect1d.longrun.fetch_with_spinup',side_effect=fetch_with_spinup):
+        results=[longrun.advect_window(start,end,ncells=200,last=(i==len(windows)-1))
+                 for i,(start,end) in enumerate(windows)]
+    outdata=longrun.stitch(windows,results)
+
+    # One run over the whole interval, with the same spin-up
+    serial,t0=advect(fetch_with_spinup(starttime,endtime),ncells=200)
+    serial['time']+=(t0-starttime).total_seconds()
+
+    # Spin-up is discarded and the windows join without gaps or overlaps
+    assert 0<=outdata['time'][0]<60
+    assert np.all(np.diff(outdata['time'])>0)
+    assert np.diff(outdata['time']).max()<60
+    assert outdata['time'][-1]>serial['time'][-1]-60
+
+    # The first window is the start of the serial run
+    first=outdata['time']<(windows[0][1]-starttime).total_seconds()
+    for var,values in outdata.items():
+        assert np.array_equal(values[first],serial[var][serial['time']>=0][:np.sum(first)])
+
+    # Later windows differ from it only because their time steps fall at
+    # different times. The difference is smaller than the discretization
+    # error, measured as the change in the serial run when the grid is refined.
+    fine,t0_fine=advect(fetch_with_spinup(starttime,endtime),ncells=400)
+    fine['time']+=(t0_fine-starttime).total_seconds()
+    later=outdata['time'][~first]
+    for var,values in outdata.items():
+        if var=='time': continue
+        expected=np.interp(later,serial['time'],serial[var])
+        discretization=np.abs(np.interp(later,fine['time'],fine[var])-expected).max()
+        assert np.abs(values[~first]-expected).max()<discretization
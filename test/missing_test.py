@@ -0,0 +1,53 @@
+from advect1d.missing import fill_gaps, fill_gaps_draws, fluctuation_cdf
+import numpy as np
+
+def make_series(n=5000,seed=4):
+    rng=np.random.default_rng(seed)
+    data=np.cumsum(rng.normal(size=n))
+    gaps=rng.random(n)<0.2
+    gaps[1000:1300]=True
+    gaps[:3]=True
+    data[gaps]=-1e31
+    return data,gaps
+
+def test_fill_gaps_linear():
+
+    data,gaps=make_series()
+    filled=fill_gaps(data.copy(),fillval=-1e31)
+
+    valid=np.flatnonzero(~gaps)
+    expected=np.interp(np.arange(len(data)),valid,data[valid])
+    assert np.allclose(filled,expected,rtol=0,atol=1e-9)
+
+def test_fill_gaps_noise_seeded():
+
+    data,gaps=make_series()
+
+    first=fill_gaps(data.copy(),fillval=-1e31,noise=True,rng=7)
+    second=fill_gaps(data.copy(),fillval=-1e31,noise=True,rng=np.random.default_rng(7))
+    other=fill_gaps(data.copy(),fillval=-1e31,noise=True,rng=8)
+
+    # Reproducible by seed, and only the gaps are changed
+    assert np.array_equal(first,second)
+    assert not np.array_equal(first,other)
+    assert np.array_equal(first[~gaps],data[~gaps])
+
+    # Noise is drawn from the winsorized fluctuations of the series
+    linear=fill_gaps(data.copy(),fillval=-1e31)
+    cdf=fluctuation_cdf(linear.copy())
+    noise=first-linear
+    assert np.all((noise>=cdf[0]-1e-9)&(noise<=cdf[-1]+1e-9))
+
+def test_fill_gaps_draws():
+
+    data,gaps=make_series()
+
+    draws=fill_gaps_draws(data.copy(),50,fillval=-1e31,rng=3)
+    assert draws.shape==(50,len(data))
+    assert np.array_equal(draws,fill_gaps_draws(data.copy(),50,fillval=-1e31,rng=3))
+    assert np.all(draws[:,~gaps]==data[~gaps])
+
+    # Draws are independent, and each is distributed like a single fill
+    assert not np.array_equal(draws[0],draws[1])
+    single=fill_gaps_draws(data.copy(),1,fillval=-1e31,rng=3)
+    assert np.array_equal(single[0],fill_gaps(data.copy(),fillval=-1e31,noise=True,rng=3))
@@ -0,0 +1,33 @@
+from advect1d.omni2swmf import fill_chunks, omni_vars
+from advect1d.missing import fill_gaps
+import numpy as np
+
+def test_fill_chunks():
+
+    rng=np.random.default_rng(1)
+    n=2000
+    data={'time':np.datetime64('2017-01-01','us')+np.arange(n)*np.timedelta64(60,'s')}
+    fillvals={}
+    for i,var in enumerate(omni_vars):
+        fillvals[var]=[-1e31,99999.9][i%2]
+        values=rng.normal(size=n)
+        gaps=rng.random(n)<0.2
+        gaps[500:900]=True
+        gaps[:i]=True
+        gaps[n-i:]=True
+        values[gaps]=fillvals[var]
+        data[var]=values
+
+    expected={var:fill_gaps(data[var].copy(),fillval=fillvals[var]) for var in omni_vars}
+
+    # Chunk boundaries inside gaps, including one that spans a whole chunk
+    cuts=[0,3,450,600,700,1234,1999,n]
+    chunks=[({key:values[a:b] for key,values in data.items()},fillvals)
+            for a,b in zip(cuts[:-1],cuts[1:])]
+
+    rows=list(fill_chunks(chunks))
+    joined={key:np.concatenate([chunk[key] for chunk in rows]) for key in data}
+
+    assert np.array_equal(joined['time'],data['time'])
+    for var in omni_vars:
+        assert np.array_equal(joined[var],expected[var])
@@ -0,0 +1,53 @@
+import numpy as np
+
+from advect1d.parse_acedata import (parse_from_web, parse_from_ruth, iter_from_web,
+                                    to_sw_data)
+
+web_text = """:Data_list: ACE_MAG_Level2_Data
+ year day hr min sec   Bx     By     Bz   fraction_good N_vectors Quality  pos_gse_x pos_gse_y pos_gse_z
+BEGIN DATA
+2017 249 20  0  0.000  1.5   -2.0   3.0   1.0   240  0   1.5e6  2.0e5  1.0e4
+2017 249 20  0 16.000  1.6   -2.1   3.1   1.0   240  0   1.5e6  2.0e5  1.0e4
+2017 249 20  0 32.500  1.7   -2.2   3.2   1.0   240  0   1.5e6  2.0e5  1.0e4
+2017 250  0  0  0.000  1.8   -2.3   3.3   1.0   240  0   1.5e6  2.0e5  1.0e4
+"""
+
+ruth_text = """ACE SWEPAM data
+year doy dayfrac n T speed ux uy uz
+2017 249 0.5 5.0 1.0e5 400.0 -400.0 1.0 2.0
+2017 249 0.75 6.0 1.1e5 410.0 -410.0 1.5 2.5
+"""
+
+
+def test_parse_from_web(tmp_path):
+    filename = tmp_path/'mag.txt'
+    filename.write_text(web_text)
+
+    data = parse_from_web(str(filename))
+    assert data['time'].dtype == np.dtype('datetime64[us]')
+    np.testing.assert_array_equal(data['time'], np.array(
+        ['2017-09-06T20:00:00', '2017-09-06T20:00:16', '2017-09-06T20:00:32.5',
+         '2017-09-07T00:00:00'], dtype='datetime64[us]'))
+    np.testing.assert_array_equal(data['bz'], [3.0, 3.1, 3.2, 3.3])
+
+    # Reading in chunks gives the same result
+    chunks = list(iter_from_web(str(filename), chunksize=3))
+    assert [len(chunk['time']) for chunk in chunks] == [3, 1]
+    np.testing.assert_array_equal(np.concatenate([chunk['bx'] for chunk in chunks]),
+                                  data['bx'])
+
+
+def test_parse_from_ruth(tmp_path):
+    filename = tmp_path/'swepam.txt'
+    filename.write_text(ruth_text)
+
+    data = parse_from_ruth(str(filename), chunksize=1)
+    np.testing.assert_array_equal(data['time'], np.array(
+        ['2017-09-06T12:00', '2017-09-06T18:00'], dtype='datetime64[us]'))
+    np.testing.assert_array_equal(data['ux'], [-400.0, -410.0])
+
+    sw_data = to_sw_data(data)
+    assert sorted(sw_data) == ['T', 'n', 'ux', 'uy', 'uz']
+    t, n = sw_data['n']
+    assert t is data['time']
+    np.testing.assert_array_equal(n, [5.0, 6.0])
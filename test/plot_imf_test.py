@@ -0,0 +1,78 @@
+from advect1d.plot_imf import decimate, plot_imf
+from advect1d.advect_imf import write_output
+from datetime import datetime
+import matplotlib
+import numpy as np
+
+matplotlib.use('Agg')
+
+def test_decimate():
+
+    rng=np.random.default_rng(3)
+    times=np.datetime64('2017-01-01','us')+np.cumsum(rng.integers(1,120,100000)).astype('timedelta64[s]')
+    values=rng.normal(size=len(times))
+    values[5000:5100]=np.nan
+    values[77777]=50
+
+    t,y=decimate(times,values,400)
+
+    assert len(t)<=800
+    assert np.all(np.diff(t)>np.timedelta64(0))
+    assert np.nanmax(y)==50
+    assert np.nanmin(y)==np.nanmin(values)
+
+    # The extremes of every interval are kept
+    edges=np.linspace(times[0].astype(np.int64),times[-1].astype(np.int64),401)
+    interval=np.clip(np.searchsorted(edges,times.astype(np.int64),side='right')-1,0,399)
+    for i in rng.integers(0,400,20):
+        inside=values[interval==i]
+        assert np.nanmax(inside) in y and np.nanmin(inside) in y
+
+def test_plot_imf(tmp_path):
+
+    t0=datetime(2017,1,1)
+    seconds=np.arange(0,60*86400,15.)
+    outdata={var:np.sin(seconds/86400) for var in ['ux','uy','uz','bx','by','bz','n','T']}
+    outdata['time']=seconds
+    filename=str(tmp_path/'advected.h5')
+    write_output(outdata,t0,imf_file=str(tmp_path/'IMF.dat.gz'),hdf_file=filename)
+
+    fig=plot_imf(filename,starttime=datetime(2017,1,10),endtime=datetime(2017,2,10),l1=False,omni=False)
+
+    axes=fig.get_axes()
+    assert len(axes)==8
+    t,y=axes[0].get_lines()[0].get_data()
+    assert len(t)<=2*fig.get_size_inches()[0]*fig.dpi
+    assert np.datetime64(t[0])==np.datetime64('2017-01-10')
+    assert np.datetime64(t[-1])==np.datetime64('2017-02-10')
+
+def fake_omni(dataview,dataset,start,end,variables,proxy=None):
+    import spacepy.datamodel as dm
+    times=np.arange(np.datetime64(start,'m'),np.datetime64(end,'m')+1)
+    data=dm.SpaceData()
+    data['Epoch']=dm.dmarray(times.astype('datetime64[us]').astype(datetime))
+    for var in variables:
+        data[var]=dm.dmarray(np.ones(len(times)),attrs={'DEPEND_0':'Epoch','FILLVAL':99999.9})
+    return data
+
+def test_plot_imf_cached_omni(tmp_path,monkeypatch):
+    from unittest.mock import patch
+
+    monkeypatch.chdir(tmp_path)
+
+    seconds=np.arange(0,6*3600,15.)
+    outdata={var:np.sin(seconds/3600) for var in ['ux','uy','uz','bx','by','bz','n','T']}
+    outdata['time']=seconds
+    write_output(outdata,datetime(2017,9,6,20),imf_file='IMF.dat',hdf_file='advected.h5')
+
+    inventory=[(datetime(2017,1,1),datetime(2018,1,1))]
+    with patch('advect1d.cdaweb.get_inventory_intervals',return_value=inventory), \
+         patch('advect1d.cdaweb.get_cdf',side_effect=fake_omni) as get_cdf:
+        plot_imf('advected.h5',l1=False)
+        assert get_cdf.call_count==2
+
+        # The second plot takes OMNI from the cache
+        fig=plot_imf('advected.h5',l1=False)
+        assert get_cdf.call_count==2
+
+    assert [line.get_label() for line in fig.get_axes()[0].get_lines()]==['OMNI','advect1d']
@@ -0,0 +1,36 @@
+from advect1d import prefetch
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+import spacepy.datamodel as dm
+
+def fake_day(dataview,dataset,day,variables,proxy=None):
+    # One record per minute, with a two hour gap in DSCOVR_H0_MAG on Sep 7
+    times=np.datetime64(day,'us')+np.arange(24*60)*np.timedelta64(60,'s')
+    if dataset=='DSCOVR_H0_MAG' and day==datetime(2017,9,7):
+        times=times[(times<np.datetime64('2017-09-07T03:00'))|
+                    (times>=np.datetime64('2017-09-07T05:00'))]
+    data=dm.SpaceData()
+    data['Epoch']=dm.dmarray(times.astype(datetime))
+    for var in variables:
+        data[var]=dm.dmarray(np.zeros(len(times)),attrs={'DEPEND_0':'Epoch'})
+    return data
+
+def test_prefetch():
+
+    windows=[('DSCOVR',datetime(2017,9,6,20),datetime(2017,9,7,6)),
+             ('DSCOVR',datetime(2017,9,7,1),datetime(2017,9,7,12))]
+
+    inventory=[(datetime(2017,1,1),datetime(2018,1,1))]
+
+    with patch('advect1d.prefetch.get_cdf_day',side_effect=fake_day) as get_cdf_day, \
+         patch('advect1d.cdaweb.get_inventory_intervals',return_value=inventory):
+        report=prefetch.prefetch(windows,connections=2)
+
+    # Each day of each data set is fetched once, though the windows overlap
+    assert get_cdf_day.call_count==6
+    assert report['ndownloads']==6
+    assert report['failed']==[]
+
+    assert report['gaps']==[{'source':'DSCOVR','dataset':'DSCOVR_H0_MAG',
+                             'start':'2017-09-07T02:59:00','end':'2017-09-07T05:00:00'}]
@@ -0,0 +1,92 @@
+from advect1d import score
+from advect1d.advect_imf import write_output
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+import spacepy.datamodel as dm
+
+def test_fft_lag():
+
+    rng=np.random.default_rng(2)
+    obs=np.cumsum(rng.normal(size=3000))
+    model=np.roll(obs,17)+rng.normal(scale=0.1,size=3000)
+    obs[100:300]=np.nan
+    model[rng.random(3000)<0.1]=np.nan
+
+    lag,corr=score.fft_lag(model,obs,max_lag=50)
+
+    # Same as the correlation of the overlapping values, shift by shift
+    def brute(k):
+        a,b=obs[max(0,-k):len(obs)-max(0,k)],model[max(0,k):len(model)-max(0,-k)]
+        valid=np.isfinite(a)&np.isfinite(b)
+        a=a-np.nanmean(obs)
+        b=b-np.nanmean(model)
+        return np.sum(a[valid]*b[valid])/np.sqrt(np.sum(a[valid]**2)*np.sum(b[valid]**2))
+
+    expected=[brute(k) for k in range(-50,51)]
+    assert lag==17
+    assert np.isclose(corr,np.max(expected))
+
+def test_score_files(tmp_path):
+
+    t0=datetime(2017,9,6)
+    seconds=np.arange(0,6*3600,16.)
+    omni_seconds=np.arange(0,6*3600,60.)
+
+    def signal(s):
+        return np.sin(s/1500)+0.5*np.sin(s/400)
+
+    # advect1d output that arrives 5 minutes late and is offset by 1
+    outdata={var:signal(seconds-300)+1 for var in ['ux','uy','uz','bx','by','bz','n','T']}
+    outdata['time']=seconds
+    filename=str(tmp_path/'advected.h5')
+    write_output(outdata,t0,imf_file=str(tmp_path/'IMF.dat'),hdf_file=filename)
+
+    omnidata={'time':np.datetime64(t0,'us')+(omni_seconds*1e6).astype('timedelta64[us]')}
+    for var,omni_var in score.score_vars:
+        omnidata[omni_var]=signal(omni_seconds+30)
+    omnidata['Vx'][:30]=np.nan
+
+    rows=score.score_files([filename],omnidata=omnidata,cadence=60,max_lag=1800)
+
+    assert [row['var'] for row in rows]==[var for var,omni_var in score.score_vars]
+    for row in rows:
+        assert row['lag']==300
+        assert row['lag_corr']>0.999
+        assert row['n']==(330 if row['var']=='ux' else 360)
+
+    score.write_table(rows,str(tmp_path/'scores.csv'))
+    with open(str(tmp_path/'scores.csv')) as fh:
+        lines=fh.read().splitlines()
+    assert lines[0]==','.join(score.table_columns)
+    assert len(lines)==len(rows)+1
+
+def fake_omni(dataview,dataset,start,end,variables,proxy=None):
+    times=np.arange(np.datetime64(start,'m'),np.datetime64(end,'m')+1)
+    data=dm.SpaceData()
+    data['Epoch']=dm.dmarray(times.astype('datetime64[us]').astype(datetime))
+    for var in variables:
+        data[var]=dm.dmarray(np.sin(np.arange(len(times))/100.),
+                             attrs={'DEPEND_0':'Epoch','FILLVAL':99999.9})
+    return data
+
+def test_score_files_cached_omni(tmp_path,monkeypatch):
+
+    monkeypatch.chdir(tmp_path)
+
+    seconds=np.arange(0,30*3600,60.)
+    outdata={var:np.sin(seconds/6000) for var in ['ux','uy','uz','bx','by','bz','n','T']}
+    outdata['time']=seconds
+    write_output(outdata,datetime(2017,9,6,12),imf_file='IMF.dat',hdf_file='advected.h5')
+
+    inventory=[(datetime(2017,1,1),datetime(2018,1,1))]
+    with patch('advect1d.cdaweb.get_inventory_intervals',return_value=inventory), \
+         patch('advect1d.cdaweb.get_cdf',side_effect=fake_omni) as get_cdf:
+        first=score.score_files(['advected.h5'])
+        assert get_cdf.call_count==2
+
+        # OMNI is read from the day-by-day cache the second time
+        second=score.score_files(['advected.h5'])
+        assert get_cdf.call_count==2
+
+    assert [row['rmse'] for row in first]==[row['rmse'] for row in second]
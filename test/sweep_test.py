@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from datetime import datetime,timedelta
+
+from advect1d import sweep
+from advect1d.advect_imf import advect,from_seconds
+from advect1d.score import read_runs
+
+def synthetic_data(start,hours):
+    n=int(hours*60)
+    t=np.array([start+timedelta(seconds=60*i) for i in range(n)])
+    s=np.arange(n)*60.
+    shock=s>hours*1800
+    data={'ux':-400-150*shock,'uy':5*np.sin(s/500),'uz':3*np.cos(s/700),
+          'bx':2+np.sin(s/300),'by':-3+np.cos(s/100),'bz':np.where(shock,-10.,2.),
+          'n':5+3*shock,'T':1e5+2e4*np.sin(s/1000),
+          'x':1.5e6+0*s,'y':2e5+0*s,'z':1e4+0*s}
+    return {var:(t,values) for var,values in data.items()}
+
+def test_sweep_settings():
+    settings=sweep.sweep_settings([100,200],[0.5],['Minmod','Harmonic'],scheme='ssprk3')
+    assert len(settings)==4
+    assert all(run['scheme']=='ssprk3' for run in settings)
+    assert {(run['ncells'],run['limiter']) for run in settings}== \
+        {(100,'Minmod'),(100,'Harmonic'),(200,'Minmod'),(200,'Harmonic')}
+
+    # Invalid limiters are found before any run is started
+    with pytest.raises(ValueError):
+        sweep.sweep_settings(limiter=['Minmod','Minmud'])
+    with pytest.raises(ValueError):
+        sweep.sweep_settings(limiter=['Superbee'],scheme='ssprk2')
+
+def test_sweep(tmp_path):
+    import h5py
+
+    sw_data=synthetic_data(datetime(2017,9,6),hours=2)
+    settings=sweep.sweep_settings([50,80],[0.5],['Minmod','Harmonic'],scheme='ssprk3')
+    results=sweep.sweep(sw_data,settings,workers=2)
+
+    filename=str(tmp_path/'sweep.h5')
+    sweep.write_sweep(filename,settings,results)
+
+    runs=read_runs(filename)
+    assert [name for name,data in runs]==['run_000','run_001','run_002','run_003']
+    with h5py.File(filename,'r') as fh:
+        for (name,data),run_settings in zip(runs,settings):
+            attrs=fh[name].attrs
+            assert {key:attrs[key] for key in run_settings}==run_settings
+
+            # Each run is the same as running advect with its settings
+            outdata,t0=advect(sw_data,**run_settings)
+            assert np.array_equal(data['time'],from_seconds(outdata['time'],t0))
+            assert np.array_equal(data['bz'],outdata['bz'])